@@ -161,6 +161,9 @@ def install_confs():
         sudo('cp deploy/supervisor/webadmin-celeryd.conf '
              '/etc/supervisor/conf.d/webadmin-celeryd.conf')
 
+        sudo('cp deploy/supervisor/webadmin-celeryd-bulk.conf '
+             '/etc/supervisor/conf.d/webadmin-celeryd-bulk.conf')
+
         sudo('cp deploy/supervisor/webadmin-celerybeatd.conf '
              '/etc/supervisor/conf.d/webadmin-celerybeatd.conf')
 
@@ -196,6 +199,8 @@ def install_database():
         sudo('python3 manage.py migrate djcelery')
         sudo('python3 manage.py migrate --noinput')
         sudo('python3 manage.py loaddata vbts_webadmin/fixtures/config.json')
+        sudo('python3 manage.py loaddata '
+             'vbts_webadmin/fixtures/carrier_prefixes.json')
         cmd = 'echo \"from django.contrib.auth.models import User; ' \
               'User.objects.create_superuser(' \
               '\'%(user_name)s\', \'%(user_email)s\', \'%(user_pass)s\')\" ' \
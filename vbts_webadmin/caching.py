@@ -0,0 +1,47 @@
+"""
+Copyright (c) 2015-present, Philippine-California Advanced Research Institutes-
+The Village Base Station Project (PCARI-VBTS). All rights reserved.
+
+This source code is licensed under the BSD-style license found in the
+LICENSE file in the root directory of this source tree.
+
+-
+Process-wide snapshots of small, rarely changing tables.
+"""
+
+import time
+
+from django.db.models.signals import post_delete
+from django.db.models.signals import post_save
+
+
+class TableSnapshot(object):
+    """
+        Lazily builds something out of one or more tables and keeps it for
+        the life of the process. It is rebuilt on first use after any of
+        the models is saved or deleted in this process, or after ttl
+        seconds, since changes made by other processes don't reach us.
+    Args:
+        build: callable returning the snapshot
+        models: models whose changes make the snapshot stale
+        ttl: seconds before the snapshot is rebuilt anyway
+    """
+
+    def __init__(self, build, models, ttl):
+        self.build = build
+        self.ttl = ttl
+        self._value = None
+        self._deadline = 0
+        for model in models:
+            post_save.connect(self.invalidate, sender=model, weak=False)
+            post_delete.connect(self.invalidate, sender=model, weak=False)
+
+    def get(self):
+        now = time.time()
+        if self._value is None or now >= self._deadline:
+            self._value = self.build()
+            self._deadline = now + self.ttl
+        return self._value
+
+    def invalidate(self, *args, **kwargs):
+        self._value = None
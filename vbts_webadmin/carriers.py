@@ -0,0 +1,90 @@
+"""
+Copyright (c) 2015-present, Philippine-California Advanced Research Institutes-
+The Village Base Station Project (PCARI-VBTS). All rights reserved.
+
+This source code is licensed under the BSD-style license found in the
+LICENSE file in the root directory of this source tree.
+
+-
+Off-network carrier classification.
+
+Destinations are mapped to a tariff tier by longest prefix match against
+the CarrierPrefix table. The table is compiled into one dict per prefix
+length, so a lookup is at most one dict probe per distinct length.
+"""
+
+from django.conf import settings
+
+from vbts_webadmin.caching import TableSnapshot
+from vbts_webadmin.models import CarrierPrefix
+
+# Used while the CarrierPrefix table is still empty, i.e. before
+# fixtures/carrier_prefixes.json has been loaded
+DEFAULT_PREFIXES = {
+    'globe': ['63905', '63906', '63915', '63916', '63917', '63926',
+              '63927', '63935', '63945', '63955', '63956', '63966',
+              '63975', '63976', '63977', '63995', '63997',
+              '63937',  # ABS-CBN
+              '63996',  # Cherry
+              '63936'],  # TM barangay
+}
+
+# Tiers that don't have a rate of their own in billing, and the
+# regular tariff that applies to them instead
+BILLING_TIERS = {
+    'globe': 'outside',
+}
+
+
+def compile_prefixes(prefixes):
+    """
+        Compiles (prefix, tier) pairs for lookup()
+    Returns:
+        list of (prefix length, {prefix: tier}), longest prefixes first
+    """
+    table = {}
+    for prefix, tier in prefixes:
+        table.setdefault(len(prefix), {})[prefix] = tier
+    return sorted(table.items(), reverse=True)
+
+
+def _build():
+    prefixes = list(CarrierPrefix.objects.values_list('prefix', 'tier'))
+    if not prefixes:
+        prefixes = [(prefix, tier) for tier in DEFAULT_PREFIXES
+                    for prefix in DEFAULT_PREFIXES[tier]]
+    return compile_prefixes(prefixes)
+
+
+_prefixes = TableSnapshot(_build, [CarrierPrefix],
+                          settings.PCARI.get('CARRIER_PREFIX_TTL', 300))
+
+
+def lookup(number, table=None):
+    """
+        Gets the tariff tier of a destination number
+    Args:
+        number: destination number, ie: '639171234567'
+        table: compiled prefixes, defaults to the CarrierPrefix table
+
+    Returns:
+        tier, ie: 'globe', or None if no prefix matches
+    """
+    if table is None:
+        table = _prefixes.get()
+    for length, prefixes in table:
+        tier = prefixes.get(number[:length])
+        if tier:
+            return tier
+    return None
+
+
+def get_billing_type(service_type):
+    """
+        Maps a service type to the one billing knows the regular tariff of,
+        ie: 'globe_call' -> 'outside_call'
+    """
+    tier, _, transaction = service_type.partition('_')
+    if tier in BILLING_TIERS:
+        return '%s_%s' % (BILLING_TIERS[tier], transaction)
+    return service_type
@@ -0,0 +1,256 @@
+"""
+Copyright (c) 2015-present, Philippine-California Advanced Research Institutes-
+The Village Base Station Project (PCARI-VBTS). All rights reserved.
+
+This source code is licensed under the BSD-style license found in the
+LICENSE file in the root directory of this source tree.
+
+-
+Charging decision engine for promo-aware transactions.
+
+FreeSWITCH asks the WebAdmin how every call and SMS should be charged, so
+everything here is written to touch the database as little as possible:
+a subscriber's promo subscriptions are fetched with a single query, kept
+in the entitlement cache for the next hops of the same call, and all of
+the ranking is done in memory.
+
+Expired subscriptions never count, even if expire_subscriptions hasn't
+swept them yet: every query here goes through
+PromoSubscription.objects.active().
+"""
+
+import random
+import time
+
+from django.db import OperationalError
+from django.db import transaction as db_transaction
+from django.db.models import F
+from django.db.models import Sum
+
+from vbts_webadmin import entitlements
+from vbts_webadmin.models import PromoSubscription
+
+# Promo types in the order in which they are applied to a transaction.
+# See NOTES.md, "The concept of service types".
+PROMO_TYPE_PRIORITY = ('U', 'B', 'D', 'G')
+
+# Times a spill over subscriptions is tried if other deductions get in
+# the way, and the most it waits before the next try, in seconds (times
+# the number of tries so far)
+SPILL_ATTEMPTS = 10
+SPILL_BACKOFF = 0.01
+
+# Service types that have a matching quota/rate field in PromoSubscription
+SERVICE_TYPES = ('local_sms', 'local_call',
+                 'globe_sms', 'globe_call',
+                 'outside_sms', 'outside_call')
+
+
+def get_subscriptions(imsi):
+    """
+        Gets a subscriber's active promo subscriptions, from the entitlement
+        cache if possible
+    Args:
+        imsi: IMSI of the subscriber
+
+    Returns:
+        list of PromoSubscription as ranked by rank_subscriptions(), with
+        the related promo already loaded
+    """
+    return rank_subscriptions(entitlements.get(imsi).subscriptions)
+
+
+def rank_subscriptions(subscriptions):
+    """
+        Orders subscriptions the way they should be consumed: by promo type
+        priority first, then the one that expires first. Subscriptions
+        without an expiration date are consumed last.
+    Args:
+        subscriptions: iterable of PromoSubscription
+
+    Returns:
+        sorted list of PromoSubscription
+    """
+    def rank(item):
+        promo_type = item.promo.promo_type
+        if promo_type in PROMO_TYPE_PRIORITY:
+            priority = PROMO_TYPE_PRIORITY.index(promo_type)
+        else:
+            priority = len(PROMO_TYPE_PRIORITY)
+        return (priority, item.date_expiration is None, item.date_expiration)
+
+    return sorted(subscriptions, key=rank)
+
+
+def get_allocation(subscription, service_type):
+    """
+        Returns the quota (bulk) or rate (discounted) that a subscription
+        allots for the given service type, 0 if it allots nothing
+    """
+    if service_type not in SERVICE_TYPES:
+        return 0
+    return getattr(subscription, service_type)
+
+
+def find_subscription(subscriptions, promo_type, service_type, minimum=1):
+    """
+        Gets the subscription that should be used for a given promo type and
+        service type, i.e. the earliest expiring one with an allocation
+    Args:
+        subscriptions: list of PromoSubscription, as ranked by
+                       rank_subscriptions()
+        promo_type: either U, B, D, G
+        service_type: either [local, globe, outside] + [call, sms]
+        minimum: least allocation the subscription should have
+
+    Returns:
+        PromoSubscription, or None if there's no applicable subscription
+    """
+    for item in subscriptions:
+        if item.promo.promo_type == promo_type and \
+                get_allocation(item, service_type) >= minimum:
+            return item
+    return None
+
+
+def is_group_member(imsi, dest):
+    """
+        Checks if dest belongs to any of the groups owned by the subscriber.
+        Only meaningful if the subscriber has a group discount subscription,
+        group members aren't loaded otherwise.
+    """
+    return dest in entitlements.get(imsi).group_callerids
+
+
+def get_service_type(imsi, transaction, dest, subscriptions=None):
+    """
+        Decides how a transaction should be charged.
+
+        We go through the subscriber's subscriptions following the promo
+        type priority and use the first one that has an allocation for the
+        transaction. For example: if a user wants to do outside sms but only
+        has promo allocation for unli local sms, then regular rates apply.
+        Group discounts only apply if the destination is a group member.
+    Args:
+        imsi: IMSI of the subscriber
+        transaction: either [local, globe, outside] + [call, sms]
+        dest: destination callerid
+        subscriptions: optional list of the subscriber's subscriptions as
+                       ranked by rank_subscriptions(), fetched with
+                       get_subscriptions() if not given
+
+    Returns:
+        service type tag, ie: 'U_local_sms', or the transaction itself if
+        no promo applies
+    """
+    if subscriptions is None:
+        subscriptions = get_subscriptions(imsi)
+
+    member = None  # only look up group membership when needed
+    for item in subscriptions:
+        if get_allocation(item, transaction) <= 0:
+            continue
+        promo_type = item.promo.promo_type
+        if promo_type == 'G':
+            if member is None:
+                member = is_group_member(imsi, dest)
+            if not member:
+                continue
+        return '%s_%s' % (promo_type, transaction)
+
+    return transaction
+
+
+def get_remaining_quota(imsi, service_type):
+    """ Total bulk quota left for a service type, read from the database """
+    total = PromoSubscription.objects.active().filter(
+        contact__imsi__exact=imsi, promo__promo_type='B'
+    ).aggregate(total=Sum(service_type))['total']
+    return total or 0
+
+
+def deduct_quota(imsi, service_type, amount):
+    """
+        Deducts from a subscriber's bulk promo quota, earliest expiring
+        subscription first.
+
+        The common case, the earliest subscription covering the whole amount,
+        is a single conditional UPDATE so concurrent deductions can't lose
+        updates nor go negative. Otherwise, the amount spills over from one
+        of the subscriber's bulk subscriptions to the next, each deducted
+        from only if it still has what was read, and tried again from the
+        start if another deduction got in the way. Nothing is deducted if
+        all of them together can't cover it.
+    Args:
+        imsi: IMSI of the subscriber
+        service_type: either [local, globe, outside] + [call, sms]
+        amount: quota to deduct
+
+    Returns:
+        tuple of (whether the amount was deducted, remaining quota)
+    """
+    if service_type not in SERVICE_TYPES:
+        return False, 0
+
+    deducted = False
+    earliest = find_subscription(get_subscriptions(imsi), 'B', service_type)
+    if earliest:
+        # the cached quota might be stale, so let the database check it
+        deducted = PromoSubscription.objects.active().filter(
+            pk=earliest.pk, **{service_type + '__gte': amount}
+        ).update(**{service_type: F(service_type) - amount}) > 0
+
+    if not deducted:
+        deducted = _spill_quota(imsi, service_type, amount)
+
+    if deducted:
+        entitlements.invalidate(imsi)
+    return deducted, get_remaining_quota(imsi, service_type)
+
+
+class _QuotaChanged(Exception):
+    """ A subscription was deducted from since the spill read it """
+
+
+def _spill_quota(imsi, service_type, amount):
+    # select_for_update() doesn't lock anything on SQLite: rows are only
+    # deducted from if they still have what was read, and two spills that
+    # both read before writing fail with "database is locked" instead.
+    # Either way the spill is rolled back, so it's read and tried again,
+    # a little later each time.
+    for attempt in range(SPILL_ATTEMPTS):
+        if attempt:
+            time.sleep(random.uniform(0, SPILL_BACKOFF * attempt))
+        try:
+            return _try_spill_quota(imsi, service_type, amount)
+        except _QuotaChanged:
+            continue
+        except OperationalError as e:
+            if 'locked' not in str(e):
+                raise
+    return False
+
+
+def _try_spill_quota(imsi, service_type, amount):
+    with db_transaction.atomic():
+        subscriptions = list(PromoSubscription.objects.select_for_update(
+        ).active().filter(
+            contact__imsi__exact=imsi, promo__promo_type='B',
+            **{service_type + '__gt': 0}
+        ).order_by('date_expiration', 'id'))
+
+        if sum(get_allocation(item, service_type)
+               for item in subscriptions) < amount:
+            return False
+
+        for item in subscriptions:
+            if amount <= 0:
+                break
+            taken = min(amount, get_allocation(item, service_type))
+            if not PromoSubscription.objects.filter(
+                    pk=item.pk, **{service_type + '__gte': taken}
+            ).update(**{service_type: F(service_type) - taken}):
+                # rolls back what was already taken from the others
+                raise _QuotaChanged()
+            amount -= taken
+    return True
@@ -0,0 +1,76 @@
+"""
+Copyright (c) 2015-present, Philippine-California Advanced Research Institutes-
+The Village Base Station Project (PCARI-VBTS). All rights reserved.
+
+This source code is licensed under the BSD-style license found in the
+LICENSE file in the root directory of this source tree.
+
+-
+Read-through cache of the Config key/value table.
+
+The whole table is loaded once per process and reloaded after a Config is
+saved or deleted, or after PCARI['CONFIG_TTL'] seconds for edits made by
+other processes.
+"""
+
+import pytz
+from django.conf import settings
+
+from vbts_webadmin.caching import TableSnapshot
+from vbts_webadmin.models import Config
+
+DEFAULT_TIMEZONE = 'Asia/Manila'
+
+
+def _build():
+    return dict(Config.objects.values_list('key', 'value'))
+
+
+_configs = TableSnapshot(_build, [Config],
+                         settings.PCARI.get('CONFIG_TTL', 60))
+
+
+def get_str(key, default=None):
+    """
+        Gets a config value
+    Args:
+        key: config key
+        default: returned if the key doesn't exist
+
+    Returns:
+        config value, as string
+    """
+    return _configs.get().get(key, default)
+
+
+def _get_typed(cast, key, default):
+    value = _configs.get().get(key)
+    if value is None:
+        return default
+    try:
+        return cast(value)
+    except ValueError:
+        return default
+
+
+def get_int(key, default=None):
+    """ Gets a config value as int, default if missing or not an int """
+    return _get_typed(int, key, default)
+
+
+def get_float(key, default=None):
+    """ Gets a config value as float, default if missing or not a float """
+    return _get_typed(float, key, default)
+
+
+def get_timezone(key='timezone', default=DEFAULT_TIMEZONE):
+    """ Gets a config value as a tzinfo, ie: for astimezone() """
+    try:
+        return pytz.timezone(get_str(key, default))
+    except pytz.UnknownTimeZoneError:
+        return pytz.timezone(default)
+
+
+def refresh():
+    """ Reloads the configs on next use """
+    _configs.invalidate()
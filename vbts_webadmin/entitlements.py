@@ -0,0 +1,194 @@
+"""
+Copyright (c) 2015-present, Philippine-California Advanced Research Institutes-
+The Village Base Station Project (PCARI-VBTS). All rights reserved.
+
+This source code is licensed under the BSD-style license found in the
+LICENSE file in the root directory of this source tree.
+
+-
+Per-subscriber promo entitlement cache.
+
+One call setup goes through several chatplan/dialplan hops (service type,
+tariff, seconds available, quota deduction), each asking about the same
+IMSI. We keep what a subscriber is entitled to -- his/her subscriptions,
+ordered by expiration, and the callerids in the groups he/she owns -- in
+two tiers:
+
+    * a small in-process dict, so that consecutive hops served by the same
+      gunicorn worker don't even have to unpickle anything, and
+    * the 'entitlements' cache backend (see CACHES in settings), which can
+      be pointed to a backend shared by all workers on the BTS.
+
+Entries are dropped whenever a PromoSubscription, GroupMembers or Promo is
+saved or deleted, and never outlive the earliest subscription expiration.
+The in-process tier can't hear about changes made by other processes: a
+subscription made, dropped or used up through another worker may go
+unnoticed by this one for up to PCARI['ENTITLEMENT_LOCAL_TTL'] seconds, so
+it is kept to a few. Quota is still deducted in the database (see
+charging.py), so a stale entry can't be spent twice; it may only answer a
+tariff or seconds-available query with a quota that is already gone. It
+holds at most PCARI['ENTITLEMENT_LOCAL_SIZE'] subscribers, expired entries
+being swept out when it fills up.
+"""
+
+import math
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models.signals import post_delete
+from django.db.models.signals import post_save
+from django.utils import timezone
+
+from vbts_webadmin.models import Group
+from vbts_webadmin.models import GroupMembers
+from vbts_webadmin.models import Promo
+from vbts_webadmin.models import PromoSubscription
+
+CACHE_ALIAS = 'entitlements'
+LOCAL_TTL = settings.PCARI.get('ENTITLEMENT_LOCAL_TTL', 5)
+LOCAL_SIZE = settings.PCARI.get('ENTITLEMENT_LOCAL_SIZE', 1000)
+
+# imsi -> (deadline, Entitlement)
+_local = {}
+
+
+class Entitlement(object):
+    """
+        What a subscriber is entitled to at the time it was loaded
+    """
+
+    def __init__(self, subscriptions, group_callerids):
+        self._subscriptions = subscriptions
+        self.group_callerids = frozenset(group_callerids)
+
+    @property
+    def subscriptions(self):
+        """ Subscriptions that haven't expired yet, earliest expiring first """
+        now = timezone.now()
+        return [item for item in self._subscriptions
+                if item.date_expiration is None or item.date_expiration > now]
+
+    def seconds_to_expiry(self):
+        """ Seconds until the earliest subscription expires, or None """
+        expiries = [item.date_expiration for item in self._subscriptions
+                    if item.date_expiration is not None]
+        if not expiries:
+            return None
+        delta = min(expiries) - timezone.now()
+        return max(int(math.ceil(delta.total_seconds())), 0)
+
+
+def _key(imsi):
+    return 'entitlements:%s' % imsi
+
+
+def load(imsi):
+    """
+        Reads a subscriber's entitlements from the database. Group members
+        are only fetched if the subscriber has a group discount promo.
+    """
+    subscriptions = list(PromoSubscription.objects.active().filter(
+        contact__imsi__exact=imsi).select_related('promo').order_by(
+        'date_expiration'))
+
+    group_callerids = []
+    if any(item.promo.promo_type == 'G' for item in subscriptions):
+        group_callerids = GroupMembers.objects.filter(
+            group__owner__exact=imsi).values_list('user__callerid', flat=True)
+
+    return Entitlement(subscriptions, group_callerids)
+
+
+def _remember(imsi, deadline, entitlement, now):
+    """
+        Keeps an entitlement in the in-process tier. When it's full, expired
+        entries are dropped, and if that isn't enough, the one closest to
+        expiring.
+    """
+    if imsi not in _local and len(_local) >= LOCAL_SIZE:
+        for key, (key_deadline, _) in list(_local.items()):
+            if key_deadline <= now:
+                _local.pop(key, None)
+        if len(_local) >= LOCAL_SIZE:
+            key = min(list(_local.items()), key=lambda entry: entry[1][0])[0]
+            _local.pop(key, None)
+    _local[imsi] = (deadline, entitlement)
+
+
+def get(imsi):
+    """
+        Gets a subscriber's entitlements, loading them if needed
+    Args:
+        imsi: IMSI of the subscriber
+
+    Returns:
+        Entitlement instance
+    """
+    now = time.time()
+    cached = _local.get(imsi)
+    if cached and cached[0] > now:
+        return cached[1]
+
+    cache = caches[CACHE_ALIAS]
+    entitlement = cache.get(_key(imsi))
+    if entitlement is None:
+        entitlement = load(imsi)
+        timeout = cache.default_timeout
+        expiry = entitlement.seconds_to_expiry()
+        if expiry is not None:
+            timeout = expiry if timeout is None else min(timeout, expiry)
+        if timeout != 0:
+            cache.set(_key(imsi), entitlement, timeout)
+
+    ttl = LOCAL_TTL
+    expiry = entitlement.seconds_to_expiry()
+    if expiry is not None:
+        ttl = min(ttl, expiry)
+    _remember(imsi, now + ttl, entitlement, now)
+    return entitlement
+
+
+def invalidate(imsi):
+    """ Drops the cached entitlements of a subscriber """
+    _local.pop(imsi, None)
+    caches[CACHE_ALIAS].delete(_key(imsi))
+
+
+def clear():
+    """ Drops all cached entitlements """
+    _local.clear()
+    caches[CACHE_ALIAS].clear()
+
+
+def subscription_changed(sender, instance, **kwargs):
+    invalidate(instance.contact_id)
+
+
+def group_changed(sender, instance, **kwargs):
+    invalidate(instance.owner_id)
+
+
+def group_member_changed(sender, instance, **kwargs):
+    try:
+        owner = Group.objects.filter(pk=instance.group_id).values_list(
+            'owner_id', flat=True)[0]
+    except IndexError:
+        return  # group is being deleted, group_changed takes care of it
+    invalidate(owner)
+
+
+def promo_changed(sender, instance, **kwargs):
+    imsis = PromoSubscription.objects.filter(promo=instance).values_list(
+        'contact_id', flat=True).distinct()
+    for imsi in imsis:
+        invalidate(imsi)
+
+
+post_save.connect(subscription_changed, sender=PromoSubscription)
+post_delete.connect(subscription_changed, sender=PromoSubscription)
+post_save.connect(group_member_changed, sender=GroupMembers)
+post_delete.connect(group_member_changed, sender=GroupMembers)
+post_delete.connect(group_changed, sender=Group)
+post_save.connect(promo_changed, sender=Promo)
+post_delete.connect(promo_changed, sender=Promo)
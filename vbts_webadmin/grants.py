@@ -0,0 +1,103 @@
+"""
+Copyright (c) 2015-present, Philippine-California Advanced Research Institutes-
+The Village Base Station Project (PCARI-VBTS). All rights reserved.
+
+This source code is licensed under the BSD-style license found in the
+LICENSE file in the root directory of this source tree.
+
+-
+Bulk promo grants.
+
+Subscribes many contacts to promos at once, free of charge: the promos
+and contacts are looked up with one query each, the subscriptions are
+written with one bulk_create, and the subscribers are told about it with
+one batch of SMS. Nothing is scheduled per subscription, the
+expire_subscriptions task removes them once they expire.
+"""
+
+from datetime import timedelta
+
+from django.db import transaction as db_transaction
+from django.utils import timezone
+from django.utils.translation import ugettext as _
+
+from vbts_webadmin import entitlements
+from vbts_webadmin.models import Contact
+from vbts_webadmin.models import Promo
+from vbts_webadmin.models import PromoSubscription
+from vbts_webadmin.tasks import send_sms_batch
+
+from core import events
+from core.subscriber import subscriber as endaga_sub
+
+QUOTA_FIELDS = ('local_sms', 'local_call', 'globe_sms', 'globe_call',
+                'outside_sms', 'outside_call')
+
+
+def new_subscription(promo, imsi, now):
+    """ Unsaved subscription of a contact to a promo, with full quotas """
+    subscription = PromoSubscription(
+        promo=promo,
+        contact_id=imsi,
+        date_expiration=now + timedelta(promo.validity))
+    for field in QUOTA_FIELDS:
+        setattr(subscription, field, getattr(promo, field))
+    return subscription
+
+
+def grant_promos(grants, now=None):
+    """
+        Subscribes contacts to promos
+    Args:
+        grants: list of (keyword, callerid) pairs
+        now: datetime the subscriptions start, defaults to now
+
+    Returns:
+        dict of the index of each grant that couldn't be made, to why
+    """
+    now = now or timezone.now()
+    promos = dict((promo.keyword, promo) for promo in Promo.objects.filter(
+        keyword__in=set(grant[0] for grant in grants)))
+    imsis = dict(Contact.objects.filter(
+        callerid__in=set(grant[1] for grant in grants)).values_list(
+        'callerid', 'imsi'))
+
+    failed = {}
+    granted = []  # (imsi, callerid, promo)
+    for index, (keyword, callerid) in enumerate(grants):
+        promo = promos.get(keyword)
+        imsi = imsis.get(callerid)
+        if promo is None:
+            failed[index] = 'Promo does not exist'
+        elif imsi is None:
+            failed[index] = 'Contact does not exist'
+        else:
+            granted.append((imsi, callerid, promo))
+    if not granted:
+        return failed
+
+    with db_transaction.atomic():
+        PromoSubscription.objects.bulk_create([
+            new_subscription(item[2], item[0], now) for item in granted])
+    # bulk_create doesn't send post_save
+    for imsi in set(item[0] for item in granted):
+        entitlements.invalidate(imsi)
+
+    balances = {}
+    messages = []
+    for imsi, callerid, promo in granted:
+        # core.events has no bulk API, so events are still made one by one
+        if imsi not in balances:
+            balances[imsi] = endaga_sub.get_account_balance(imsi)
+        reason = "Promo Auto Subscription: %s" % promo.keyword
+        events.create_sms_event(imsi, balances[imsi], 0, reason, '555')
+        messages.append((callerid, _(
+            'You are automatically subscribed to %(promo)s promo '
+            'valid for %(validity)s day(s). '
+            'To opt out, text REMOVE %(keyword)s to 555. '
+            'For more info, text INFO %(keyword)s to 555.') % ({
+                'promo': promo.name,
+                'validity': promo.validity,
+                'keyword': promo.keyword})))
+    send_sms_batch.delay(messages, '0000', lane='notification')
+    return failed
@@ -0,0 +1,395 @@
+"""
+Copyright (c) 2015-present, Philippine-California Advanced Research Institutes-
+The Village Base Station Project (PCARI-VBTS). All rights reserved.
+
+This source code is licensed under the BSD-style license found in the
+LICENSE file in the root directory of this source tree.
+
+-
+Bulk CSV imports.
+
+Uploads are parsed line by line as they are read, and rows are handled
+in chunks of PCARI['IMPORT_CHUNK_SIZE']: each chunk is validated, the
+records it refers to are fetched with one query per table, and the new
+records are written with bulk_create in one transaction per chunk.
+
+Imports run in celery (see tasks.run_import), so every importer takes a
+progress callback which is called after each chunk with the number of
+rows handled and the rows that failed, as {'row': row, 'error': reason}.
+"""
+
+import codecs
+import csv
+
+from django.conf import settings
+from django.db import IntegrityError
+from django.db import transaction as db_transaction
+from django.utils import six
+from django.utils import timezone
+
+from vbts_webadmin import grants
+from vbts_webadmin import resolver
+from vbts_webadmin.models import Contact
+from vbts_webadmin.models import ContactProfile
+from vbts_webadmin.models import ContactSimcards
+from vbts_webadmin.models import Group
+from vbts_webadmin.models import Promo
+from vbts_webadmin.views import api_groups
+
+# SQLite allows at most 999 parameters per query, keep chunks under that
+CHUNK_SIZE = settings.PCARI.get('IMPORT_CHUNK_SIZE', 500)
+
+# firstname, lastname, nickname, age, gender, municipality, barangay,
+# sitio, uuid, callerid, imsi
+CONTACT_COLUMNS = 11
+PROFILE_FIELDS = ('firstname', 'lastname', 'nickname', 'age', 'gender',
+                  'municipality', 'barangay', 'sitio')
+# name, description, price, promo_type, keyword, validity, local_sms,
+# local_call, globe_sms, globe_call, outside_sms, outside_call
+PROMO_COLUMNS = 12
+PROMO_FIELDS = ('name', 'description', 'price', 'promo_type', 'keyword',
+                'validity', 'local_sms', 'local_call', 'globe_sms',
+                'globe_call', 'outside_sms', 'outside_call')
+# keyword, callerid
+SUBSCRIPTION_COLUMNS = 2
+# owner's callerid, then up to five members' callerids
+GROUP_COLUMNS = 6
+
+
+def read_csv(docfile, encoding='utf-8'):
+    """
+        Parses a CSV file as it is read, without loading all of it
+    Args:
+        docfile: file opened in binary mode, ie: an UploadedFile
+
+    Returns:
+        iterator over the rows, as lists of unicode strings
+    """
+    if six.PY2:
+        # python 2's csv module only reads bytes
+        return ([cell.decode(encoding) for cell in row]
+                for row in csv.reader(docfile))
+    return csv.reader(codecs.iterdecode(docfile, encoding))
+
+
+def chunked(iterable, size):
+    """ Yields lists of up to size items from iterable """
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def clean_contact_row(row):
+    """
+        Validates a contact CSV row
+    Returns:
+        dict of the row's values
+
+    Raises:
+        ValueError if the row is incomplete or has invalid numbers
+    """
+    if len(row) < CONTACT_COLUMNS:
+        raise ValueError('Expected %d columns, got %d' % (CONTACT_COLUMNS,
+                                                          len(row)))
+    data = dict(zip(PROFILE_FIELDS, row[:8]))
+    data['age'] = int(data['age'] or 0)
+    if data['age'] < 0:
+        raise ValueError('Invalid age')
+    data['uuid'] = int(row[8])
+    data['callerid'] = row[9].strip()
+    data['imsi'] = row[10].strip()
+    return data
+
+
+def import_contacts(rows, progress=None, chunk_size=None):
+    """
+        Creates or updates contact profiles, contacts and their simcards
+        from contact CSV rows (without the header). A row is set aside
+        for verification instead if it's invalid, if its callerid is
+        registered to another profile (uuid), or if its callerid or IMSI
+        already belong to another contact.
+    Args:
+        rows: iterable of rows, see read_csv()
+        progress: callback, see above
+        chunk_size: rows handled at a time, defaults to CHUNK_SIZE
+
+    Returns:
+        dict of imported (number of rows), verify (rows to verify) and
+        conflict (for each row to verify, the conflicting profile as a
+        list, or None)
+    """
+    imported = 0
+    to_verify = []
+    conflicts = []
+    for chunk in chunked(rows, chunk_size or CHUNK_SIZE):
+        start = len(to_verify)
+        imported += _import_contact_chunk(chunk, to_verify, conflicts)
+        if progress:
+            progress(len(chunk), [
+                {'row': row, 'error': 'Needs verification'}
+                for row in to_verify[start:]])
+    if imported:
+        resolver.refresh()  # bulk_create doesn't send post_save
+    return {'imported': imported, 'verify': to_verify,
+            'conflict': conflicts}
+
+
+def _profile_as_list(simcard):
+    profile = simcard.contact_profile
+    return [profile.uuid, profile.firstname, profile.lastname,
+            profile.nickname, profile.age, profile.gender,
+            profile.municipality, profile.barangay, profile.sitio,
+            simcard.contact.callerid, simcard.contact.imsi]
+
+
+def _import_contact_chunk(chunk, to_verify, conflicts):
+    valid = []
+    for row in chunk:
+        try:
+            valid.append((row, clean_contact_row(row)))
+        except (ValueError, TypeError):
+            to_verify.append(row)
+            conflicts.append(None)
+
+    uuids = set(data['uuid'] for _, data in valid)
+    callerids = set(data['callerid'] for _, data in valid if data['callerid'])
+    imsis = set(data['imsi'] for _, data in valid if data['imsi'])
+
+    profiles = dict((item.uuid, item) for item in
+                    ContactProfile.objects.filter(uuid__in=uuids))
+    contacts = dict((item.callerid, item) for item in
+                    Contact.objects.filter(callerid__in=callerids))
+    taken_imsis = set(Contact.objects.filter(imsi__in=imsis).values_list(
+        'imsi', flat=True))
+    simcards = dict((item.contact.callerid, item) for item in
+                    ContactSimcards.objects.filter(
+                        contact__callerid__in=callerids).select_related(
+                        'contact', 'contact_profile'))
+
+    new_profiles = {}  # uuid -> ContactProfile
+    changed_profiles = {}  # uuid -> ContactProfile
+    new_contacts = {}  # callerid -> Contact
+    new_simcards = {}  # callerid -> uuid
+    accepted = []
+
+    for row, data in valid:
+        uuid = data['uuid']
+        callerid = data['callerid']
+        imsi = data['imsi']
+
+        simcard = simcards.get(callerid)
+        if simcard and simcard.contact_profile.uuid != uuid:
+            # attempting to transfer the simcard to another subscriber
+            to_verify.append(row)
+            conflicts.append(_profile_as_list(simcard))
+            continue
+        if new_simcards.get(callerid, uuid) != uuid:
+            # same, but with an earlier row of this file
+            to_verify.append(row)
+            conflicts.append(None)
+            continue
+
+        if callerid and imsi:
+            contact = contacts.get(callerid) or new_contacts.get(callerid)
+            if contact is None and imsi in taken_imsis:
+                contact = False  # IMSI belongs to another callerid
+            if contact is False or (contact and contact.imsi != imsi):
+                to_verify.append(row)
+                conflicts.append(None)
+                continue
+            if contact is None:
+                new_contacts[callerid] = Contact(
+                    imsi=imsi, callerid=callerid,
+                    search=Contact.search_text(callerid, imsi,
+                                               data['firstname'],
+                                               data['lastname']))
+                taken_imsis.add(imsi)
+            if callerid not in simcards:
+                new_simcards[callerid] = uuid
+
+        profile = profiles.get(uuid)
+        if profile is None:
+            profile = profiles[uuid] = new_profiles[uuid] = \
+                ContactProfile(uuid=uuid)
+        for field in PROFILE_FIELDS:
+            if getattr(profile, field) != data[field]:
+                setattr(profile, field, data[field])
+                if uuid not in new_profiles:
+                    changed_profiles[uuid] = profile
+        accepted.append(row)
+
+    try:
+        _write_contact_chunk(new_profiles, changed_profiles, new_contacts,
+                             new_simcards)
+    except IntegrityError:
+        # someone else got to some of these records first
+        to_verify.extend(accepted)
+        conflicts.extend([None] * len(accepted))
+        return 0
+    return len(accepted)
+
+
+def _write_contact_chunk(new_profiles, changed_profiles, new_contacts,
+                         new_simcards):
+    with db_transaction.atomic():
+        ContactProfile.objects.bulk_create(new_profiles.values())
+        for profile in changed_profiles.values():
+            ContactProfile.objects.filter(pk=profile.pk).update(**dict(
+                (field, getattr(profile, field)) for field in PROFILE_FIELDS))
+        Contact.objects.bulk_create(new_contacts.values())
+
+        if new_simcards:
+            # bulk_create doesn't set the primary keys on every database
+            profile_ids = dict(ContactProfile.objects.filter(
+                uuid__in=set(new_simcards.values())).values_list('uuid',
+                                                                 'id'))
+            contact_imsis = dict(Contact.objects.filter(
+                callerid__in=new_simcards.keys()).values_list('callerid',
+                                                              'imsi'))
+            ContactSimcards.objects.bulk_create([
+                ContactSimcards(contact_id=contact_imsis[callerid],
+                                contact_profile_id=profile_ids[uuid])
+                for callerid, uuid in new_simcards.items()])
+
+        # new contacts come with their search text, bulk writes don't
+        # update that of existing ones
+        linked = [callerid for callerid in new_simcards
+                  if callerid not in new_contacts]
+        if linked:
+            Contact.update_search(Contact.objects.filter(callerid__in=linked))
+        if changed_profiles:
+            Contact.update_search(Contact.objects.filter(
+                contactsimcards__contact_profile__uuid__in=list(
+                    changed_profiles)))
+
+
+def _import_rows(rows, import_row, progress, chunk_size):
+    """
+        Imports rows one at a time, one transaction per chunk. A row that
+        raises is rolled back on its own and reported as failed; one for
+        which import_row returns an error is kept, but reported as well.
+    Returns:
+        number of rows imported
+    """
+    imported = 0
+    for chunk in chunked(rows, chunk_size or CHUNK_SIZE):
+        errors = []
+        with db_transaction.atomic():
+            for row in chunk:
+                try:
+                    with db_transaction.atomic():
+                        error = import_row(row)
+                except BaseException as e:
+                    errors.append({'row': row, 'error': str(e)})
+                    continue
+                imported += 1
+                if error:
+                    errors.append({'row': row, 'error': error})
+        if progress:
+            progress(len(chunk), errors)
+    return imported
+
+
+def import_promos(rows, author_id=None, progress=None, chunk_size=None):
+    """
+        Creates promos from promo CSV rows (without the header)
+    Args:
+        rows: iterable of rows, see read_csv()
+        author_id: primary key of the User creating the promos
+        progress: callback, see above
+        chunk_size: rows handled at a time, defaults to CHUNK_SIZE
+
+    Returns:
+        dict of imported (number of rows)
+    """
+    def import_row(row):
+        if len(row) < PROMO_COLUMNS:
+            raise ValueError('Expected %d columns, got %d' % (PROMO_COLUMNS,
+                                                              len(row)))
+        Promo.objects.create(author_id=author_id,
+                             **dict(zip(PROMO_FIELDS, row)))
+
+    return {'imported': _import_rows(rows, import_row, progress, chunk_size)}
+
+
+def import_promo_subscriptions(rows, progress=None, chunk_size=None):
+    """
+        Subscribes contacts to promos from (keyword, callerid) rows, a
+        chunk at a time, see grants.grant_promos()
+    Args:
+        rows: iterable of rows, see read_csv()
+        progress: callback, see above
+        chunk_size: rows handled at a time, defaults to CHUNK_SIZE
+
+    Returns:
+        dict of imported (number of rows)
+    """
+    imported = 0
+    for chunk in chunked(rows, chunk_size or CHUNK_SIZE):
+        errors = []
+        valid = []
+        for row in chunk:
+            if len(row) < SUBSCRIPTION_COLUMNS:
+                errors.append({'row': row, 'error': 'Expected %d columns, '
+                               'got %d' % (SUBSCRIPTION_COLUMNS, len(row))})
+            else:
+                valid.append(row)
+        failed = grants.grant_promos([(row[0].strip(), row[1].strip())
+                                      for row in valid])
+        for index, error in sorted(failed.items()):
+            errors.append({'row': valid[index], 'error': error})
+        imported += len(valid) - len(failed)
+        if progress:
+            progress(len(chunk), errors)
+    return {'imported': imported}
+
+
+def import_groups(rows, progress=None, chunk_size=None):
+    """
+        Creates or replaces groups, from rows of the owner's callerid
+        followed by those of the members
+    Args:
+        rows: iterable of rows, see read_csv()
+        progress: callback, see above
+        chunk_size: rows handled at a time, defaults to CHUNK_SIZE
+
+    Returns:
+        dict of imported (number of rows)
+    """
+    def import_row(row):
+        if len(row) < GROUP_COLUMNS:
+            raise ValueError('Expected %d columns, got %d' % (GROUP_COLUMNS,
+                                                              len(row)))
+        try:
+            owner = Contact.objects.get(callerid=row[0])
+        except Contact.DoesNotExist:
+            raise ValueError('Contact does not exist')
+        (group, created) = Group.objects.update_or_create(
+            name='GD-%s' % owner.imsi,
+            defaults={
+                'owner': owner,
+                'name': 'GD-%s' % owner.imsi,
+                'last_modified': timezone.now()
+            }
+        )
+        invalid = api_groups.set_group_members(
+            ','.join(item for item in row[1:GROUP_COLUMNS] if item), group)
+        if invalid:
+            return 'Invalid members: %s' % ', '.join(invalid)
+
+    return {'imported': _import_rows(rows, import_row, progress, chunk_size)}
+
+
+# Job kind: (columns expected, importer)
+IMPORTS = {
+    'contact_import': (CONTACT_COLUMNS, import_contacts),
+    'promo_import': (PROMO_COLUMNS, import_promos),
+    'promo_subscription_import': (SUBSCRIPTION_COLUMNS,
+                                  import_promo_subscriptions),
+    'group_import': (GROUP_COLUMNS, import_groups),
+}
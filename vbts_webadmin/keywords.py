@@ -0,0 +1,109 @@
+"""
+Copyright (c) 2015-present, Philippine-California Advanced Research Institutes-
+The Village Base Station Project (PCARI-VBTS). All rights reserved.
+
+This source code is licensed under the BSD-style license found in the
+LICENSE file in the root directory of this source tree.
+
+-
+SMS keyword registry.
+
+Every inbound SMS to a service, report or promo number names what it is
+for with a keyword. Instead of looking the keyword up on every message,
+we keep the keywords of all services, reports and promos -- with what the
+API needs to route the message: the pk, whether it's published, its
+price and its managers -- in one index, rebuilt after any of them or
+their managers are saved or deleted, or after PCARI['KEYWORD_TTL']
+seconds.
+
+Keywords are unique per kind only, so lookups are by kind and keyword.
+"""
+
+from collections import namedtuple
+
+from django.conf import settings
+
+from vbts_webadmin.caching import TableSnapshot
+from vbts_webadmin.models import Contact
+from vbts_webadmin.models import Promo
+from vbts_webadmin.models import Report
+from vbts_webadmin.models import ReportManagers
+from vbts_webadmin.models import Service
+from vbts_webadmin.models import ServiceManagers
+
+SERVICE = 'service'
+REPORT = 'report'
+PROMO = 'promo'
+
+# managers is a tuple of (imsi, callerid), service_type is None but for
+# services, and promos are always published
+Keyword = namedtuple('Keyword', ['kind', 'pk', 'keyword', 'name',
+                                 'description', 'published', 'price',
+                                 'service_type', 'managers'])
+
+
+def normalize(keyword):
+    """ Keywords are saved in upper case, but texted in any case """
+    return keyword.strip().upper()
+
+
+def _managers(through, field):
+    managers = {}
+    for pk, imsi, callerid in through.objects.values_list(
+            field, 'manager__imsi', 'manager__callerid'):
+        managers.setdefault(pk, []).append((imsi, callerid))
+    return managers
+
+
+def _build():
+    index = {SERVICE: {}, REPORT: {}, PROMO: {}}
+
+    managers = _managers(ServiceManagers, 'service')
+    for pk, keyword, name, description, status, price, service_type in \
+            Service.objects.values_list('pk', 'keyword', 'name',
+                                        'description', 'status', 'price',
+                                        'service_type'):
+        index[SERVICE][normalize(keyword)] = Keyword(
+            SERVICE, pk, keyword, name, description, status == 'P', price,
+            service_type, tuple(managers.get(pk, ())))
+
+    managers = _managers(ReportManagers, 'report')
+    for pk, keyword, name, description, status in Report.objects.values_list(
+            'pk', 'keyword', 'name', 'description', 'status'):
+        index[REPORT][normalize(keyword)] = Keyword(
+            REPORT, pk, keyword, name, description, status == 'P', 0, None,
+            tuple(managers.get(pk, ())))
+
+    for pk, keyword, name, description, price in Promo.objects.values_list(
+            'pk', 'keyword', 'name', 'description', 'price'):
+        index[PROMO][normalize(keyword)] = Keyword(
+            PROMO, pk, keyword, name, description, True, price, None, ())
+    return index
+
+
+# Contact is there for the managers' callerids
+_index = TableSnapshot(_build, [Service, ServiceManagers, Report,
+                                ReportManagers, Promo, Contact],
+                       settings.PCARI.get('KEYWORD_TTL', 60))
+
+
+def lookup(kind, keyword, published=False):
+    """
+        Finds what a keyword is for
+    Args:
+        kind: SERVICE, REPORT or PROMO
+        keyword: keyword as texted, in any case
+        published: if True, unpublished services and reports aren't found
+
+    Returns:
+        Keyword, or None if there's none of that kind
+    """
+    entry = _index.get()[kind].get(normalize(keyword))
+    if entry is None or (published and not entry.published):
+        return None
+    return entry
+
+
+def refresh():
+    """ Rebuilds the registry on next use """
+    _index.invalidate()
@@ -0,0 +1,113 @@
+"""
+Copyright (c) 2015-present, Philippine-California Advanced Research Institutes-
+The Village Base Station Project (PCARI-VBTS). All rights reserved.
+
+This source code is licensed under the BSD-style license found in the
+LICENSE file in the root directory of this source tree.
+
+-
+Fast path for the API called by FreeSWITCH.
+
+FreeSWITCH calls /api/ on every call and SMS, and never has a session, a
+user or a CSRF token. These requests are served by MachineHandler, which
+only runs MACHINE_MIDDLEWARE_CLASSES and resolves against urls_api, and
+by views based on MachineAPIView, which skip DRF's authentication,
+permissions, throttling and Accept header parsing. The dashboard still
+goes through the full middleware stack of WSGIHandler.
+"""
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.handlers.exception import convert_exception_to_response
+from django.core.handlers.wsgi import WSGIHandler
+from django.utils.module_loading import import_string
+from rest_framework.negotiation import DefaultContentNegotiation
+from rest_framework.views import APIView
+
+from vbts_webadmin.middleware import API_PREFIX
+
+MACHINE_URLCONF = 'vbts_webadmin.urls_api'
+
+
+class FirstRendererNegotiation(DefaultContentNegotiation):
+    """
+        Always renders with the view's first renderer. FreeSWITCH doesn't
+        send an Accept header worth parsing.
+    """
+
+    def select_renderer(self, request, renderers, format_suffix=None):
+        return renderers[0], renderers[0].media_type
+
+
+class MachineAPIView(APIView):
+    """
+        Base of the views called by FreeSWITCH. Set renderer_classes to the
+        one renderer the view answers with.
+    """
+    authentication_classes = ()
+    permission_classes = ()
+    throttle_classes = ()
+    content_negotiation_class = FirstRendererNegotiation
+
+
+class MachineHandler(WSGIHandler):
+    """
+        WSGI handler that runs MACHINE_MIDDLEWARE_CLASSES instead of
+        MIDDLEWARE_CLASSES, and resolves against MACHINE_URLCONF only.
+    """
+
+    def load_middleware(self):
+        """
+            Loads MACHINE_MIDDLEWARE_CLASSES the way BaseHandler loads
+            MIDDLEWARE_CLASSES. BaseHandler only reads the latter, and
+            settings are shared by every thread, so they aren't swapped.
+        """
+        self._request_middleware = []
+        self._view_middleware = []
+        self._template_response_middleware = []
+        self._response_middleware = []
+        self._exception_middleware = []
+
+        for middleware_path in settings.MACHINE_MIDDLEWARE_CLASSES:
+            try:
+                middleware = import_string(middleware_path)()
+            except MiddlewareNotUsed:
+                continue
+
+            if hasattr(middleware, 'process_request'):
+                self._request_middleware.append(middleware.process_request)
+            if hasattr(middleware, 'process_view'):
+                self._view_middleware.append(middleware.process_view)
+            if hasattr(middleware, 'process_template_response'):
+                self._template_response_middleware.insert(
+                    0, middleware.process_template_response)
+            if hasattr(middleware, 'process_response'):
+                self._response_middleware.insert(0,
+                                                 middleware.process_response)
+            if hasattr(middleware, 'process_exception'):
+                self._exception_middleware.insert(
+                    0, middleware.process_exception)
+
+        # set last, BaseHandler takes it as the sign that loading is done
+        self._middleware_chain = convert_exception_to_response(
+            self._legacy_get_response)
+
+    def get_response(self, request):
+        request.urlconf = MACHINE_URLCONF
+        return super(MachineHandler, self).get_response(request)
+
+
+class MachineDispatcher(object):
+    """
+        WSGI application that serves /api/ with the machine handler, and
+        everything else with the site's application.
+    """
+
+    def __init__(self, application, machine_application=None):
+        self.application = application
+        self.machine_application = machine_application or MachineHandler()
+
+    def __call__(self, environ, start_response):
+        if environ.get('PATH_INFO', '').startswith(API_PREFIX):
+            return self.machine_application(environ, start_response)
+        return self.application(environ, start_response)
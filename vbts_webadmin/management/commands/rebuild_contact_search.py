@@ -0,0 +1,43 @@
+"""
+Copyright (c) 2015-present, Philippine-California Advanced Research Institutes-
+The Village Base Station Project (PCARI-VBTS). All rights reserved.
+
+This source code is licensed under the BSD-style license found in the
+LICENSE file in the root directory of this source tree.
+
+-
+Fills in the search text of every contact, ie: after the column is added
+to an existing database. The text is kept up to date afterwards as
+contacts, profiles and simcards are saved.
+
+Usage:
+    python manage.py rebuild_contact_search
+"""
+
+from django.core.management.base import BaseCommand
+from django.db import transaction as db_transaction
+
+from vbts_webadmin.models import Contact
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the search text of all contacts.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='contacts updated per transaction')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        updated = 0
+        last = ''
+        while True:
+            imsis = list(Contact.objects.filter(imsi__gt=last).order_by(
+                'imsi').values_list('imsi', flat=True)[:batch_size])
+            if not imsis:
+                break
+            with db_transaction.atomic():
+                updated += Contact.update_search(
+                    Contact.objects.filter(imsi__in=imsis))
+            last = imsis[-1]
+        self.stdout.write('Updated %d contacts.' % updated)
@@ -7,41 +7,124 @@ LICENSE file in the root directory of this source tree.
 """
 
 import pytz
+from django.conf import settings
+from django.db import connection
 from django.utils import timezone
 from django.utils import translation
 
-from vbts_webadmin.models import UserProfile, Config
+from vbts_webadmin.models import UserProfile
 
 
-class TimezoneMiddleware(object):
+DEFAULT_TIMEZONE = 'Asia/Manila'
+DEFAULT_LANGUAGE = 'en'
+PREFERENCES_SESSION_KEY = 'vbts_preferences'
+# requests from FreeSWITCH, they never have a user
+API_PREFIX = '/api/'
+
+
+def set_preferences(request, profile):
     """
-        Simple middleware for timezone settings
+        Keeps a user's timezone and language in the session, so that they
+        aren't read from the database on every request. Call it again
+        whenever the profile changes.
     """
+    request.session[PREFERENCES_SESSION_KEY] = {
+        'timezone': profile.timezone,
+        'language': profile.language,
+    }
 
-    def process_request(self, request):
+
+def get_preferences(request):
+    """
+        Gets the timezone and language to serve a request with. The user's
+        profile is only read once per session, and never for API calls.
+    Returns:
+        tuple of (timezone name, language code), either may be empty
+    """
+    if request.path.startswith(API_PREFIX) or request.user.id is None:
+        return DEFAULT_TIMEZONE, DEFAULT_LANGUAGE
+
+    preferences = request.session.get(PREFERENCES_SESSION_KEY)
+    if preferences is None:
         try:
-            tzname = UserProfile.objects.get(user=request.user.id).timezone
+            set_preferences(request, UserProfile.objects.only(
+                'timezone', 'language').get(user=request.user.id))
         except UserProfile.DoesNotExist:
-            tzname = 'Asia/Manila'
+            request.session[PREFERENCES_SESSION_KEY] = {
+                'timezone': DEFAULT_TIMEZONE,
+                'language': DEFAULT_LANGUAGE,
+            }
+        preferences = request.session[PREFERENCES_SESSION_KEY]
+    return preferences['timezone'], preferences['language']
+
+
+class PreferencesMiddleware(object):
+    """
+        Activates the timezone and language of the user's profile. Must
+        come after SessionMiddleware and AuthenticationMiddleware, except
+        in MACHINE_MIDDLEWARE_CLASSES, which only serve /api/.
+    """
+
+    def process_request(self, request):
+        tzname, lang = get_preferences(request)
 
         if tzname:
             timezone.activate(pytz.timezone(tzname))
         else:
             timezone.deactivate()
 
+        if lang:
+            translation.activate(lang)
+        else:
+            translation.deactivate()
+
+
+def query_stats(queries):
+    """
+        Summarizes queries as recorded in connection.queries
+    Args:
+        queries: list of dicts with 'sql' and 'time' (in seconds)
+
+    Returns:
+        tuple of (count, total time in ms, slowest time in ms, slowest sql)
+    """
+    total = 0.0
+    slowest = (0.0, '')
+    for query in queries:
+        elapsed = float(query['time']) * 1000
+        total += elapsed
+        if elapsed >= slowest[0]:
+            slowest = (elapsed, query['sql'])
+    return len(queries), total, slowest[0], slowest[1]
+
 
-class LocaleMiddleware(object):
+class QueryCountMiddleware(object):
     """
-        Simple middleware for setting language translations
+        Reports the SQL queries made while serving a request in the
+        X-Query-Count, X-Query-Time (ms) and X-Query-Slowest (ms and
+        statement) headers. Only active when DEBUG or PCARI['QUERY_HEADERS']
+        is set, as it makes Django keep every query. Should come first in
+        MIDDLEWARE_CLASSES so that other middlewares' queries are counted.
     """
 
     def process_request(self, request):
-        try:
-            lang = UserProfile.objects.get(user=request.user.id).language
-        except UserProfile.DoesNotExist:
-            lang = 'en'
+        if not (settings.DEBUG or settings.PCARI.get('QUERY_HEADERS')):
+            return
+        request._query_debug_cursor = connection.force_debug_cursor
+        request._query_start = len(connection.queries_log)
+        connection.force_debug_cursor = True
 
-        if lang:
-            translation.activate(lang)
-        else:
-            translation.deactivate()
+    def process_response(self, request, response):
+        start = getattr(request, '_query_start', None)
+        if start is None:
+            return response
+        connection.force_debug_cursor = request._query_debug_cursor
+
+        count, total, slowest, sql = query_stats(
+            list(connection.queries_log)[start:])
+        response['X-Query-Count'] = str(count)
+        response['X-Query-Time'] = '%.2f' % total
+        if count:
+            response['X-Query-Slowest'] = '%.2f %s' % (
+                slowest, ' '.join(sql.split())[:200])
+        return response
@@ -20,7 +20,11 @@ from django.contrib.auth.models import User
 from django.core.urlresolvers import reverse
 from django.core.validators import RegexValidator
 from django.db import models
+from django.db.models import Q
+from django.db.models.signals import post_delete
 from django.db.models.signals import post_save
+from django.db.models.signals import pre_save
+from django.utils import timezone
 from djcelery.models import PeriodicTask, IntervalSchedule
 from jsonfield import JSONField
 
@@ -79,6 +83,9 @@ class Contact(models.Model):
     """ The model containing information of the SIM Card """
     imsi = models.CharField(primary_key=True, max_length=19, unique=True)
     callerid = models.CharField(max_length=80, unique=True)
+    # what the contacts list searches in, see search_text()
+    search = models.CharField(max_length=300, blank=True, default='',
+                              editable=False)
 
     class Meta:
         db_table = 'pcari_contact'
@@ -86,6 +93,52 @@ class Contact(models.Model):
         verbose_name_plural = 'Contacts'
         ordering = ['-callerid']
 
+    @staticmethod
+    def search_text(callerid, imsi, firstname=None, lastname=None):
+        """
+            Normalized text a contact is searched by: its numbers and the
+            name of its profile, in lower case. Search terms are matched
+            against this one column instead of across the profile's.
+        """
+        return ' '.join(item for item in (callerid, imsi, firstname, lastname)
+                        if item).lower()
+
+    @staticmethod
+    def update_search(contacts):
+        """
+            Brings the search text of contacts up to date, for changes
+            that don't go through Contact.save(), ie: profiles and
+            simcards, or bulk writes
+        Args:
+            contacts: Contact queryset
+
+        Returns:
+            number of contacts updated
+        """
+        updated = 0
+        for imsi, callerid, search, firstname, lastname in list(
+                contacts.values_list(
+                    'imsi', 'callerid', 'search',
+                    'contactsimcards__contact_profile__firstname',
+                    'contactsimcards__contact_profile__lastname')):
+            text = Contact.search_text(callerid, imsi, firstname, lastname)
+            if text != search:
+                # update() doesn't send signals, so this doesn't recurse
+                Contact.objects.filter(pk=imsi).update(search=text)
+                updated += 1
+        return updated
+
+    @staticmethod
+    def search_hook(sender, instance, **kwargs):
+        names = ()
+        if not instance._state.adding:
+            names = ContactSimcards.objects.filter(
+                contact_id=instance.pk).values_list(
+                'contact_profile__firstname',
+                'contact_profile__lastname').first() or ()
+        instance.search = Contact.search_text(instance.callerid,
+                                              instance.imsi, *names)
+
     def get_profile(self):
         try:
             return ContactSimcards.objects.get(
@@ -129,6 +182,11 @@ class ContactProfile(models.Model):
     def __unicode__(self):
         return "%s %s" % (self.firstname, self.lastname)
 
+    @staticmethod
+    def search_hook(sender, instance, **kwargs):
+        Contact.update_search(Contact.objects.filter(
+            contactsimcards__contact_profile=instance))
+
 
 class ContactSimcards(models.Model):
     contact = models.OneToOneField(Contact)
@@ -145,6 +203,16 @@ class ContactSimcards(models.Model):
     # def __unicode__(self):
     #     return self.contact_profile.lastname
 
+    @staticmethod
+    def search_hook(sender, instance, **kwargs):
+        Contact.update_search(Contact.objects.filter(pk=instance.contact_id))
+
+
+pre_save.connect(Contact.search_hook, sender=Contact)
+post_save.connect(ContactProfile.search_hook, sender=ContactProfile)
+post_save.connect(ContactSimcards.search_hook, sender=ContactSimcards)
+post_delete.connect(ContactSimcards.search_hook, sender=ContactSimcards)
+
 
 class UserProfile(models.Model):
 
@@ -288,6 +356,10 @@ class GroupMembers(models.Model):
         verbose_name = 'Group Member'
         verbose_name_plural = 'Group Members'
         ordering = ['-id']
+        # members of the groups a subscriber owns, see entitlements
+        indexes = [
+            models.Index(fields=['group', 'user']),
+        ]
 
 
 REPORT_STATUS_CHOICES = (
@@ -518,6 +590,11 @@ class ServiceSubscribers(models.Model):
         verbose_name = 'Service Subscriber'
         verbose_name_plural = 'Service Subscribers'
         ordering = ['-id']
+        # unique_together covers lookups by service, this one lookups
+        # by subscriber
+        indexes = [
+            models.Index(fields=['subscriber', 'service']),
+        ]
 
 
 class ServiceManagers(models.Model):
@@ -640,12 +717,32 @@ class Promo(models.Model):
         return "%s (%s)" % (self.name, self.keyword)
 
 
+class PromoSubscriptionQuerySet(models.QuerySet):
+
+    def active(self, now=None):
+        """
+            Subscriptions that haven't expired yet, whether or not the
+            expired ones have been swept already
+        Args:
+            now: datetime, defaults to the current time
+
+        Returns:
+            QuerySet
+        """
+        if now is None:
+            now = timezone.now()
+        return self.filter(Q(date_expiration__isnull=True) |
+                           Q(date_expiration__gt=now))
+
+
 class PromoSubscription(models.Model):
     promo = models.ForeignKey(Promo)
     contact = models.ForeignKey(Contact)
 
     date_availed = models.DateTimeField(auto_now_add=True)
-    date_expiration = models.DateTimeField(null=True, blank=True)
+    # indexed for expire_subscriptions
+    date_expiration = models.DateTimeField(null=True, blank=True,
+                                           db_index=True)
 
     # TODO: The promo model needs to be redesigned to accommodate multi-tiered
     # pricing. The current scheme just extended it to accommodate a new tier
@@ -657,12 +754,18 @@ class PromoSubscription(models.Model):
     outside_sms = models.PositiveIntegerField(default=0)
     outside_call = models.PositiveIntegerField(default=0)
 
+    objects = PromoSubscriptionQuerySet.as_manager()
+
     class Meta:
         managed = True
         db_table = 'pcari_promo_subscription'
         verbose_name = 'Promo Subscriber'
         verbose_name_plural = 'Promo Subscribers'
         ordering = ['-id']
+        # charging looks up a subscriber's active subscriptions
+        indexes = [
+            models.Index(fields=['contact', 'promo', 'date_expiration']),
+        ]
 
 
 class Config(models.Model):
@@ -679,6 +782,97 @@ class Config(models.Model):
         ordering = ['-id']
 
 
+JOB_STATUS_CHOICES = (
+    ('P', 'Pending'),
+    ('R', 'Running'),
+    ('D', 'Done'),
+    ('F', 'Failed'),
+)
+
+
+class Job(models.Model):
+    """
+        Progress of work handed off to celery, so that it can be polled
+    """
+    id = models.AutoField(primary_key=True)
+    kind = models.CharField(max_length=50, blank=False, null=False)
+    document = models.ForeignKey(Document, blank=True, null=True,
+                                 on_delete=models.SET_NULL)
+    status = models.CharField(max_length=1,
+                              blank=False,
+                              null=False,
+                              choices=JOB_STATUS_CHOICES,
+                              default=JOB_STATUS_CHOICES[0][0])
+    total = models.PositiveIntegerField(default=0)
+    processed = models.PositiveIntegerField(default=0)
+    failed = models.PositiveIntegerField(default=0)
+    errors = JSONField(blank=True, default=list)
+    result = JSONField(blank=True, null=True)
+    date_created = models.DateTimeField(auto_now_add=True)
+    date_finished = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        managed = True
+        db_table = 'pcari_jobs'
+        verbose_name = 'Job'
+        verbose_name_plural = 'Jobs'
+        ordering = ['-id']
+
+    def __unicode__(self):
+        return "%s #%s (%s)" % (self.kind, self.id, self.get_status_display())
+
+    def as_dict(self, details=True):
+        """
+            Progress of the job, and if details, its errors and result,
+            which may hold subscribers' names and numbers
+        """
+        job = {
+            'id': self.id,
+            'kind': self.kind,
+            'status': self.get_status_display(),
+            'total': self.total,
+            'processed': self.processed,
+            'failed': self.failed,
+        }
+        if details:
+            job['errors'] = self.errors
+            job['result'] = self.result
+        return job
+
+
+CARRIER_TIER_CHOICES = (
+    ('globe', 'Globe'),
+    ('outside', 'Outside'),
+)
+
+
+class CarrierPrefix(models.Model):
+    """
+        Number prefixes of off-network carriers, and the tariff tier
+        (see the [tier]_[call, sms] fields of Promo) calls and sms to
+        them fall under
+    """
+    id = models.AutoField(primary_key=True)
+    prefix = models.CharField(max_length=15, blank=False, null=False,
+                              unique=True)
+    carrier = models.CharField(max_length=50, blank=False, null=False)
+    tier = models.CharField(max_length=10,
+                            blank=False,
+                            null=False,
+                            choices=CARRIER_TIER_CHOICES,
+                            default=CARRIER_TIER_CHOICES[0][0])
+
+    class Meta:
+        managed = True
+        db_table = 'pcari_carrier_prefix'
+        verbose_name = 'Carrier Prefix'
+        verbose_name_plural = 'Carrier Prefixes'
+        ordering = ['-id']
+
+    def __unicode__(self):
+        return "%s (%s)" % (self.prefix, self.carrier)
+
+
 class Ivr(models.Model):
     id = models.AutoField(primary_key=True)
     name = models.CharField(
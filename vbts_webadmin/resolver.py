@@ -0,0 +1,69 @@
+"""
+Copyright (c) 2015-present, Philippine-California Advanced Research Institutes-
+The Village Base Station Project (PCARI-VBTS). All rights reserved.
+
+This source code is licensed under the BSD-style license found in the
+LICENSE file in the root directory of this source tree.
+
+-
+Callerid to IMSI resolution for numbers within the VBTS network.
+
+Instead of probing the subscriber registry for every destination (and
+treating the exception as "off-network"), we keep an index of all local
+callerids built from SipBuddies and our own Contacts. A number that is not
+in the index is off-network until the index is refreshed, either after
+PCARI['RESOLVER_TTL'] seconds or when a Contact is saved or deleted.
+"""
+
+from django.conf import settings
+
+from vbts_subscribers.models import SipBuddies
+from vbts_webadmin.caching import TableSnapshot
+from vbts_webadmin.models import Contact
+
+
+def is_local_imsi(imsi):
+    """ Off-network contacts are stored as OFFNET<callerid> """
+    return 'IMSI' in imsi
+
+
+def _build():
+    index = {}
+    # Registry might be unreachable, ie: not yet set up or locked by
+    # the GSM stack. Our contacts still cover registered subscribers.
+    try:
+        buddies = SipBuddies.objects.exclude(callerid__isnull=True
+                                             ).values_list('callerid', 'name')
+        index.update(buddies)
+    except BaseException:
+        pass
+
+    contacts = Contact.objects.values_list('callerid', 'imsi')
+    index.update((callerid, imsi) for callerid, imsi in contacts
+                 if is_local_imsi(imsi))
+    return index
+
+
+_index = TableSnapshot(_build, [Contact],
+                       settings.PCARI.get('RESOLVER_TTL', 60))
+
+
+def get_imsi(callerid):
+    """
+        Resolves a callerid to the IMSI of a local subscriber
+    Args:
+        callerid: canonicalized number, ie: '639991111111'
+
+    Returns:
+        IMSI, or None if the number is not within the VBTS network
+    """
+    return _index.get().get(callerid)
+
+
+def is_local(callerid):
+    return get_imsi(callerid) is not None
+
+
+def refresh():
+    """ Rebuilds the index on next use """
+    _index.invalidate()
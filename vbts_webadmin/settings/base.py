@@ -7,6 +7,8 @@ LICENSE file in the root directory of this source tree.
 """
 
 import os
+import tempfile
+from kombu import Queue
 from django.utils.translation import ugettext_lazy as _
 
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -40,6 +42,7 @@ INSTALLED_APPS = [
 AUTH_PROFILE_MODULE = 'vbts_webadmin.UserProfile'
 
 MIDDLEWARE_CLASSES = (
+    'vbts_webadmin.middleware.QueryCountMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.locale.LocaleMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -49,8 +52,16 @@ MIDDLEWARE_CLASSES = (
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'django.middleware.security.SecurityMiddleware',
-    'vbts_webadmin.middleware.TimezoneMiddleware',
-    'vbts_webadmin.middleware.LocaleMiddleware',
+    'vbts_webadmin.middleware.PreferencesMiddleware',
+)
+
+# Served to FreeSWITCH's /api/ calls by vbts_webadmin.machine.MachineHandler,
+# which have no session, user or CSRF token. PreferencesMiddleware doesn't
+# look the user up for /api/, it only sets the default timezone and language.
+MACHINE_MIDDLEWARE_CLASSES = (
+    'vbts_webadmin.middleware.QueryCountMiddleware',
+    'django.middleware.common.CommonMiddleware',
+    'vbts_webadmin.middleware.PreferencesMiddleware',
 )
 
 ROOT_URLCONF = 'urls'
@@ -85,6 +96,11 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'databases/pcari3.db'),
+        # on a file rather than in memory, so that tests running requests
+        # in threads lock the database the way it's locked in production
+        'TEST': {
+            'NAME': os.path.join(tempfile.gettempdir(), 'test_pcari3.db'),
+        },
     },
     'vbts_subscribers': {
         'ENGINE': 'django.db.backends.sqlite3',
@@ -197,11 +213,80 @@ PCARI = {
         'downloads'),
     'CHATPLAN_TEMPLATES_DIR': os.path.join(
         MEDIA_ROOT,
-        'templates/chatplans')}
+        'templates/chatplans'),
+    # seconds a worker may reuse promo entitlements without checking
+    # the shared cache, see vbts_webadmin/entitlements.py
+    'ENTITLEMENT_LOCAL_TTL': 5,
+    # subscribers a worker keeps entitlements of, past that the expired
+    # ones are dropped
+    'ENTITLEMENT_LOCAL_SIZE': 1000,
+    # seconds before a worker reloads the carrier prefix table
+    'CARRIER_PREFIX_TTL': 300,
+    # seconds before a worker rebuilds its callerid to IMSI index
+    'RESOLVER_TTL': 60,
+    # seconds before a worker reloads the Config table
+    'CONFIG_TTL': 60,
+    # seconds before a worker reloads the SMS keywords of services, reports
+    # and promos, see vbts_webadmin/keywords.py
+    'KEYWORD_TTL': 60,
+    # see vbts_webadmin/sms.py
+    'SMS_BACKEND': 'vbts_webadmin.sms.EventSocketBackend',
+    # recipients fetched, recorded and sent at a time by broadcasts
+    'BROADCAST_CHUNK_SIZE': 500,
+    # seconds between sweeps for expired promo subscriptions, and how
+    # many are removed at a time
+    'EXPIRY_INTERVAL': 60,
+    'EXPIRY_BATCH_SIZE': 500,
+    # rows handled at a time by CSV imports, see vbts_webadmin/importers.py
+    'IMPORT_CHUNK_SIZE': 500,
+    # failed rows kept, with their reasons, on each import job
+    'IMPORT_MAX_ERRORS': 100,
+    # add X-Query-* headers to responses even if DEBUG is off, see
+    # vbts_webadmin.middleware.QueryCountMiddleware
+    'QUERY_HEADERS': False,
+    # outbound SMS lanes, see vbts_webadmin/sms.py. RATE is in SMS per
+    # second per worker process (None for no limit), BURST is how many
+    # may go out back to back. Keep the sum of the rates within what the
+    # BTS can deliver.
+    'SMS_LANES': {
+        'transactional': {'QUEUE': 'sms_transactional', 'RATE': None},
+        'notification': {'QUEUE': 'sms_notification', 'RATE': 2,
+                         'BURST': 10},
+        'bulk': {'QUEUE': 'sms_bulk', 'RATE': 1, 'BURST': 5},
+    },
+    'FS_EVENT_SOCKET': {
+        'HOST': '127.0.0.1',
+        'PORT': 8021,
+        'PASSWORD': 'ClueCon',
+    }}
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'entitlements': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'entitlements',
+        'TIMEOUT': 300,
+    },
+    'sms_metrics': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'sms_metrics',
+    }
+}
 
 CELERY_TIMEZONE = 'UTC'
 CELERY_RESULT_BACKEND = 'djcelery.backends.database:DatabaseBackend'
 CELERYBEAT_SCHEDULER = 'djcelery.schedulers.DatabaseScheduler'
+# SMS tasks go to the queues of their lanes (see PCARI['SMS_LANES']),
+# everything else to the default queue
+CELERY_DEFAULT_QUEUE = 'celery'
+CELERY_QUEUES = (
+    Queue('celery'),
+    Queue('sms_transactional'),
+    Queue('sms_notification'),
+    Queue('sms_bulk'),
+)
 
 MAX_UPLOAD_SIZE = 10485760  # 10MB
 
@@ -20,3 +20,16 @@ DATABASES = {
 }
 
 STATIC_ROOT = 'static'
+
+# shared by all gunicorn workers and celery on the BTS
+CACHES['entitlements'] = {
+    'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+    'LOCATION': '/var/tmp/vbts_webadmin/entitlements',
+    'TIMEOUT': 300,
+}
+# approximate, concurrent updates can be lost, see sms.record_sent()
+CACHES['sms_metrics'] = {
+    'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+    'LOCATION': '/var/tmp/vbts_webadmin/sms_metrics',
+    'TIMEOUT': None,
+}
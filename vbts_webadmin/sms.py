@@ -0,0 +1,347 @@
+"""
+Copyright (c) 2015-present, Philippine-California Advanced Research Institutes-
+The Village Base Station Project (PCARI-VBTS). All rights reserved.
+
+This source code is licensed under the BSD-style license found in the
+LICENSE file in the root directory of this source tree.
+
+-
+SMS dispatch backends.
+
+Messages are handed to FreeSWITCH's VBTS_Send_SMS as
+(callerid, text) pairs sharing the same origin. The backend is chosen
+through PCARI['SMS_BACKEND']:
+
+    * EventSocketBackend keeps one event socket connection per process
+      (i.e. per celery worker) and pipelines the commands through it.
+    * FsCliBackend forks fs_cli once per message, as we used to.
+    * LocalBackend doesn't send anything and just keeps the messages in
+      its outbox, for tests.
+
+Outbound SMS are sent in lanes (see LANES), each with its own celery queue
+and token bucket, so that a big broadcast can't hold up the replies
+subscribers are waiting for, and so that we don't hand the radio more than
+it can carry (PCARI['SMS_LANES']).
+"""
+
+import socket
+import threading
+import time
+from importlib import import_module
+from os import system
+
+from django.conf import settings
+from django.core.cache import caches
+
+from vbts_webadmin.celery import app
+
+DEFAULT_BACKEND = 'vbts_webadmin.sms.EventSocketBackend'
+
+# highest priority first
+LANES = ('transactional', 'notification', 'bulk')
+DEFAULT_LANES = {
+    'transactional': {'QUEUE': 'sms_transactional', 'RATE': None},
+    'notification': {'QUEUE': 'sms_notification', 'RATE': 2, 'BURST': 10},
+    'bulk': {'QUEUE': 'sms_bulk', 'RATE': 1, 'BURST': 5},
+}
+METRICS_CACHE_ALIAS = 'sms_metrics'
+
+
+class SmsBackendError(Exception):
+    pass
+
+
+class FsCliBackend(object):
+    """ Runs fs_cli for every message """
+
+    def send(self, origin, messages):
+        for callerid, text in messages:
+            cmd = "fs_cli -x \"python VBTS_Send_SMS %s|%s|%s\" " % (
+                callerid, origin, text.replace('"', '\\"'))
+            system(cmd)
+
+
+class LocalBackend(object):
+    """
+        Keeps sent messages as (callerid, origin, text) in outbox, and the
+        time each one was sent in timestamps
+    """
+
+    def __init__(self):
+        self.outbox = []
+        self.timestamps = []
+
+    def send(self, origin, messages):
+        for callerid, text in messages:
+            self.outbox.append((callerid, origin, text))
+            self.timestamps.append(time.time())
+
+    def clear(self):
+        del self.outbox[:]
+        del self.timestamps[:]
+
+
+class EventSocketBackend(object):
+    """
+        Sends messages through a persistent connection to FreeSWITCH's
+        inbound event socket (mod_event_socket). Commands are pipelined in
+        batches of PIPELINE_SIZE. If the connection drops, we reconnect once
+        and resend whatever hadn't been acknowledged yet.
+    """
+
+    PIPELINE_SIZE = 100
+
+    def __init__(self, host=None, port=None, password=None, timeout=None):
+        conf = settings.PCARI.get('FS_EVENT_SOCKET', {})
+        self.host = host or conf.get('HOST', '127.0.0.1')
+        self.port = port or conf.get('PORT', 8021)
+        self.password = password or conf.get('PASSWORD', 'ClueCon')
+        self.timeout = timeout or conf.get('TIMEOUT', 10)
+        self._sock = None
+        self._buffer = b''
+        self._lock = threading.Lock()
+
+    def connect(self):
+        self.close()
+        self._sock = socket.create_connection((self.host, self.port),
+                                              self.timeout)
+        headers, _ = self._read_reply()
+        if headers.get('Content-Type') != 'auth/request':
+            raise SmsBackendError('Unexpected greeting from FreeSWITCH')
+        self._sock.sendall(('auth %s\n\n' % self.password).encode('utf-8'))
+        headers, _ = self._read_reply()
+        if not headers.get('Reply-Text', '').startswith('+OK'):
+            raise SmsBackendError('FreeSWITCH event socket auth failed')
+
+    def close(self):
+        if self._sock is not None:
+            try:
+                self._sock.close()
+            except socket.error:
+                pass
+        self._sock = None
+        self._buffer = b''
+
+    def _read_line(self):
+        while b'\n' not in self._buffer:
+            data = self._sock.recv(4096)
+            if not data:
+                raise socket.error('Connection closed by FreeSWITCH')
+            self._buffer += data
+        line, self._buffer = self._buffer.split(b'\n', 1)
+        return line.decode('utf-8')
+
+    def _read_reply(self):
+        headers = {}
+        while True:
+            line = self._read_line()
+            if not line:
+                if headers:
+                    break
+                continue
+            key, _, value = line.partition(':')
+            headers[key.strip()] = value.strip()
+
+        length = int(headers.get('Content-Length', 0))
+        while len(self._buffer) < length:
+            data = self._sock.recv(4096)
+            if not data:
+                raise socket.error('Connection closed by FreeSWITCH')
+            self._buffer += data
+        body, self._buffer = self._buffer[:length], self._buffer[length:]
+        return headers, body.decode('utf-8')
+
+    @staticmethod
+    def command(callerid, origin, text):
+        # a newline ends an event socket command
+        text = text.replace('\r', '').replace('\n', '\\n')
+        return 'api python VBTS_Send_SMS %s|%s|%s\n\n' % (
+            callerid, origin, text)
+
+    def send(self, origin, messages):
+        commands = [self.command(callerid, origin, text)
+                    for callerid, text in messages]
+        with self._lock:
+            done = 0  # acknowledged commands, no need to resend them
+            for attempt in range(2):
+                try:
+                    if self._sock is None:
+                        self.connect()
+                    while done < len(commands):
+                        batch = commands[done:done + self.PIPELINE_SIZE]
+                        self._sock.sendall(''.join(batch).encode('utf-8'))
+                        for _ in batch:
+                            self._read_reply()
+                            done += 1
+                    return
+                except socket.error:
+                    self.close()
+                    if attempt:
+                        raise
+
+
+_backends = {}
+
+
+def get_backend():
+    """ Gets this process' instance of the configured backend """
+    path = settings.PCARI.get('SMS_BACKEND', DEFAULT_BACKEND)
+    backend = _backends.get(path)
+    if backend is None:
+        module, _, name = path.rpartition('.')
+        backend = _backends[path] = getattr(import_module(module), name)()
+    return backend
+
+
+class TokenBucket(object):
+    """
+        Allows rate tokens per second, with up to capacity of them saved
+        up for bursts
+    """
+
+    def __init__(self, rate, capacity=1, clock=time.time, sleep=time.sleep):
+        self.rate = float(rate)
+        self.capacity = max(int(capacity), 1)
+        self.tokens = float(self.capacity)
+        self.clock = clock
+        self.sleep = sleep
+        self.updated = clock()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = self.clock()
+        self.tokens = min(self.capacity,
+                          self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def consume(self, tokens=1):
+        """
+            Takes tokens from the bucket, waiting until there are enough
+        Args:
+            tokens: number of tokens, at most capacity
+
+        Returns:
+            seconds waited
+        """
+        if tokens > self.capacity:
+            raise ValueError('Bucket only holds %d tokens' % self.capacity)
+        waited = 0
+        with self._lock:
+            self._refill()
+            while self.tokens < tokens:
+                delay = (tokens - self.tokens) / self.rate
+                self.sleep(delay)
+                waited += delay
+                self._refill()
+            self.tokens -= tokens
+        return waited
+
+
+def get_lane(lane):
+    """ Gets the settings of a lane: QUEUE, RATE (per second) and BURST """
+    if lane not in LANES:
+        raise ValueError("Unknown SMS lane '%s'" % lane)
+    return settings.PCARI.get('SMS_LANES', {}).get(lane, DEFAULT_LANES[lane])
+
+
+_buckets = {}
+
+
+def get_bucket(lane):
+    """ Gets this process' token bucket for a lane, None if not limited """
+    conf = get_lane(lane)
+    if not conf.get('RATE'):
+        return None
+    key = (lane, conf['RATE'], conf.get('BURST', 1))
+    bucket = _buckets.get(key)
+    if bucket is None:
+        bucket = _buckets[key] = TokenBucket(conf['RATE'], key[2])
+    return bucket
+
+
+def send(origin, messages, lane='transactional', queued_at=None):
+    """
+        Sends messages through the backend, no faster than the lane allows
+    Args:
+        origin: sender's callerid
+        messages: list of (callerid, text) pairs
+        lane: one of LANES
+        queued_at: time.time() when the messages were queued, for metrics
+
+    Returns: None
+    """
+    backend = get_backend()
+    bucket = get_bucket(lane)
+    if bucket is None:
+        backend.send(origin, messages)
+    else:
+        for start in range(0, len(messages), bucket.capacity):
+            batch = messages[start:start + bucket.capacity]
+            bucket.consume(len(batch))
+            backend.send(origin, batch)
+    record_sent(lane, len(messages), queued_at)
+
+
+def _incr(cache, key, delta):
+    cache.add(key, 0, None)
+    try:
+        cache.incr(key, delta)
+    except ValueError:
+        cache.set(key, delta, None)
+
+
+def record_sent(lane, count, queued_at=None):
+    """
+        Adds to a lane's counters. Latency is measured from queued_at
+        until the messages were handed to the backend.
+
+        The counters are approximate: the file-based cache used on the BTS
+        reads and writes back on incr(), and the max latency is checked
+        before it is set, so workers recording at the same moment can lose
+        an update. That's good enough to watch the lanes with; they aren't
+        meant for billing.
+    """
+    cache = caches[METRICS_CACHE_ALIAS]
+    _incr(cache, 'sms:%s:sent' % lane, count)
+    if queued_at is None:
+        return
+    latency = int(max(time.time() - queued_at, 0) * 1000)
+    _incr(cache, 'sms:%s:batches' % lane, 1)
+    _incr(cache, 'sms:%s:latency_ms' % lane, latency)
+    if latency > (cache.get('sms:%s:max_latency_ms' % lane) or 0):
+        cache.set('sms:%s:max_latency_ms' % lane, latency, None)
+
+
+def get_queue_depth(queue):
+    """ Messages waiting in a celery queue, None if the broker won't say """
+    try:
+        with app.connection_or_acquire() as conn:
+            return conn.default_channel.queue_declare(
+                queue=queue, passive=True).message_count
+    except BaseException:
+        return None
+
+
+def get_metrics():
+    """
+        Gets queue depth and latency for every lane
+    Returns:
+        list of dicts, highest priority lane first
+    """
+    cache = caches[METRICS_CACHE_ALIAS]
+    metrics = []
+    for lane in LANES:
+        conf = get_lane(lane)
+        batches = cache.get('sms:%s:batches' % lane) or 0
+        latency = cache.get('sms:%s:latency_ms' % lane) or 0
+        metrics.append({
+            'lane': lane,
+            'queue': conf['QUEUE'],
+            'rate': conf.get('RATE'),
+            'queued': get_queue_depth(conf['QUEUE']),
+            'sent': cache.get('sms:%s:sent' % lane) or 0,
+            'avg_latency': latency / 1000.0 / batches if batches else None,
+            'max_latency': (cache.get('sms:%s:max_latency_ms' % lane) or
+                            0) / 1000.0,
+        })
+    return metrics
@@ -8,13 +8,26 @@ LICENSE file in the root directory of this source tree.
 
 from __future__ import absolute_import
 
+from datetime import timedelta
 from os import system
 import subprocess
+import time
+import uuid
 
 from celery.decorators import periodic_task
 from celery.task.schedules import crontab
+from django.conf import settings
+from django.db import transaction as db_transaction
+from django.db.models import F
+from django.utils import timezone
 
+from vbts_webadmin import sms
 from vbts_webadmin.celery import app
+from vbts_webadmin.models import Contact
+from vbts_webadmin.models import Document
+from vbts_webadmin.models import Job
+from vbts_webadmin.models import MessageRecipients
+from vbts_webadmin.models import Promo
 from vbts_webadmin.models import PromoSubscription
 from vbts_webadmin.models import Service
 from vbts_webadmin.models import ServiceSubscribers
@@ -39,8 +52,28 @@ def test(param):
     return 'The test task executed with argument "%s" ' % param
 
 
-@app.task()
-def send_sms(callerid, origin, msg, as_list=False):
+class SmsTask(app.Task):
+    """
+        Task that sends SMS in one of the sms.LANES. When queued, it goes
+        to the lane's celery queue and is told when it was queued so that
+        the lane's latency can be measured. The lane can be picked with
+        the lane keyword argument, and defaults to the task's lane.
+    """
+    abstract = True
+    lane = 'transactional'
+
+    def apply_async(self, args=None, kwargs=None, **options):
+        kwargs = dict(kwargs or {})
+        if not kwargs.get('lane'):
+            kwargs['lane'] = self.lane
+        kwargs.setdefault('queued_at', time.time())
+        options.setdefault('queue', sms.get_lane(kwargs['lane'])['QUEUE'])
+        return super(SmsTask, self).apply_async(args, kwargs, **options)
+
+
+@app.task(base=SmsTask)
+def send_sms(callerid, origin, msg, as_list=False, lane=None,
+             queued_at=None):
     """
         Sends SMS to subscriber
     Args:
@@ -48,6 +81,8 @@ def send_sms(callerid, origin, msg, as_list=False):
         origin: sender's callerid
         msg: message to be sent
         as_list: True if data passed is a list data type
+        lane: one of sms.LANES, transactional if not given
+        queued_at: time.time() when the task was queued
 
     Returns: None
 
@@ -63,10 +98,268 @@ def send_sms(callerid, origin, msg, as_list=False):
     else:
         blocks = msg_chop(msg)
 
-    for item in blocks:
-        cmd = "fs_cli -x \"python VBTS_Send_SMS %s|%s|%s\" " % (
-            callerid, origin, item.replace('"', '\\"'))
-        system(cmd)
+    sms.send(origin, [(callerid, item) for item in blocks],
+             lane or 'transactional', queued_at)
+
+
+@app.task(base=SmsTask, lane='bulk')
+def send_sms_batch(messages, origin, lane=None, queued_at=None):
+    """
+        Sends SMS to several subscribers in one go, through one connection
+    Args:
+        messages: list of (callerid, msg) pairs
+        origin: sender's callerid
+        lane: one of sms.LANES, bulk if not given
+        queued_at: time.time() when the messages were queued
+
+    Returns: None
+    """
+    sms.send(origin, [(callerid, item)
+                      for callerid, msg in messages
+                      for item in msg_chop(msg)],
+             lane or 'bulk', queued_at)
+
+
+BROADCAST_CHUNK_SIZE = settings.PCARI.get('BROADCAST_CHUNK_SIZE', 500)
+
+
+def get_recipients(recipients):
+    """
+        Gets the contacts described by a broadcast recipient query
+    Args:
+        recipients: dict with 'type' and 'ids', where type is one of
+                    'contacts' (ids are IMSIs), 'circles', 'groups',
+                    'services', or 'all' (ids are IMSIs to leave out)
+
+    Returns:
+        Contact queryset, without duplicates
+    """
+    kind = recipients['type']
+    ids = recipients.get('ids', [])
+    if kind == 'all':
+        contacts = Contact.objects.exclude(imsi__in=ids)
+    elif kind == 'contacts':
+        contacts = Contact.objects.filter(imsi__in=ids)
+    elif kind == 'circles':
+        contacts = Contact.objects.filter(circleusers__circle__in=ids)
+    elif kind == 'groups':
+        contacts = Contact.objects.filter(groupmembers__group__in=ids)
+    elif kind == 'services':
+        contacts = Contact.objects.filter(
+            servicesubscribers__service__in=ids)
+    else:
+        raise ValueError("Unknown recipient type '%s'" % kind)
+    return contacts.distinct()
+
+
+def start_broadcast(recipients, origin, msg, message=None):
+    """
+        Queues a broadcast, see broadcast()
+    Returns:
+        Job instance to poll for progress
+    """
+    job = Job.objects.create(kind='broadcast')
+    broadcast.delay(job.pk, recipients, origin, msg,
+                    message.pk if message else None)
+    return job
+
+
+@app.task(base=SmsTask, lane='bulk')
+def broadcast(job_pk, recipients, origin, msg, message_pk=None, lane=None,
+              queued_at=None):
+    """
+        Sends a message to many subscribers. Recipients are streamed from
+        the database in chunks; each chunk is recorded as MessageRecipients
+        (if the broadcast is for a Message) and then sent in one batch.
+    Args:
+        job_pk: primary key of the Job tracking this broadcast
+        recipients: recipient query, see get_recipients()
+        origin: sender's callerid
+        msg: message to be sent
+        message_pk: primary key of the Message being broadcast, if any
+        lane: one of sms.LANES, bulk if not given
+        queued_at: time.time() when the broadcast was queued
+
+    Returns: None
+    """
+    lane = lane or 'bulk'
+    job = Job.objects.filter(pk=job_pk)
+    try:
+        contacts = get_recipients(recipients).values_list('imsi', 'callerid')
+        job.update(status='R', total=contacts.count())
+
+        chunk = []
+        for contact in contacts.iterator():
+            chunk.append(contact)
+            if len(chunk) >= BROADCAST_CHUNK_SIZE:
+                _broadcast_chunk(job, chunk, origin, msg, message_pk, lane,
+                                 queued_at)
+                chunk = []
+        if chunk:
+            _broadcast_chunk(job, chunk, origin, msg, message_pk, lane,
+                             queued_at)
+    except BaseException as e:
+        job.update(status='F', result={'error': str(e)},
+                   date_finished=timezone.now())
+        raise
+    job.update(status='D', date_finished=timezone.now())
+
+
+def _broadcast_chunk(job, chunk, origin, msg, message_pk, lane, queued_at):
+    if message_pk:
+        MessageRecipients.objects.bulk_create([
+            MessageRecipients(message_id=message_pk, user_id=imsi)
+            for imsi, _ in chunk])
+    send_sms_batch([(callerid, msg) for _, callerid in chunk], origin, lane,
+                   queued_at)
+    job.update(processed=F('processed') + len(chunk))
+
+
+IMPORT_MAX_ERRORS = settings.PCARI.get('IMPORT_MAX_ERRORS', 100)
+
+
+def start_import(kind, docfile, **options):
+    """
+        Stores an uploaded CSV file as a Document and queues its import,
+        see run_import()
+    Args:
+        kind: one of importers.IMPORTS
+        docfile: the uploaded file
+        options: keyword arguments for the importer
+
+    Returns:
+        Job instance to poll for progress
+    """
+    document = Document.objects.create(
+        name='%s-%s' % (kind, uuid.uuid4().hex),
+        description='Uploaded %s' % docfile.name,
+        docfile=docfile)
+    job = Job.objects.create(kind=kind, document=document)
+    run_import.delay(job.pk, **options)
+    return job
+
+
+@app.task(ignore_result=True)
+def run_import(job_pk, **options):
+    """
+        Imports a job's CSV file with the importer for its kind. The rows
+        handled and failed are counted as the import goes, and up to
+        IMPORT_MAX_ERRORS failed rows are kept with their reasons. What
+        the importer returns ends up in the job's result.
+    Args:
+        job_pk: primary key of the Job tracking this import
+        options: keyword arguments for the importer
+
+    Returns: None
+    """
+    # importers uses these tasks
+    from vbts_webadmin import importers
+
+    job = Job.objects.select_related('document').get(pk=job_pk)
+    columns, importer = importers.IMPORTS[job.kind]
+
+    def progress(processed, errors):
+        job.processed += processed
+        job.failed += len(errors)
+        job.errors.extend(errors[:IMPORT_MAX_ERRORS - len(job.errors)])
+        job.save(update_fields=['processed', 'failed', 'errors'])
+
+    docfile = job.document.docfile
+    try:
+        docfile.open('rb')
+        # a quick first pass, just to know how far along we are
+        job.total = max(sum(1 for _ in importers.read_csv(docfile)) - 1, 0)
+        job.status = 'R'
+        job.save(update_fields=['total', 'status'])
+
+        docfile.seek(0)
+        reader = importers.read_csv(docfile)
+        if len(next(reader, [])) < columns:
+            raise ValueError('Missing required headers/fields. '
+                             'Check your CSV file again.')
+        job.result = importer(reader, progress=progress, **options)
+        job.status = 'D'
+    except BaseException as e:
+        job.result = {'error': str(e)}
+        job.status = 'F'
+    finally:
+        docfile.close()
+    job.date_finished = timezone.now()
+    job.save(update_fields=['result', 'status', 'date_finished'])
+
+
+EXPIRY_BATCH_SIZE = settings.PCARI.get('EXPIRY_BATCH_SIZE', 500)
+
+
+@periodic_task(run_every=timedelta(
+    seconds=settings.PCARI.get('EXPIRY_INTERVAL', 60)), ignore_result=True)
+def expire_subscriptions():
+    """
+        Removes expired promo subscriptions, EXPIRY_BATCH_SIZE at a time,
+        and tells their subscribers about it
+    Returns:
+        number of subscriptions removed
+    """
+    now = timezone.now()
+    total = 0
+    while True:
+        count = purge_expired(now)
+        total += count
+        if count < EXPIRY_BATCH_SIZE:
+            return total
+
+
+def purge_expired(now, limit=None):
+    """
+        Removes one batch of subscriptions that expired by now. Due rows
+        are found through the index on date_expiration and locked, so
+        overlapping sweeps don't notify anyone twice. The notices are put
+        together before the rows go, and only recorded and sent once the
+        removal is committed.
+    Args:
+        now: datetime
+        limit: batch size, EXPIRY_BATCH_SIZE if not given
+
+    Returns:
+        number of subscriptions removed
+    """
+    with db_transaction.atomic():
+        due = list(PromoSubscription.objects.select_for_update().filter(
+            date_expiration__lte=now).order_by('date_expiration').values_list(
+            'pk', 'contact_id', 'promo_id')[:limit or EXPIRY_BATCH_SIZE])
+        if not due:
+            return 0
+
+        keywords = dict(Promo.objects.filter(
+            pk__in=set(promo for _, _, promo in due)).values_list(
+            'pk', 'keyword'))
+        callerids = dict(Contact.objects.filter(
+            imsi__in=set(imsi for _, imsi, _ in due)).values_list(
+            'imsi', 'callerid'))
+        balances = {}
+        notices = []
+        messages = []
+        for _, imsi, promo in due:
+            if imsi not in balances:
+                balances[imsi] = endaga_sub.get_account_balance(imsi)
+            notices.append((imsi, balances[imsi],
+                            "Promo Expiration: %s" % keywords[promo]))
+            messages.append((callerids[imsi],
+                             "Your %s promo subscription has already "
+                             "expired." % keywords[promo]))
+
+        PromoSubscription.objects.filter(
+            pk__in=[pk for pk, _, _ in due]).delete()
+        db_transaction.on_commit(
+            lambda: _announce_expired(notices, messages))
+    return len(due)
+
+
+def _announce_expired(notices, messages):
+    """ Records and sends the notices of purge_expired() """
+    for imsi, balance, reason in notices:
+        events.create_sms_event(imsi, balance, 0, reason, '555')
+    send_sms_batch.delay(messages, '0000', lane='notification')
 
 
 @app.task()
@@ -75,14 +368,19 @@ def purge_entry(pk):
         Once a subscriber's promo subscription expires, this task will remove
         the entry from pcari_promo_subscriptions table
         Also, it sends an SMS to inform the subscriber that the
-        promo has expired
+        promo has expired. Subscriptions are no longer scheduled for this,
+        expire_subscriptions does it; this is kept for the tasks queued
+        before it took over.
     Args:
         pk: primary key of PromoSubscriptions entry
 
     Returns: None
     """
 
-    subscription = PromoSubscription.objects.get(pk=pk)
+    try:
+        subscription = PromoSubscription.objects.get(pk=pk)
+    except PromoSubscription.DoesNotExist:
+        return  # unsubscribed, or already swept
     promoname = subscription.promo.keyword
     callerid = subscription.contact.callerid
 
@@ -96,7 +394,7 @@ def purge_entry(pk):
 
     # inform user that promo has expired
     msg = "Your %s promo subscription has already expired." % promoname
-    send_sms(callerid, '0000', msg)
+    send_sms(callerid, '0000', msg, lane='notification')
 
 
 @app.task()
@@ -131,7 +429,8 @@ def push_cmd_routine(service_pk):
                 # not enough balance, TODO: determine proper action here
                 pass
             else:
-                send_sms.delay(item.subscriber.callerid, '0000', result)
+                send_sms.delay(item.subscriber.callerid, '0000', result,
+                               lane='notification')
                 endaga_sub.subtract_credit(item.subscriber.imsi,
                                            str(item.service.price))
                 event = "Received pushed content from '%s' service" % \
@@ -0,0 +1,58 @@
+"""
+Copyright (c) 2015-present, Philippine-California Advanced Research Institutes-
+The Village Base Station Project (PCARI-VBTS). All rights reserved.
+
+This source code is licensed under the BSD-style license found in the
+LICENSE file in the root directory of this source tree.
+"""
+
+from django.test import TestCase
+
+from vbts_webadmin import carriers
+from vbts_webadmin import models
+
+
+class CarrierPrefixTest(TestCase):
+
+    """
+        Classifying destinations by carrier prefix
+    """
+
+    def setUp(self):
+        carriers._prefixes.invalidate()
+
+    def tearDown(self):
+        carriers._prefixes.invalidate()
+
+    def test_default_prefixes(self):
+        """ Built-in Globe prefixes apply while the table is empty """
+        self.assertEqual(carriers.lookup('639171234567'), 'globe')
+        self.assertEqual(carriers.lookup('639361234567'), 'globe')
+        self.assertEqual(carriers.lookup('639181234567'), None)
+        self.assertEqual(carriers.lookup(''), None)
+
+    def test_longest_prefix_wins(self):
+        """ A longer prefix overrides a shorter one, and changes to the
+            table are seen right away
+        """
+        models.CarrierPrefix.objects.create(prefix='63917', carrier='Globe',
+                                            tier='globe')
+        self.assertEqual(carriers.lookup('639171234567'), 'globe')
+        self.assertEqual(carriers.lookup('639361234567'), None)
+
+        prefix = models.CarrierPrefix.objects.create(prefix='6391712',
+                                                     carrier='Other',
+                                                     tier='outside')
+        self.assertEqual(carriers.lookup('639171234567'), 'outside')
+        self.assertEqual(carriers.lookup('639171334567'), 'globe')
+
+        prefix.delete()
+        self.assertEqual(carriers.lookup('639171234567'), 'globe')
+
+    def test_billing_type(self):
+        """ Tiers without tariffs of their own are billed as outside """
+        self.assertEqual(carriers.get_billing_type('globe_call'),
+                         'outside_call')
+        self.assertEqual(carriers.get_billing_type('outside_sms'),
+                         'outside_sms')
+        self.assertEqual(carriers.get_billing_type('local_sms'), 'local_sms')
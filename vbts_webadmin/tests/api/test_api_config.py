@@ -0,0 +1,60 @@
+"""
+Copyright (c) 2015-present, Philippine-California Advanced Research Institutes-
+The Village Base Station Project (PCARI-VBTS). All rights reserved.
+
+This source code is licensed under the BSD-style license found in the
+LICENSE file in the root directory of this source tree.
+"""
+
+import pytz
+from django.test import TestCase
+
+from vbts_webadmin import config
+from vbts_webadmin import models
+
+
+class ConfigCacheTest(TestCase):
+
+    """
+        Typed, cached access to Config keys
+    """
+
+    def setUp(self):
+        config.refresh()
+        models.Config.objects.create(key='max_call_duration', value='1200')
+        models.Config.objects.create(key='min_balance_required', value='2.5')
+        models.Config.objects.create(key='promo_limit_type', value='A')
+        models.Config.objects.create(key='timezone', value='Asia/Tokyo')
+
+    def tearDown(self):
+        config.refresh()
+
+    def test_typed_getters(self):
+        self.assertEqual(config.get_int('max_call_duration'), 1200)
+        self.assertEqual(config.get_float('min_balance_required'), 2.5)
+        self.assertEqual(config.get_str('promo_limit_type'), 'A')
+        self.assertEqual(config.get_timezone(), pytz.timezone('Asia/Tokyo'))
+
+    def test_defaults(self):
+        """ Missing or malformed keys fall back to the defaults """
+        self.assertEqual(config.get_str('not_a_key', 'NA'), 'NA')
+        self.assertEqual(config.get_int('promo_limit_type', 1), 1)
+        self.assertEqual(config.get_int('min_balance_required', 0), 0)
+        models.Config.objects.filter(key='timezone').update(value='Mars')
+        config.refresh()
+        self.assertEqual(config.get_timezone(),
+                         pytz.timezone(config.DEFAULT_TIMEZONE))
+
+    def test_cached(self):
+        """ The table is read once, and reread after changes """
+        config.get_str('promo_limit_type')
+        with self.assertNumQueries(0):
+            config.get_str('promo_limit_type')
+            config.get_int('max_call_duration')
+
+        key = models.Config.objects.get(key='promo_limit_type')
+        key.value = 'B'
+        key.save()
+        self.assertEqual(config.get_str('promo_limit_type'), 'B')
+        key.delete()
+        self.assertEqual(config.get_str('promo_limit_type', 'NA'), 'NA')
@@ -0,0 +1,51 @@
+"""
+Copyright (c) 2015-present, Philippine-California Advanced Research Institutes-
+The Village Base Station Project (PCARI-VBTS). All rights reserved.
+
+This source code is licensed under the BSD-style license found in the
+LICENSE file in the root directory of this source tree.
+"""
+
+from django.test import TestCase
+from mock import patch
+
+from vbts_webadmin import entitlements
+
+
+class EntitlementCacheTest(TestCase):
+
+    """
+        Bounds of the in-process entitlement tier
+    """
+
+    imsis = ['IMSI00101000000000%d' % i for i in range(3)]
+
+    def setUp(self):
+        entitlements.clear()
+
+    def tearDown(self):
+        entitlements.clear()
+
+    def get_at(self, now, imsi):
+        with patch.object(entitlements, 'time') as clock:
+            clock.time.return_value = now
+            return entitlements.get(imsi)
+
+    @patch.object(entitlements, 'LOCAL_SIZE', 2)
+    def test_evicts_expired(self):
+        """ Expired entries are swept out when it fills up """
+        self.get_at(100, self.imsis[0])
+        self.get_at(100, self.imsis[1])
+        self.get_at(100 + entitlements.LOCAL_TTL, self.imsis[2])
+        self.assertEqual(list(entitlements._local), [self.imsis[2]])
+
+    @patch.object(entitlements, 'LOCAL_SIZE', 2)
+    def test_evicts_earliest(self):
+        """ Without expired entries, the one closest to expiring goes """
+        self.get_at(100, self.imsis[0])
+        self.get_at(101, self.imsis[1])
+        self.get_at(102, self.imsis[2])
+        self.assertEqual(sorted(entitlements._local), self.imsis[1:])
+
+        self.get_at(103, self.imsis[2])  # already in, nothing to evict
+        self.assertEqual(sorted(entitlements._local), self.imsis[1:])
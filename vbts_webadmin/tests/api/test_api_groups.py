@@ -7,13 +7,18 @@ LICENSE file in the root directory of this source tree.
 """
 
 import random
+from datetime import timedelta
 
 from django.contrib.auth.models import User
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.utils import timezone
 from mock import Mock
 
 from vbts_webadmin import models
+from vbts_webadmin.views.api_groups import set_group_members
+from vbts_webadmin.tasks import broadcast
 from vbts_webadmin.tasks import send_sms
 
 
@@ -50,6 +55,7 @@ class GroupBaseClass(TestCase):
 
     def message_group(self, imsi, name, msg):
         send_sms.delay = Mock(return_value=None)
+        broadcast.delay = Mock(return_value=None)
 
         url = '/api/group/send'
         data = {
@@ -299,3 +305,60 @@ class GroupApiLimitsTest(GroupBaseClass):
         self.assertEqual('OK CREATED', data)
         # group count should increment
         self.assertEqual(i + 1, models.Group.objects.all().count())
+
+
+class GroupMembersTest(GroupBaseClass):
+
+    """
+        Setting group members
+    """
+
+    def setUp(self):
+        self.owner = models.Contact.objects.create(
+            imsi='IMSI001010000009999', callerid='639991111111')
+        self.contacts = [
+            models.Contact.objects.create(imsi='IMSI00101000000%04d' % i,
+                                          callerid='6399922%05d' % i)
+            for i in range(50)]
+        self.group = models.Group.objects.create(name='GROUP',
+                                                 owner=self.owner)
+        for contact in self.contacts[:3]:
+            models.GroupMembers.objects.create(group=self.group, user=contact)
+
+    def members(self):
+        return sorted(self.group.members.values_list('callerid', flat=True))
+
+    def test_set_group_members(self):
+        """ Only the changes are applied, in a few queries """
+        kept = self.contacts[1:50]
+        offnet = ['6391712%05d' % i for i in range(50)]
+        mems = ','.join([item.callerid for item in kept] + offnet +
+                        [kept[0].callerid, '12345'])
+        member = models.GroupMembers.objects.get(group=self.group,
+                                                 user=self.contacts[1])
+        with CaptureQueriesContext(connection) as queries:
+            invalid = set_group_members(mems, self.group)
+        self.assertEqual(len(invalid), 1)
+        self.assertEqual(self.members(),
+                         sorted([item.callerid for item in kept] + offnet))
+        self.assertEqual(models.Contact.objects.filter(
+            imsi__startswith='OFFNET').count(), 50)
+        # whatever the number of members
+        self.assertLess(len(queries.captured_queries), 20)
+        # the members kept weren't removed and added again
+        self.assertTrue(models.GroupMembers.objects.filter(
+            pk=member.pk).exists())
+
+    def test_edit_group(self):
+        """ Editing a group replaces its members """
+        models.Group.objects.filter(pk=self.group.pk).update(
+            last_modified=timezone.now() - timedelta(days=31))
+        send_sms.delay = Mock(return_value=None)
+        response = self.client.post('/api/group/edit', data={
+            'imsi': self.owner.imsi,
+            'name': 'GROUP',
+            'mems': '%s,639171234567,12345' % self.contacts[0].callerid,
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.members(),
+                         sorted([self.contacts[0].callerid, '639171234567']))
@@ -0,0 +1,80 @@
+"""
+Copyright (c) 2015-present, Philippine-California Advanced Research Institutes-
+The Village Base Station Project (PCARI-VBTS). All rights reserved.
+
+This source code is licensed under the BSD-style license found in the
+LICENSE file in the root directory of this source tree.
+"""
+
+from django.contrib.auth.models import User
+from django.test import TestCase
+from mock import Mock
+
+from core.subscriber import subscriber as endaga_sub
+from vbts_webadmin import keywords
+from vbts_webadmin import models
+from vbts_webadmin.tasks import send_sms
+
+
+class KeywordRegistryTest(TestCase):
+
+    """
+        Routing SMS keywords without looking them up
+    """
+
+    def setUp(self):
+        keywords.refresh()
+        self.admin = User.objects.create(username='XX', email='XX@user.com')
+        self.manager = models.Contact.objects.create(
+            imsi='IMSI001010000009999', callerid='639991111111')
+        self.report = models.Report.objects.create(
+            name='Sample Report', keyword='KEY', number='111',
+            author=self.admin, chatplan='sample.xml', status='P')
+        models.ReportManagers.objects.create(report=self.report,
+                                             manager=self.manager)
+        self.promo = models.Promo.objects.create(
+            author=self.admin, name='Sample Promo', description='Promo info',
+            price=100, promo_type='B', keyword='KEY', validity=1)
+
+    def tearDown(self):
+        keywords.refresh()
+
+    def test_lookup(self):
+        """ Keywords are found by kind, in any case, without queries """
+        keywords.lookup(keywords.REPORT, 'KEY')
+        with self.assertNumQueries(0):
+            report = keywords.lookup(keywords.REPORT, ' key ')
+            promo = keywords.lookup(keywords.PROMO, 'Key')
+            self.assertIsNone(keywords.lookup(keywords.SERVICE, 'KEY'))
+        self.assertEqual(report.pk, self.report.pk)
+        self.assertTrue(report.published)
+        self.assertEqual(report.managers, (('IMSI001010000009999',
+                                            '639991111111'),))
+        self.assertEqual(promo.pk, self.promo.pk)
+        self.assertEqual(promo.price, 100)
+        self.assertEqual(promo.description, 'Promo info')
+
+    def test_changes(self):
+        """ Saved or deleted records are seen right away """
+        self.report.status = 'U'
+        self.report.save()
+        self.assertIsNone(keywords.lookup(keywords.REPORT, 'KEY',
+                                          published=True))
+        self.assertFalse(keywords.lookup(keywords.REPORT, 'KEY').published)
+
+        models.ReportManagers.objects.filter(report=self.report).delete()
+        self.assertEqual(keywords.lookup(keywords.REPORT, 'KEY').managers, ())
+
+        self.promo.delete()
+        self.assertIsNone(keywords.lookup(keywords.PROMO, 'KEY'))
+
+    def test_submit_report(self):
+        """ Reports are routed to their managers """
+        endaga_sub.get_numbers_from_imsi = Mock(return_value=['639991111111'])
+        send_sms.delay = Mock(return_value=None)
+        response = self.client.post('/api/report/submit', {
+            'imsi': self.manager.imsi, 'keyword': 'key', 'message': 'Hi'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(models.ReportMessages.objects.get().report_id,
+                         self.report.pk)
+        self.assertEqual(send_sms.delay.call_args[0][0], '639991111111')
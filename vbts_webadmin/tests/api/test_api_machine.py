@@ -0,0 +1,116 @@
+"""
+Copyright (c) 2015-present, Philippine-California Advanced Research Institutes-
+The Village Base Station Project (PCARI-VBTS). All rights reserved.
+
+This source code is licensed under the BSD-style license found in the
+LICENSE file in the root directory of this source tree.
+"""
+
+import json
+
+from django.conf import settings
+from django.core.signals import request_finished
+from django.core.signals import request_started
+from django.db import close_old_connections
+from django.test import RequestFactory
+from django.test import TestCase
+from django.utils.module_loading import import_string
+from mock import Mock
+from mock import patch
+
+from vbts_webadmin import models
+from vbts_webadmin.machine import MachineDispatcher
+from vbts_webadmin.machine import MachineHandler
+
+
+def call_wsgi(application, environ):
+    """
+        Calls a WSGI application like a server would
+    Returns:
+        tuple of (status, dict of headers, body)
+    """
+    started = {}
+
+    def start_response(status, headers, exc_info=None):
+        started['status'] = status
+        started['headers'] = dict(headers)
+
+    # like the test client, keep the test's connection open
+    request_started.disconnect(close_old_connections)
+    request_finished.disconnect(close_old_connections)
+    try:
+        response = application(environ, start_response)
+        body = b''.join(response)
+        response.close()
+    finally:
+        request_started.connect(close_old_connections)
+        request_finished.connect(close_old_connections)
+    return started['status'], started['headers'], body
+
+
+class MachineHandlerTest(TestCase):
+
+    """
+        /api/ calls served without the dashboard's middleware
+    """
+
+    def setUp(self):
+        self.handler = MachineHandler()
+        self.factory = RequestFactory()
+        self.job = models.Job.objects.create(kind='broadcast', total=3)
+
+    def test_middleware(self):
+        """ Only the machine middleware is loaded """
+        self.assertEqual(len(self.handler._request_middleware), 3)
+        self.assertNotIn(
+            'django.contrib.sessions.middleware.SessionMiddleware',
+            settings.MACHINE_MIDDLEWARE_CLASSES)
+        self.assertIn('django.contrib.sessions.middleware.SessionMiddleware',
+                      settings.MIDDLEWARE_CLASSES)
+
+    def test_middleware_settings_untouched(self):
+        """ Loading doesn't swap MIDDLEWARE_CLASSES, even for a moment """
+        loaded = []
+        middleware_classes = settings.MIDDLEWARE_CLASSES
+
+        def spy(path):
+            loaded.append((path, settings.MIDDLEWARE_CLASSES))
+            return import_string(path)
+
+        with patch('vbts_webadmin.machine.import_string', side_effect=spy):
+            MachineHandler()
+        self.assertEqual([path for path, _ in loaded],
+                         list(settings.MACHINE_MIDDLEWARE_CLASSES))
+        for _, seen in loaded:
+            self.assertEqual(seen, middleware_classes)
+
+    def test_api(self):
+        """ API views are served, whatever the client accepts """
+        environ = self.factory.get('/api/job/%s' % self.job.pk,
+                                   HTTP_ACCEPT='text/html').environ
+        status, headers, body = call_wsgi(self.handler, environ)
+        self.assertEqual(status, '200 OK')
+        self.assertEqual(headers['Content-Type'], 'application/json')
+        self.assertNotIn('Set-Cookie', headers)
+        self.assertNotIn('Vary', headers)
+        self.assertEqual(json.loads(body.decode('utf-8'))['total'], 3)
+
+    def test_dashboard(self):
+        """ Only the API is routed """
+        environ = self.factory.get('/dashboard/').environ
+        status, _, _ = call_wsgi(self.handler, environ)
+        self.assertEqual(status, '404 Not Found')
+
+    def test_dispatcher(self):
+        """ /api/ goes to the machine handler, the rest to the site """
+        site = Mock(return_value=[b'site'])
+        application = MachineDispatcher(site, self.handler)
+
+        environ = self.factory.get('/api/job/%s' % self.job.pk).environ
+        status, _, _ = call_wsgi(application, environ)
+        self.assertEqual(status, '200 OK')
+        self.assertEqual(site.call_count, 0)
+
+        environ = self.factory.get('/dashboard/').environ
+        application(environ, Mock())
+        self.assertEqual(site.call_count, 1)
@@ -8,17 +8,30 @@ LICENSE file in the root directory of this source tree.
 
 import random
 from datetime import timedelta
+from multiprocessing.pool import ThreadPool
 
 from core import billing
 from core.subscriber import subscriber as endaga_sub
 from django.contrib.auth.models import User
+from django.db import OperationalError
+from django.db import connection
+from django.db.models import F
+from django.test import Client
 from django.test import TestCase
+from django.test import TransactionTestCase
 from django.utils import timezone
 from mock import Mock
+from mock import patch
 
+from vbts_webadmin import charging
+from vbts_webadmin import config
+from vbts_webadmin import entitlements
 from vbts_webadmin import models
+from vbts_webadmin import tasks
+from vbts_webadmin.tasks import expire_subscriptions
 from vbts_webadmin.tasks import purge_entry
 from vbts_webadmin.tasks import send_sms
+from vbts_webadmin.tasks import send_sms_batch
 from vbts_webadmin.utils import float_to_mc
 from core import events
 
@@ -31,6 +44,8 @@ class BaseClass(TestCase):
 
     @classmethod
     def setUpClass(cls):
+        entitlements.clear()
+
         # create our required configuration keys
         cls.key1 = models.Config(key='max_promo_call_duration', value='180')
         cls.key1.save()
@@ -53,6 +68,13 @@ class BaseClass(TestCase):
         cls.key4.delete()
         cls.admin.delete()
 
+    def _post_teardown(self):
+        # rows rolled back after each test don't send signals,
+        # so whatever got cached about them has to go too
+        entitlements.clear()
+        config.refresh()
+        super(BaseClass, self)._post_teardown()
+
     def subscribe_to_promo(self, imsi, keyword, balance):
         endaga_sub.get_account_balance = Mock(return_value=balance)
         endaga_sub.subtract_credit = Mock(return_value=None)
@@ -491,6 +513,92 @@ class BulkPromoTest(BaseClass):
             self.assertEqual(codes[i], 200)
             self.assertEqual(data[i], expected[i])
 
+    def test_get_service_type_single_query(self):
+        """ Charging decision should take a single query no matter how many
+            promo types the subscriber is subscribed to, and U should still
+            take priority over B. The next hops are served from the
+            entitlement cache.
+        """
+        unli = models.PromoSubscription(
+            promo=self.promo_not_bulk,
+            contact=self.subscriber,
+            date_expiration=timezone.now() + timedelta(
+                self.promo_not_bulk.validity),
+            local_sms=self.promo_not_bulk.local_sms)
+        unli.save()
+        url = '/api/promo/getservicetype'
+        data = {
+            'trans': 'local_sms',
+            'imsi': self.imsi,
+            'dest': '63999999123'
+        }
+        with self.assertNumQueries(1):
+            response = self.client.post(url, data=data)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, 'U_local_sms')
+
+        data['trans'] = 'local_call'
+        with self.assertNumQueries(0):
+            response = self.client.post(url, data=data)
+        self.assertEqual(response.data, 'B_local_call')
+        unli.delete()
+
+    def test_authorize(self):
+        """ Authorize should return everything the separate call setup
+            endpoints return, in one response
+        """
+        url = '/api/promo/authorize'
+        data = {
+            'trans': 'local_call',
+            'imsi': self.imsi,
+            'dest': '63999999123',
+            'balance': 1000000
+        }
+        response = self.client.post(url, data=data)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.data,
+            'service_type=B_local_call&tariff=0&min_bal=0&sec_avail=%d' %
+            (self.quota[1] * 60))
+
+        data['trans'] = 'local_sms'
+        response = self.client.post(url, data=data)
+        self.assertEqual(response.data,
+                         'service_type=B_local_sms&tariff=0&min_bal=0')
+
+        del data['balance']
+        response = self.client.post(url, data=data)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data, 'Missing Args')
+
+    def test_entitlement_cache_invalidated(self):
+        """ Changes to a subscription should be seen by the next lookup """
+        url = '/api/promo/getservicetype'
+        data = {
+            'trans': 'local_sms',
+            'imsi': self.imsi,
+            'dest': '63999999123'
+        }
+        response = self.client.post(url, data=data)
+        self.assertEqual(response.data, 'B_local_sms')
+
+        self.subscription.local_sms = 0
+        self.subscription.save()
+        response = self.client.post(url, data=data)
+        self.assertEqual(response.data, 'local_sms')
+
+        unli = models.PromoSubscription(
+            promo=self.promo_not_bulk,
+            contact=self.subscriber,
+            local_sms=self.promo_not_bulk.local_sms)
+        unli.save()
+        response = self.client.post(url, data=data)
+        self.assertEqual(response.data, 'U_local_sms')
+
+        unli.delete()
+        response = self.client.post(url, data=data)
+        self.assertEqual(response.data, 'local_sms')
+
     def test_quota_deduct_random(self):
         """We should be able to deduct from Bulk promo quotas correctly"""
         reg_types = ['B_local_sms', 'B_local_call',
@@ -498,18 +606,20 @@ class BulkPromoTest(BaseClass):
                      ]
         amount = []
         expected = []
+        responses = []
         for i in xrange(0, len(reg_types)):
-            num = random.randint(0, 100)
+            num = random.randint(1, 100)
             amount.append(num)
-            if self.quota[i] - num > 0:
+            if self.quota[i] - num >= 0:
                 expected.append(self.quota[i] - num)
+                responses.append((200, 'OK %d' % expected[i]))
             else:
                 expected.append(self.quota[i])
+                responses.append((402, 'Insufficient quota %d' % expected[i]))
         codes, data = self.quota_deduct(reg_types, amount)
         self.subscription.refresh_from_db()
         for i in xrange(0, len(reg_types)):
-            self.assertEqual(codes[i], 200)
-            self.assertEqual(data[i], 'OK')
+            self.assertEqual((codes[i], data[i]), responses[i])
             key = 'self.subscription.' + reg_types[i][2:]
             current_quota = eval(key)
             self.assertEqual(current_quota, expected[i])
@@ -599,11 +709,142 @@ class BulkPromoTest(BaseClass):
         self.subscription.refresh_from_db()
         for i in xrange(0, len(reg_types)):
             self.assertEqual(codes[i], 200)
-            self.assertEqual(data[i], 'OK')
+            self.assertEqual(data[i], 'OK 0')
             key = 'self.subscription.' + reg_types[i][2:]
             current_quota = eval(key)
             self.assertEqual(current_quota, 0)
 
+    def test_quota_deduct_spills_over(self):
+        """ Deduction should spill over to the next subscription if the
+            earliest one can't cover it, and deduct nothing if all of them
+            together can't
+        """
+        later = models.PromoSubscription(
+            promo=self.promo_bulk,
+            contact=self.subscriber,
+            date_expiration=timezone.now() + timedelta(
+                self.promo_bulk.validity + 1),
+            local_sms=5)
+        later.save()
+
+        codes, data = self.quota_deduct(['B_local_sms'],
+                                        [self.quota[0] + 10])
+        self.assertEqual(codes[0], 402)
+        self.assertEqual(data[0], 'Insufficient quota %d' %
+                         (self.quota[0] + 5))
+        self.subscription.refresh_from_db()
+        later.refresh_from_db()
+        self.assertEqual(self.subscription.local_sms, self.quota[0])
+        self.assertEqual(later.local_sms, 5)
+
+        codes, data = self.quota_deduct(['B_local_sms'],
+                                        [self.quota[0] + 3])
+        self.assertEqual(codes[0], 200)
+        self.assertEqual(data[0], 'OK 2')
+        self.subscription.refresh_from_db()
+        later.refresh_from_db()
+        self.assertEqual(self.subscription.local_sms, 0)
+        self.assertEqual(later.local_sms, 2)
+        later.delete()
+
+    def spill_meanwhile(self, later, taken):
+        """
+            Patches get_allocation() so that, once the spill has read the
+            subscriptions, another deduction takes from later
+        """
+        allocation = charging.get_allocation
+        calls = []
+
+        def deduct_meanwhile(subscription, service_type):
+            if not calls:
+                models.PromoSubscription.objects.filter(pk=later.pk).update(
+                    local_sms=F('local_sms') - taken)
+            calls.append(subscription)
+            return allocation(subscription, service_type)
+
+        return patch.object(charging, 'get_allocation',
+                            side_effect=deduct_meanwhile)
+
+    def test_quota_spill_changed(self):
+        """ A spill that another deduction got in the way of is read and
+            tried again, and deducts nothing if what's left can't cover it
+        """
+        later = models.PromoSubscription.objects.create(
+            promo=self.promo_bulk,
+            contact=self.subscriber,
+            date_expiration=timezone.now() + timedelta(
+                self.promo_bulk.validity + 1),
+            local_sms=5)
+
+        with self.spill_meanwhile(later, 1):
+            self.assertTrue(charging._spill_quota(
+                self.imsi, 'local_sms', self.quota[0] + 3))
+        self.subscription.refresh_from_db()
+        later.refresh_from_db()
+        self.assertEqual(self.subscription.local_sms, 0)
+        self.assertEqual(later.local_sms, 1)
+
+        self.subscription.local_sms = self.quota[0]
+        self.subscription.save()
+        later.local_sms = 5
+        later.save()
+        with self.spill_meanwhile(later, 3):
+            self.assertFalse(charging._spill_quota(
+                self.imsi, 'local_sms', self.quota[0] + 3))
+        # what was taken from the earliest one is rolled back
+        self.subscription.refresh_from_db()
+        later.refresh_from_db()
+        self.assertEqual(self.subscription.local_sms, self.quota[0])
+        self.assertEqual(later.local_sms, 2)
+        later.delete()
+
+    def test_quota_spill_locked(self):
+        """ A spill that can't get the database lock is tried again """
+        later = models.PromoSubscription.objects.create(
+            promo=self.promo_bulk,
+            contact=self.subscriber,
+            date_expiration=timezone.now() + timedelta(
+                self.promo_bulk.validity + 1),
+            local_sms=5)
+        allocation = charging.get_allocation
+        locked = OperationalError('database is locked')
+        calls = []
+
+        def locked_once(subscription, service_type):
+            calls.append(subscription)
+            if len(calls) == 1:
+                raise locked
+            return allocation(subscription, service_type)
+
+        with patch.object(charging, 'get_allocation',
+                          side_effect=locked_once):
+            self.assertTrue(charging._spill_quota(
+                self.imsi, 'local_sms', self.quota[0] + 3))
+        later.refresh_from_db()
+        self.assertEqual(later.local_sms, 2)
+
+        # but not forever
+        with patch.object(charging, 'SPILL_BACKOFF', 0), \
+                patch.object(charging, 'get_allocation',
+                             side_effect=locked) as get_allocation:
+            self.assertFalse(charging._spill_quota(
+                self.imsi, 'local_sms', 1))
+        self.assertEqual(get_allocation.call_count, charging.SPILL_ATTEMPTS)
+        later.delete()
+
+    def test_quota_deduct_insufficient(self):
+        """ Nothing deducted is an error to FreeSWITCH, and so is a
+            quota deduction of nothing
+        """
+        codes, data = self.quota_deduct(['B_local_sms', 'B_local_sms',
+                                         'B_local_sms'],
+                                        [self.quota[0] + 1, 0, -1])
+        self.assertEqual(codes, [402, 400, 400])
+        self.assertEqual(data, ['Insufficient quota %d' % self.quota[0],
+                                'Invalid amount', 'Invalid amount'])
+        self.subscription.refresh_from_db()
+        self.assertEqual(self.subscription.local_sms, self.quota[0])
+
 
 class UnliPromoTest(BaseClass):
 
@@ -984,6 +1225,64 @@ class PromoSubscriptionTest(BaseClass):
         self.assertEqual(code, 404)
         self.assertEqual(data, 'Not Found')
 
+    def test_expire_subscriptions(self):
+        """Expired subscriptions are swept in batches and announced"""
+        now = timezone.now()
+        for days in (-3, -2, -1, 1):
+            models.PromoSubscription.objects.create(
+                promo=self.promo, contact=self.subscriber,
+                date_expiration=now + timedelta(days))
+        endaga_sub.get_account_balance = Mock(return_value=100)
+        events.create_sms_event = Mock(return_value=None)
+        send_sms_batch.delay = Mock(return_value=None)
+
+        tasks.EXPIRY_BATCH_SIZE, batch_size = 2, tasks.EXPIRY_BATCH_SIZE
+        committed = []
+        try:
+            with patch('django.db.transaction.on_commit',
+                       side_effect=committed.append):
+                self.assertEqual(expire_subscriptions(), 3)
+        finally:
+            tasks.EXPIRY_BATCH_SIZE = batch_size
+
+        self.assertEqual(models.PromoSubscription.objects.filter(
+            contact=self.subscriber).count(), 1)
+        # nobody hears about it until the removal is committed
+        self.assertEqual(len(committed), 2)
+        self.assertFalse(events.create_sms_event.called)
+        self.assertFalse(send_sms_batch.delay.called)
+        for callback in committed:
+            callback()
+        self.assertEqual(events.create_sms_event.call_count, 3)
+        self.assertEqual(send_sms_batch.delay.call_count, 2)
+        messages = send_sms_batch.delay.call_args_list[0][0][0]
+        self.assertEqual(messages, [
+            (self.callerid,
+             'Your ANYPROMO promo subscription has already expired.')] * 2)
+        self.assertEqual(expire_subscriptions(), 0)
+
+    def test_expired_subscription_grants_nothing(self):
+        """Expired subscriptions don't count even before they're swept"""
+        models.PromoSubscription.objects.create(
+            promo=self.promo, contact=self.subscriber,
+            date_expiration=timezone.now() - timedelta(seconds=1),
+            local_sms=10, local_call=10, outside_sms=10, outside_call=10)
+        models.PromoSubscription.objects.create(
+            promo=self.promo, contact=self.subscriber, date_expiration=None)
+
+        self.assertEqual(models.PromoSubscription.objects.filter(
+            contact=self.subscriber).count(), 2)
+        self.assertEqual(models.PromoSubscription.objects.active().filter(
+            contact=self.subscriber).count(), 1)
+        self.assertEqual(charging.get_service_type(
+            self.imsi, 'local_sms', self.callerid), 'local_sms')
+        self.assertEqual(charging.deduct_quota(self.imsi, 'local_sms', 1),
+                         (False, 0))
+
+    def test_purge_entry_already_removed(self):
+        """Leftover purge tasks don't fail on missing subscriptions"""
+        self.assertEqual(purge_entry(123456789), None)
+
 
 class PromoLimitsTest(BaseClass):
 
@@ -1429,3 +1728,85 @@ class PromoRequiredMinBalanceTest(BaseClass):
         self.assertEqual(code, 402)
         self.assertEqual(data, 'Insufficient balance')
         self.assertEqual(0, models.PromoSubscription.objects.all().count())
+
+
+class ConcurrentQuotaDeductTest(TransactionTestCase):
+
+    """
+        Deductions hitting the same IMSI at the same time should
+        neither be lost nor push the quota below zero
+    """
+
+    def setUp(self):
+        entitlements.clear()
+        self.admin = User.objects.create(username='User',
+                                         email='user@user.com')
+        self.subscriber = models.Contact.objects.create(
+            imsi='IMSI001010000009999', callerid='639991111111')
+        self.promo = models.Promo.objects.create(author=self.admin,
+                                                 name='Bulk Promo',
+                                                 price=float_to_mc(10),
+                                                 promo_type='B',
+                                                 keyword='BULKPROMO',
+                                                 number='555',
+                                                 local_sms=150)
+        self.subscriptions = [
+            models.PromoSubscription.objects.create(
+                promo=self.promo,
+                contact=self.subscriber,
+                date_expiration=timezone.now() + timedelta(days),
+                local_sms=150)
+            for days in (1, 2)]
+
+    def tearDown(self):
+        entitlements.clear()
+
+    def deduct(self, amount=1):
+        try:
+            response = Client().post('/api/promo/deduct', data={
+                'trans': 'B_local_sms',
+                'imsi': self.subscriber.imsi,
+                'amount': amount})
+            return response.status_code
+        finally:
+            connection.close()
+
+    def remaining(self):
+        for item in self.subscriptions:
+            item.refresh_from_db()
+        return [item.local_sms for item in self.subscriptions]
+
+    def test_parallel_deductions(self):
+        """ Parallel deductions against a 2 x 150 quota """
+        pool = ThreadPool(16)
+        codes = pool.map(self.deduct, [1] * 250)
+        self.assertEqual(set(codes), set([200]))
+        self.assertEqual(self.remaining(), [0, 50])
+
+        # more requests than quota left
+        codes = pool.map(self.deduct, [1] * 100)
+        pool.close()
+        pool.join()
+        self.assertEqual(codes.count(200), 50)
+        self.assertEqual(codes.count(402), 50)
+        self.assertEqual(self.remaining(), [0, 0])
+
+    def test_parallel_spills(self):
+        """ Parallel deductions that spill over 3 x 25 quotas """
+        self.subscriptions.append(models.PromoSubscription.objects.create(
+            promo=self.promo,
+            contact=self.subscriber,
+            date_expiration=timezone.now() + timedelta(3),
+            local_sms=150))
+        models.PromoSubscription.objects.update(local_sms=25)
+        entitlements.clear()
+
+        # 25 doesn't divide by 3, so deductions have to spill
+        pool = ThreadPool(16)
+        codes = pool.map(self.deduct, [3] * 40)
+        pool.close()
+        pool.join()
+        # nothing lost nor taken twice
+        self.assertEqual(codes.count(200), 25)
+        self.assertEqual(codes.count(402), 15)
+        self.assertEqual(self.remaining(), [0, 0, 0])
@@ -0,0 +1,243 @@
+"""
+Copyright (c) 2015-present, Philippine-California Advanced Research Institutes-
+The Village Base Station Project (PCARI-VBTS). All rights reserved.
+
+This source code is licensed under the BSD-style license found in the
+LICENSE file in the root directory of this source tree.
+"""
+
+from datetime import timedelta
+
+from core.subscriber import subscriber as endaga_sub
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.test import override_settings
+from django.utils import timezone
+from mock import Mock
+from mock import patch
+
+from vbts_webadmin import carriers
+from vbts_webadmin import config
+from vbts_webadmin import entitlements
+from vbts_webadmin import keywords
+from vbts_webadmin import models
+from vbts_webadmin import resolver
+from vbts_webadmin.tasks import broadcast
+from vbts_webadmin.tasks import send_sms
+from vbts_webadmin.tests.utils import QueryBudgetMixin
+from vbts_webadmin.utils import float_to_mc
+from core import events
+
+
+class QueryBudgetTest(QueryBudgetMixin, TestCase):
+
+    """
+        Number of queries the API may make per request. The config,
+        carrier prefix, callerid and keyword caches are warmed up first;
+        entitlements are not, so each request pays for loading them.
+
+        Groups and services have several members, subscribers and managers
+        so that a query per row shows up as going over the budget.
+        DeleteGroup and removing members through EditGroupMems aren't
+        budgeted: each deleted GroupMembers row looks up its group's owner
+        to invalidate their entitlements.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create(username='User',
+                                        email='user@user.com')
+        cls.imsi = 'IMSI001010000000001'
+        cls.callerid = '639990000001'
+        cls.subscriber = models.Contact.objects.create(imsi=cls.imsi,
+                                                       callerid=cls.callerid)
+        models.Contact.objects.create(imsi='IMSI001010000000002',
+                                      callerid='639990000002')
+        models.Config.objects.create(key='promo_limit_type', value='B')
+        models.Config.objects.create(key='max_promo_subscription',
+                                     value='10')
+
+        for promo_type in ('B', 'U', 'D'):
+            promo = models.Promo.objects.create(
+                author=cls.admin, name='%s Promo' % promo_type,
+                price=float_to_mc(10), promo_type=promo_type,
+                keyword='%sPROMO' % promo_type, number='555', validity=3,
+                local_sms=10, local_call=10, outside_sms=10, outside_call=10)
+            models.PromoSubscription.objects.create(
+                promo=promo, contact=cls.subscriber,
+                date_expiration=timezone.now() + timedelta(3),
+                local_sms=10, local_call=10, outside_sms=10, outside_call=10)
+
+        cls.members = [models.Contact.objects.create(
+            imsi='IMSI00101000000001%d' % i, callerid='63999000001%d' % i)
+            for i in range(5)]
+        cls.group = models.Group.objects.create(name='GROUP',
+                                                owner=cls.subscriber)
+        for member in cls.members:
+            models.GroupMembers.objects.create(group=cls.group, user=member)
+        models.Group.objects.filter(pk=cls.group.pk).update(
+            last_modified=timezone.now() - timedelta(60))
+
+        script = models.Script.objects.create(
+            name='Sample Script', author='Some One', version='0.0.1',
+            package_name='sample name', fs_script='PCARI_dictionary.py',
+            chatplan='dictionary.xml', status='D', arguments='{"arg": 11}')
+        service = models.Service.objects.create(
+            name='Sample Service', keyword='SERVICE', number='111',
+            author=cls.admin, script=script, status='P', service_type='P',
+            price=1)
+        models.ServiceManagers.objects.create(service=service,
+                                              manager=cls.subscriber)
+        report = models.Report.objects.create(
+            name='Sample Report', keyword='REPORT', number='111',
+            author=cls.admin, status='P')
+        for member in cls.members:
+            models.ServiceSubscribers.objects.create(service=service,
+                                                     subscriber=member)
+            models.ReportManagers.objects.create(report=report,
+                                                 manager=member)
+        cls.job = models.Job.objects.create(kind='broadcast')
+
+    def setUp(self):
+        config.get_str('timezone')
+        carriers.lookup(self.callerid)
+        resolver.get_imsi(self.callerid)
+        keywords.lookup(keywords.PROMO, '')
+        entitlements.clear()
+
+        endaga_sub.get_account_balance = Mock(return_value=100000000)
+        endaga_sub.subtract_credit = Mock(return_value=None)
+        endaga_sub.get_numbers_from_imsi = Mock(return_value=[self.callerid])
+        events.create_sms_event = Mock(return_value=None)
+        send_sms.delay = Mock(return_value=None)
+        broadcast.delay = Mock(return_value=None)
+
+    def tearDown(self):
+        entitlements.clear()
+        config.refresh()
+        keywords.refresh()
+
+    def call(self, trans='local_call'):
+        return {'imsi': self.imsi, 'trans': trans, 'dest': '639990000002',
+                'balance': '100000'}
+
+    def test_charging_budget(self):
+        self.assertQueryBudget(2, '/api/promo/getservicetype', self.call())
+        self.assertQueryBudget(2, '/api/promo/getservicetariff', self.call())
+        self.assertQueryBudget(2, '/api/promo/getsecavail', self.call())
+        self.assertQueryBudget(2, '/api/promo/authorize', self.call())
+        self.assertQueryBudget(0, '/api/promo/getminbal', {
+            'trans': 'B_local_call', 'tariff': '1000'})
+
+    def test_quota_deduct_budget(self):
+        response = self.assertQueryBudget(3, '/api/promo/deduct', {
+            'imsi': self.imsi, 'trans': 'B_local_sms', 'amount': '1'})
+        self.assertEqual(response.data, 'OK 9')
+
+    def test_promo_status_budget(self):
+        """ One query no matter how many subscriptions there are """
+        promo = models.Promo.objects.get(keyword='BPROMO')
+        for _ in range(10):
+            models.PromoSubscription.objects.create(
+                promo=promo, contact=self.subscriber,
+                date_expiration=timezone.now() + timedelta(3),
+                local_sms=5, outside_call=7)
+
+        self.assertQueryBudget(1, '/api/promo/status', {
+            'imsi': self.imsi, 'keyword': ''})
+        self.assertEqual(send_sms.delay.call_count, 1)
+        msg = send_sms.delay.call_args[0][2]
+        self.assertEqual(msg.count('promo status'), 13)
+        self.assertEqual(msg.count('BPROMO local texts: 5\\n'), 10)
+        self.assertEqual(msg.count('BPROMO outside call mins: 7\\n'), 10)
+        self.assertIn('UPROMO unli local calls\\n', msg)
+        self.assertIn('DPROMO local texts discount price: P', msg)
+        self.assertFalse(msg.endswith('\\n'))
+
+    def test_promo_subscribe_budget(self):
+        self.assertQueryBudget(4, '/api/promo/subscribe', {
+            'imsi': self.imsi, 'keyword': 'BPROMO'})
+
+    def test_promo_unsubscribe_budget(self):
+        """ Flat in the number of subscriptions dropped """
+        promo = models.Promo.objects.get(keyword='BPROMO')
+        for _ in range(10):
+            models.PromoSubscription.objects.create(
+                promo=promo, contact=self.subscriber,
+                date_expiration=timezone.now() + timedelta(3))
+
+        response = self.assertQueryBudget(3, '/api/promo/unsubscribe', {
+            'imsi': self.imsi, 'keyword': 'BPROMO'})
+        self.assertEqual(response.data, 'OK UNSUBSCRIBE')
+        self.assertQueryBudget(0, '/api/promo/info', {
+            'imsi': self.imsi, 'keyword': 'BPROMO'})
+
+    def test_contact_budget(self):
+        response = self.assertQueryBudget(2, '/api/contact/create', {
+            'imsi': 'IMSI001010000000099', 'callerid': '639990000099'})
+        self.assertEqual(response.data, 'OK CREATED')
+
+    def test_report_budget(self):
+        response = self.assertQueryBudget(2, '/api/report/submit', {
+            'imsi': self.imsi, 'keyword': 'REPORT', 'message': 'Report'})
+        self.assertEqual(response.data, 'OK CREATED')
+        self.assertEqual(send_sms.delay.call_count, 1 + len(self.members))
+
+    def test_service_budget(self):
+        member = {'imsi': self.members[0].imsi, 'keyword': 'SERVICE'}
+        response = self.assertQueryBudget(2, '/api/service/status', member)
+        self.assertEqual(response.data, 'OK STATUS - SUBSCRIBED')
+        response = self.assertQueryBudget(3, '/api/service/unsubscribe',
+                                          member)
+        self.assertEqual(response.data, 'OK UNSUBSCRIBED')
+        response = self.assertQueryBudget(3, '/api/service/subscribe',
+                                          member)
+        self.assertEqual(response.data, 'OK SUBSCRIBED')
+        self.assertQueryBudget(0, '/api/service/price',
+                               {'keyword': 'SERVICE'})
+        response = self.assertQueryBudget(2, '/api/service/event', member)
+        self.assertEqual(response.data, 'OK EVENT')
+
+        response = self.assertQueryBudget(1, '/api/service/send', {
+            'imsi': self.imsi, 'keyword': 'SERVICE', 'message': 'Hi'})
+        self.assertEqual(response.data, 'ANNOUNCEMENT SENT')
+        self.assertQueryBudget(1, '/api/service/', {'keyword': 'SERVICE'},
+                               method='get')
+
+    def test_group_create_budget(self):
+        """ Existing members and new OFFNET ones """
+        mems = [member.callerid for member in self.members]
+        mems += ['639170000001', '639170000002']
+        response = self.assertQueryBudget(10, '/api/group/create', {
+            'imsi': self.imsi, 'name': 'FRIENDS', 'mems': ','.join(mems)})
+        self.assertEqual(response.data, 'OK CREATED')
+        group = models.Group.objects.get(name='FRIENDS')
+        self.assertEqual(group.members.count(), 7)
+
+    def test_group_edit_budget(self):
+        mems = [member.callerid for member in self.members]
+        mems += ['639990000002']
+        response = self.assertQueryBudget(9, '/api/group/edit', {
+            'imsi': self.imsi, 'name': 'GROUP', 'mems': ','.join(mems)})
+        self.assertEqual(response.data, 'OK EDIT')
+        self.assertEqual(self.group.members.count(), 6)
+
+    def test_group_send_budget(self):
+        response = self.assertQueryBudget(6, '/api/group/send', {
+            'imsi': self.members[0].imsi, 'name': 'GROUP', 'msg': 'Hi'})
+        self.assertEqual(response.data, 'OK SEND')
+        self.assertEqual(broadcast.delay.call_count, 1)
+
+    def test_job_and_metrics_budget(self):
+        self.assertQueryBudget(1, '/api/job/%s' % self.job.pk, method='get')
+        with patch('vbts_webadmin.sms.get_queue_depth', Mock(return_value=0)):
+            self.assertQueryBudget(0, '/api/sms/metrics', method='get')
+
+    @override_settings(PCARI=dict(settings.PCARI, QUERY_HEADERS=True))
+    def test_query_headers(self):
+        response = self.client.post('/api/promo/getservicetype', self.call())
+        self.assertEqual(response['X-Query-Count'], '1')
+        self.assertIn('X-Query-Time', response)
+        self.assertIn('pcari_promo_subscription',
+                      response['X-Query-Slowest'])
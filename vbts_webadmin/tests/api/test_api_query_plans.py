@@ -0,0 +1,173 @@
+"""
+Copyright (c) 2015-present, Philippine-California Advanced Research Institutes-
+The Village Base Station Project (PCARI-VBTS). All rights reserved.
+
+This source code is licensed under the BSD-style license found in the
+LICENSE file in the root directory of this source tree.
+"""
+
+import re
+from datetime import timedelta
+from unittest import skipUnless
+
+from core.subscriber import subscriber as endaga_sub
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from mock import Mock
+
+from vbts_webadmin import entitlements
+from vbts_webadmin import models
+from vbts_webadmin.tasks import broadcast
+from vbts_webadmin.tasks import send_sms
+from vbts_webadmin.utils import float_to_mc
+from core import events
+
+# 'SCAN TABLE pcari_contact' on older SQLite, 'SCAN pcari_contact' on newer
+SCAN = re.compile(r'^SCAN (?:TABLE )?(\w+)')
+
+
+@skipUnless(connection.vendor == 'sqlite',
+            'EXPLAIN QUERY PLAN is specific to SQLite')
+class QueryPlanTest(TestCase):
+
+    """
+        Every query made while serving the API should find its rows through
+        an index. Whole-table reads without a WHERE clause are how the
+        config, carrier prefix and callerid caches get (re)built, and are
+        the only scans allowed.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create(username='User',
+                                        email='user@user.com')
+        cls.imsi = 'IMSI001010000000001'
+        cls.callerid = '639990000001'
+        cls.subscriber = models.Contact.objects.create(imsi=cls.imsi,
+                                                       callerid=cls.callerid)
+        cls.member = models.Contact.objects.create(
+            imsi='IMSI001010000000002', callerid='639990000002')
+
+        models.Config.objects.create(key='promo_limit_type', value='B')
+        models.Config.objects.create(key='max_promo_subscription',
+                                     value='5')
+        models.Config.objects.create(key='max_groups_per_subscriber',
+                                     value='5')
+
+        cls.promo = models.Promo.objects.create(
+            author=cls.admin, name='Bulk Promo', price=float_to_mc(10),
+            promo_type='B', keyword='BULK', number='555', validity=3,
+            local_sms=10, local_call=10, outside_sms=10, outside_call=10)
+        models.PromoSubscription.objects.create(
+            promo=cls.promo, contact=cls.subscriber,
+            date_expiration=timezone.now() + timedelta(3),
+            local_sms=10, local_call=10, outside_sms=10, outside_call=10)
+
+        cls.group = models.Group.objects.create(name='GROUP',
+                                                owner=cls.subscriber)
+        models.GroupMembers.objects.create(group=cls.group, user=cls.member)
+
+        script = models.Script.objects.create(
+            name='Sample Script', author='Some One', version='0.0.1',
+            package_name='sample name', fs_script='PCARI_dictionary.py',
+            chatplan='dictionary.xml', status='D', arguments='{"arg": 11}')
+        cls.service = models.Service.objects.create(
+            name='Sample Service', keyword='SERVICE', number='111',
+            author=cls.admin, script=script, status='P', service_type='P',
+            price=1)
+        models.ServiceSubscribers.objects.create(service=cls.service,
+                                                 subscriber=cls.member)
+        models.ServiceManagers.objects.create(service=cls.service,
+                                              manager=cls.subscriber)
+        models.Report.objects.create(name='Sample Report', keyword='REPORT',
+                                     number='111', author=cls.admin,
+                                     status='P')
+        cls.job = models.Job.objects.create(kind='broadcast')
+
+    def setUp(self):
+        entitlements.clear()
+        endaga_sub.get_account_balance = Mock(return_value=100000000)
+        endaga_sub.subtract_credit = Mock(return_value=None)
+        endaga_sub.get_numbers_from_imsi = Mock(return_value=[self.callerid])
+        events.create_sms_event = Mock(return_value=None)
+        send_sms.delay = Mock(return_value=None)
+        broadcast.delay = Mock(return_value=None)
+
+    def explain(self, sql):
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN %s' % sql)
+            return [row[-1] for row in cursor.fetchall()]
+
+    def assertUsesIndexes(self, url, data):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(url, data)
+        self.assertLess(response.status_code, 500)
+
+        for query in queries.captured_queries:
+            sql = query['sql']
+            if sql.split(None, 1)[0].upper() not in ('SELECT', 'UPDATE',
+                                                     'DELETE'):
+                continue
+            if ' WHERE ' not in sql:
+                continue  # deliberate whole-table read
+            for detail in self.explain(sql):
+                match = SCAN.match(detail)
+                if match and match.group(1) in connection.introspection. \
+                        table_names():
+                    self.fail('%s scans %s:\n%s' % (url, match.group(1),
+                                                    sql))
+
+    def test_contact_api(self):
+        self.assertUsesIndexes('/api/contact/create', {
+            'imsi': 'IMSI001010000000003', 'callerid': '639990000003'})
+
+    def test_group_api(self):
+        self.assertUsesIndexes('/api/group/create', {
+            'imsi': self.imsi, 'name': 'OTHER', 'mems': '639990000002'})
+        self.assertUsesIndexes('/api/group/edit', {
+            'imsi': self.imsi, 'name': 'GROUP', 'mems': '639990000002'})
+        self.assertUsesIndexes('/api/group/send', {
+            'imsi': self.imsi, 'name': 'GROUP', 'msg': 'hello'})
+        self.assertUsesIndexes('/api/group/delete', {
+            'imsi': self.imsi, 'name': 'GROUP'})
+
+    def test_report_api(self):
+        self.assertUsesIndexes('/api/report/submit', {
+            'imsi': self.imsi, 'keyword': 'REPORT', 'message': 'hello'})
+
+    def test_service_api(self):
+        service = {'imsi': self.imsi, 'keyword': 'SERVICE'}
+        self.assertUsesIndexes('/api/service/subscribe', service)
+        self.assertUsesIndexes('/api/service/status', service)
+        self.assertUsesIndexes('/api/service/price', service)
+        self.assertUsesIndexes('/api/service/event', service)
+        self.assertUsesIndexes('/api/service/send',
+                               dict(service, message='hello'))
+        self.assertUsesIndexes('/api/service/unsubscribe', service)
+
+    def test_promo_api(self):
+        promo = {'imsi': self.imsi, 'keyword': 'BULK'}
+        call = {'imsi': self.imsi, 'trans': 'local_call',
+                'dest': '639990000002', 'balance': '100000'}
+        self.assertUsesIndexes('/api/promo/subscribe', promo)
+        self.assertUsesIndexes('/api/promo/getservicetype', call)
+        self.assertUsesIndexes('/api/promo/getminbal', {
+            'trans': 'B_local_call', 'tariff': '1000'})
+        self.assertUsesIndexes('/api/promo/getservicetariff', call)
+        self.assertUsesIndexes('/api/promo/getsecavail', call)
+        self.assertUsesIndexes('/api/promo/authorize', call)
+        self.assertUsesIndexes('/api/promo/deduct', {
+            'imsi': self.imsi, 'trans': 'B_local_sms', 'amount': '1'})
+        self.assertUsesIndexes('/api/promo/status', promo)
+        self.assertUsesIndexes('/api/promo/info', promo)
+        self.assertUsesIndexes('/api/promo/unsubscribe', promo)
+
+    def test_job_api(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get('/api/job/%s' % self.job.pk)
+        for query in queries.captured_queries:
+            for detail in self.explain(query['sql']):
+                self.assertFalse(SCAN.match(detail), detail)
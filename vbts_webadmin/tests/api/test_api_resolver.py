@@ -0,0 +1,58 @@
+"""
+Copyright (c) 2015-present, Philippine-California Advanced Research Institutes-
+The Village Base Station Project (PCARI-VBTS). All rights reserved.
+
+This source code is licensed under the BSD-style license found in the
+LICENSE file in the root directory of this source tree.
+"""
+
+from django.test import TestCase
+
+from vbts_webadmin import models
+from vbts_webadmin import resolver
+from vbts_webadmin.views.api_groups import add_group_members
+
+
+class ResolverTest(TestCase):
+
+    """
+        Resolving callerids of local subscribers
+    """
+
+    def setUp(self):
+        resolver.refresh()
+        self.local = models.Contact.objects.create(
+            imsi='IMSI001010000009999', callerid='639991111111')
+        self.offnet = models.Contact.objects.create(
+            imsi='OFFNET639171234567', callerid='639171234567')
+
+    def tearDown(self):
+        resolver.refresh()
+
+    def test_resolve(self):
+        """ Only local contacts resolve to an IMSI """
+        self.assertEqual(resolver.get_imsi('639991111111'),
+                         'IMSI001010000009999')
+        self.assertTrue(resolver.is_local('639991111111'))
+        self.assertFalse(resolver.is_local('639171234567'))
+        self.assertFalse(resolver.is_local('639181234567'))
+
+    def test_contact_changes(self):
+        """ Saved or deleted contacts are seen right away """
+        self.assertFalse(resolver.is_local('639992222222'))
+        contact = models.Contact.objects.create(imsi='IMSI001010000009998',
+                                                callerid='639992222222')
+        self.assertTrue(resolver.is_local('639992222222'))
+        contact.delete()
+        self.assertFalse(resolver.is_local('639992222222'))
+
+    def test_add_group_members(self):
+        """ Group members keep the IMSI of local subscribers and
+            off-network numbers get an OFFNET contact
+        """
+        group = models.Group.objects.create(name='GROUP', owner=self.local)
+        invalid = add_group_members('639991111111,639181234567', group)
+        self.assertEqual(invalid, [])
+        members = group.members.values_list('imsi', flat=True)
+        self.assertEqual(sorted(members),
+                         ['IMSI001010000009999', 'OFFNET639181234567'])
@@ -13,7 +13,9 @@ from django.test import TestCase
 from django.utils import timezone
 from mock import Mock
 
+from vbts_webadmin import keywords
 from vbts_webadmin import models
+from vbts_webadmin.tasks import broadcast
 from vbts_webadmin.tasks import send_sms
 from vbts_webadmin.utils import float_to_mc
 
@@ -23,6 +25,10 @@ class BaseClass(TestCase):
         Base class for service API testing
     """
 
+    def setUp(self):
+        # rolled back changes don't reach the keyword registry
+        keywords.refresh()
+
     def subscribe_to_service(self, imsi, keyword, balance):
         endaga_sub.get_numbers_from_imsi = Mock(return_value='123455')
         endaga_sub.get_account_balance = Mock(return_value=balance)
@@ -54,6 +60,7 @@ class BaseClass(TestCase):
     def send_subscriber_msg(self, imsi, keyword, message):
         endaga_sub.get_numbers_from_imsi = Mock(return_value='123455')
         send_sms.delay = Mock(return_value=None)
+        broadcast.delay = Mock(return_value=None)
 
         url = '/api/service/send'
         data = {
@@ -0,0 +1,249 @@
+"""
+Copyright (c) 2015-present, Philippine-California Advanced Research Institutes-
+The Village Base Station Project (PCARI-VBTS). All rights reserved.
+
+This source code is licensed under the BSD-style license found in the
+LICENSE file in the root directory of this source tree.
+"""
+
+from django.conf import settings
+from django.core.cache import caches
+from django.test import SimpleTestCase
+from django.test import TestCase
+from django.test import override_settings
+from mock import Mock
+from mock import patch
+
+from vbts_webadmin import models
+from vbts_webadmin import sms
+from vbts_webadmin import tasks
+from vbts_webadmin.tasks import send_sms
+from vbts_webadmin.tasks import send_sms_batch
+from vbts_webadmin.tests.utils import FakeEventSocket
+
+FAST_LANES = {
+    'transactional': {'QUEUE': 'sms_transactional', 'RATE': None},
+    'notification': {'QUEUE': 'sms_notification', 'RATE': 100, 'BURST': 5},
+    'bulk': {'QUEUE': 'sms_bulk', 'RATE': 100, 'BURST': 5},
+}
+LOCAL_PCARI = dict(settings.PCARI,
+                   SMS_BACKEND='vbts_webadmin.sms.LocalBackend',
+                   SMS_LANES=FAST_LANES)
+
+
+class SmsBackendTest(SimpleTestCase):
+
+    """
+        SMS dispatch backends
+    """
+
+    @override_settings(PCARI=LOCAL_PCARI)
+    def test_local_backend(self):
+        """ send_sms and send_sms_batch go through the configured backend """
+        backend = sms.get_backend()
+        backend.clear()
+        send_sms('639991111111', '0000', 'hello')
+        send_sms_batch([('639991111112', 'a' * 300),
+                        ('639991111113', 'hi')], '555')
+        self.assertEqual(len(backend.outbox), 4)
+        self.assertEqual(backend.outbox[0], ('639991111111', '0000', 'hello'))
+        self.assertTrue(backend.outbox[1][2].startswith('(1/2) '))
+        self.assertEqual(backend.outbox[3], ('639991111113', '555', 'hi'))
+        backend.clear()
+
+    def test_event_socket_pipelines(self):
+        """ All messages go through one connection """
+        server = FakeEventSocket()
+        backend = sms.EventSocketBackend(port=server.port)
+        messages = [('6399911%05d' % i, 'msg %d' % i) for i in range(250)]
+        backend.send('0000', messages)
+        backend.send('0000', messages[:1])
+        backend.close()
+        server.stop()
+
+        self.assertEqual(server.connections, 1)
+        self.assertEqual(len(server.commands), 251)
+        self.assertEqual(server.commands[0],
+                         'api python VBTS_Send_SMS 639991100000|0000|msg 0')
+
+    def test_event_socket_reconnects(self):
+        """ Unacknowledged messages are resent after reconnecting """
+        server = FakeEventSocket(drop_after=3)
+        backend = sms.EventSocketBackend(port=server.port)
+        messages = [('63999111111%d' % i, 'line1\nline2') for i in range(5)]
+        backend.send('0000', messages)
+        backend.close()
+        server.stop()
+
+        self.assertEqual(server.connections, 2)
+        self.assertEqual(len(server.commands), 5)
+        self.assertEqual(server.commands[-1],
+                         'api python VBTS_Send_SMS 639991111114|0000|'
+                         'line1\\nline2')
+
+
+class FakeClock(object):
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+class TokenBucketTest(SimpleTestCase):
+
+    """
+        Pacing of outbound SMS
+    """
+
+    def test_burst_then_rate(self):
+        """ A full bucket lets a burst through, then paces at the rate """
+        clock = FakeClock()
+        bucket = sms.TokenBucket(2, 4, clock=clock, sleep=clock.sleep)
+        for _ in range(4):
+            self.assertEqual(bucket.consume(), 0)
+        self.assertAlmostEqual(bucket.consume(), 0.5)
+        self.assertAlmostEqual(bucket.consume(2), 1.0)
+        self.assertAlmostEqual(clock.now, 1001.5)
+
+    def test_refill_is_capped(self):
+        """ Idle time doesn't save up more than capacity """
+        clock = FakeClock()
+        bucket = sms.TokenBucket(1, 3, clock=clock, sleep=clock.sleep)
+        bucket.consume(3)
+        clock.now += 60
+        self.assertEqual(bucket.consume(3), 0)
+        self.assertAlmostEqual(bucket.consume(), 1.0)
+        self.assertRaises(ValueError, bucket.consume, 4)
+
+    @override_settings(PCARI=LOCAL_PCARI)
+    def test_lanes(self):
+        """ Limited lanes are paced, transactional messages aren't """
+        backend = sms.get_backend()
+        backend.clear()
+        messages = [('6399911%05d' % i, 'hi') for i in range(20)]
+        sms.send('0000', messages, 'bulk')
+        # 5 go out at once, the other 15 at 100 per second
+        self.assertEqual(len(backend.timestamps), 20)
+        self.assertGreaterEqual(
+            backend.timestamps[-1] - backend.timestamps[0], 0.14)
+
+        backend.clear()
+        sms.send('0000', messages, 'transactional')
+        self.assertEqual(len(backend.timestamps), 20)
+        self.assertLess(backend.timestamps[-1] - backend.timestamps[0], 0.1)
+        backend.clear()
+        self.assertRaises(ValueError, sms.send, '0000', messages, 'urgent')
+
+    @patch('celery.app.task.Task.apply_async')
+    def test_routing(self, apply_async):
+        """ Queued SMS tasks go to the queue of their lane """
+        send_sms.apply_async(('639991111111', '0000', 'hello'))
+        args, options = apply_async.call_args
+        self.assertEqual(options['queue'], 'sms_transactional')
+        self.assertEqual(args[1]['lane'], 'transactional')
+        self.assertIn('queued_at', args[1])
+
+        send_sms.apply_async(('639991111111', '0000', 'hello'),
+                             {'lane': 'notification'})
+        self.assertEqual(apply_async.call_args[1]['queue'],
+                         'sms_notification')
+
+        tasks.broadcast.apply_async((1, {'type': 'all'}, '0000', 'hello'))
+        args, options = apply_async.call_args
+        self.assertEqual(options['queue'], 'sms_bulk')
+        self.assertEqual(args[1]['lane'], 'bulk')
+
+
+@override_settings(PCARI=LOCAL_PCARI)
+class BroadcastTest(TestCase):
+
+    """
+        Fanning out messages with the broadcast task
+    """
+
+    def setUp(self):
+        sms.get_backend().clear()
+        self.author = models.Contact.objects.create(imsi='IMSI001010000000000',
+                                                    callerid='639990000000')
+        self.contacts = [
+            models.Contact.objects.create(imsi='IMSI00101000000%04d' % i,
+                                          callerid='6399900%05d' % i)
+            for i in range(1, 8)]
+        self.group = models.Group.objects.create(name='GROUP',
+                                                 owner=self.author)
+        for contact in self.contacts[:3]:
+            models.GroupMembers.objects.create(group=self.group, user=contact)
+
+    def tearDown(self):
+        sms.get_backend().clear()
+
+    def test_broadcast_message(self):
+        """ Everyone but the author gets the message, in chunks """
+        message = models.Message.objects.create(author=self.author,
+                                                message='hello')
+        job = models.Job.objects.create(kind='broadcast')
+        tasks.BROADCAST_CHUNK_SIZE, chunk_size = 3, tasks.BROADCAST_CHUNK_SIZE
+        try:
+            tasks.broadcast(job.pk, {'type': 'all', 'ids': [self.author.imsi]},
+                            self.author.callerid, message.message, message.pk)
+        finally:
+            tasks.BROADCAST_CHUNK_SIZE = chunk_size
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'D')
+        self.assertEqual(job.total, 7)
+        self.assertEqual(job.processed, 7)
+        self.assertEqual(message.recipients.count(), 7)
+        outbox = sms.get_backend().outbox
+        self.assertEqual(sorted(item[0] for item in outbox),
+                         sorted(item.callerid for item in self.contacts))
+        self.assertEqual(set(item[1:] for item in outbox),
+                         set([('639990000000', 'hello')]))
+
+    def test_broadcast_group(self):
+        """ Group broadcasts only reach the members """
+        job = models.Job.objects.create(kind='broadcast')
+        tasks.broadcast(job.pk, {'type': 'groups', 'ids': [self.group.pk]},
+                        '0000', 'hi')
+        self.assertEqual(len(sms.get_backend().outbox), 3)
+        self.assertEqual(models.MessageRecipients.objects.count(), 0)
+
+    def test_job_status(self):
+        job = models.Job.objects.create(kind='broadcast', total=7,
+                                        processed=3, status='R')
+        response = self.client.get('/api/job/%s' % job.pk)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['status'], 'Running')
+        self.assertEqual(response.data['processed'], 3)
+        response = self.client.get('/api/job/%s' % (job.pk + 1))
+        self.assertEqual(response.status_code, 404)
+
+
+@override_settings(PCARI=LOCAL_PCARI)
+class SmsMetricsTest(TestCase):
+
+    """
+        Per lane SMS metrics
+    """
+
+    def test_metrics(self):
+        """ Sent messages and latency are tracked per lane """
+        caches['sms_metrics'].clear()
+        sms.record_sent('transactional', 2, queued_at=None)
+        sms.send('0000', [('639991111111', 'hi')], 'transactional',
+                 queued_at=0)
+        with patch('vbts_webadmin.sms.get_queue_depth', Mock(return_value=4)):
+            response = self.client.get('/api/sms/metrics')
+        self.assertEqual(response.status_code, 200)
+        lanes = dict((item['lane'], item) for item in response.data)
+        self.assertEqual(lanes['transactional']['sent'], 3)
+        self.assertEqual(lanes['transactional']['queued'], 4)
+        self.assertGreater(lanes['transactional']['avg_latency'], 0)
+        self.assertEqual(lanes['bulk']['sent'], 0)
+        self.assertEqual(lanes['bulk']['avg_latency'], None)
+        caches['sms_metrics'].clear()
@@ -0,0 +1,88 @@
+"""
+Copyright (c) 2015-present, Philippine-California Advanced Research Institutes-
+The Village Base Station Project (PCARI-VBTS). All rights reserved.
+
+This source code is licensed under the BSD-style license found in the
+LICENSE file in the root directory of this source tree.
+
+-
+Local stand-ins for the parts of core that need FreeSWITCH and the
+subscriber registry, so that the API can be driven in-process.
+"""
+
+from core import billing
+from core import events
+from core.subscriber import subscriber as endaga_sub
+from mock import patch
+
+from vbts_webadmin.tasks import send_sms
+
+
+class FakeBilling(object):
+    """ Flat tariffs, in millicents """
+
+    def __init__(self, sms_tariff=100000, call_tariff=500000):
+        self.tariffs = {'sms': sms_tariff, 'call': call_tariff}
+
+    def get_service_tariff(self, billing_type, call_or_sms, destination):
+        return self.tariffs[call_or_sms]
+
+    def get_seconds_available(self, balance, billing_type, destination):
+        return int(balance) * 60 // self.tariffs['call']
+
+
+class FakeSubscriber(object):
+    """ Balances (in millicents) and numbers kept in memory """
+
+    def __init__(self, numbers, balance=100000000):
+        self.numbers = dict(numbers)
+        self.balances = dict((imsi, balance) for imsi in self.numbers)
+
+    def get_account_balance(self, imsi):
+        return self.balances[imsi]
+
+    def subtract_credit(self, imsi, amount):
+        self.balances[imsi] -= int(amount)
+
+    def get_numbers_from_imsi(self, imsi):
+        return [self.numbers[imsi]]
+
+
+class FakeEvents(object):
+
+    def __init__(self):
+        self.events = []
+
+    def create_sms_event(self, imsi, balance, price, reason, dest):
+        self.events.append((imsi, balance, price, reason, dest))
+
+
+def fake_core(numbers):
+    """
+        Patches core with the fakes above, and keeps SMS from being queued
+    Args:
+        numbers: dict of IMSI to callerid of the subscribers
+
+    Returns:
+        list of started patchers, stop them when done
+    """
+    tariffs = FakeBilling()
+    subscriber = FakeSubscriber(numbers)
+    patchers = [
+        patch.object(billing, 'get_service_tariff',
+                     tariffs.get_service_tariff),
+        patch.object(billing, 'get_seconds_available',
+                     tariffs.get_seconds_available),
+        patch.object(endaga_sub, 'get_account_balance',
+                     subscriber.get_account_balance),
+        patch.object(endaga_sub, 'subtract_credit',
+                     subscriber.subtract_credit),
+        patch.object(endaga_sub, 'get_numbers_from_imsi',
+                     subscriber.get_numbers_from_imsi),
+        patch.object(events, 'create_sms_event',
+                     FakeEvents().create_sms_event),
+        patch.object(send_sms, 'delay', lambda *args, **kwargs: None),
+    ]
+    for patcher in patchers:
+        patcher.start()
+    return patchers
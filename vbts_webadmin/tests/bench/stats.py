@@ -0,0 +1,42 @@
+"""
+Copyright (c) 2015-present, Philippine-California Advanced Research Institutes-
+The Village Base Station Project (PCARI-VBTS). All rights reserved.
+
+This source code is licensed under the BSD-style license found in the
+LICENSE file in the root directory of this source tree.
+"""
+
+import math
+
+
+def percentile(values, p):
+    """ Nearest-rank percentile of sorted values """
+    rank = int(math.ceil(p / 100.0 * len(values)))
+    return values[max(rank, 1) - 1]
+
+
+def summarize(name, latencies, queries, failures):
+    """
+        Sums up the calls made to an endpoint
+    Args:
+        name: name of the endpoint
+        latencies: milliseconds each call took
+        queries: number of queries each call made
+        failures: number of calls that didn't return 200
+
+    Returns:
+        dict of the results
+    """
+    latencies = sorted(latencies)
+    return {
+        'name': name,
+        'calls': len(latencies),
+        'failures': failures,
+        'mean_ms': sum(latencies) / len(latencies),
+        'p50_ms': percentile(latencies, 50),
+        'p95_ms': percentile(latencies, 95),
+        'p99_ms': percentile(latencies, 99),
+        'max_ms': latencies[-1],
+        'queries_mean': float(sum(queries)) / len(queries),
+        'queries_max': max(queries),
+    }
@@ -0,0 +1,189 @@
+"""
+Copyright (c) 2015-present, Philippine-California Advanced Research Institutes-
+The Village Base Station Project (PCARI-VBTS). All rights reserved.
+
+This source code is licensed under the BSD-style license found in the
+LICENSE file in the root directory of this source tree.
+
+-
+Benchmark of the promo charging API, run in-process against a synthetic
+database with core stubbed out (see fakes.py), so that neither
+FreeSWITCH nor a running server is needed. Skipped unless VBTS_BENCH is
+set:
+
+    VBTS_BENCH=1 python manage.py test vbts_webadmin.tests.bench
+
+The size of the database and the number of calls per endpoint can be
+set with VBTS_BENCH_SUBSCRIBERS, VBTS_BENCH_PROMOS, VBTS_BENCH_GROUPS and
+VBTS_BENCH_CALLS. Results are printed, and written as JSON to
+VBTS_BENCH_OUTPUT (bench_results.json by default) to compare runs.
+"""
+
+import json
+import os
+import platform
+import random
+from datetime import timedelta
+from timeit import default_timer
+from unittest import skipUnless
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from vbts_webadmin import entitlements
+from vbts_webadmin import models
+from vbts_webadmin.tests.bench.fakes import fake_core
+from vbts_webadmin.tests.bench.stats import summarize
+from vbts_webadmin.utils import float_to_mc
+
+SUBSCRIBERS = int(os.environ.get('VBTS_BENCH_SUBSCRIBERS', 1000))
+PROMOS = int(os.environ.get('VBTS_BENCH_PROMOS', 20))
+GROUPS = int(os.environ.get('VBTS_BENCH_GROUPS', 100))
+CALLS = int(os.environ.get('VBTS_BENCH_CALLS', 500))
+OUTPUT = os.environ.get('VBTS_BENCH_OUTPUT', 'bench_results.json')
+
+PROMO_TYPES = ('B', 'U', 'D', 'G')
+SERVICES = ('local_sms', 'local_call', 'outside_sms', 'outside_call')
+SUBSCRIPTIONS_PER_SUBSCRIBER = 2
+MEMBERS_PER_GROUP = 5
+
+
+@skipUnless(os.environ.get('VBTS_BENCH'), 'set VBTS_BENCH=1 to run')
+class ChargingBenchmark(TestCase):
+
+    """
+        Latency and queries per call of the promo charging API
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        rng = random.Random(0)
+        admin = User.objects.create(username='bench',
+                                    email='bench@bench.com')
+
+        contacts = [models.Contact(imsi='IMSI00101%010d' % i,
+                                   callerid='63999%07d' % i)
+                    for i in range(SUBSCRIBERS)]
+        models.Contact.objects.bulk_create(contacts)
+        cls.numbers = dict((item.imsi, item.callerid) for item in contacts)
+        cls.imsis = sorted(cls.numbers)
+
+        promos = []
+        for i in range(PROMOS):
+            promo_type = PROMO_TYPES[i % len(PROMO_TYPES)]
+            if promo_type in ('D', 'G'):
+                quota = float_to_mc(0.5)  # discounted tariff
+            else:
+                quota = 1000000  # never runs out during a run
+            promos.append(models.Promo.objects.create(
+                author=admin, name='Bench %d' % i, price=float_to_mc(1),
+                promo_type=promo_type, keyword='BENCH%d' % i, validity=30,
+                local_sms=quota, local_call=quota, globe_sms=quota,
+                globe_call=quota, outside_sms=quota, outside_call=quota))
+        cls.keywords = [promo.keyword for promo in promos]
+
+        expiration = timezone.now() + timedelta(30)
+        subscriptions = []
+        for imsi in cls.imsis:
+            for promo in rng.sample(promos, min(SUBSCRIPTIONS_PER_SUBSCRIBER,
+                                                len(promos))):
+                subscriptions.append(models.PromoSubscription(
+                    promo=promo, contact_id=imsi,
+                    date_expiration=expiration,
+                    local_sms=promo.local_sms, local_call=promo.local_call,
+                    globe_sms=promo.globe_sms, globe_call=promo.globe_call,
+                    outside_sms=promo.outside_sms,
+                    outside_call=promo.outside_call))
+        models.PromoSubscription.objects.bulk_create(subscriptions)
+
+        members = []
+        for i in range(GROUPS):
+            group = models.Group.objects.create(
+                name='BENCH%d' % i, owner_id=rng.choice(cls.imsis))
+            for imsi in rng.sample(cls.imsis, min(MEMBERS_PER_GROUP,
+                                                  len(cls.imsis))):
+                members.append(models.GroupMembers(group=group,
+                                                   user_id=imsi))
+        models.GroupMembers.objects.bulk_create(members)
+
+    def setUp(self):
+        self.patchers = fake_core(self.numbers)
+        self.rng = random.Random(1)
+        entitlements.clear()
+
+    def tearDown(self):
+        for patcher in self.patchers:
+            patcher.stop()
+        entitlements.clear()
+
+    def call(self, promo_type=''):
+        """ Random charging API arguments """
+        imsi = self.rng.choice(self.imsis)
+        trans = self.rng.choice(SERVICES)
+        if promo_type:
+            trans = '%s_%s' % (promo_type, trans)
+        return {'imsi': imsi, 'trans': trans,
+                'dest': self.numbers[self.rng.choice(self.imsis)],
+                'balance': '1000000', 'amount': '1'}
+
+    def measure(self, name, url, make_data, answers=(200,)):
+        """
+            Posts CALLS requests to url and sums them up, counting those
+            that didn't get one of the answers as failures
+        """
+        latencies = []
+        queries = []
+        failures = 0
+        for _ in range(CALLS):
+            data = make_data()
+            with CaptureQueriesContext(connection) as captured:
+                start = default_timer()
+                response = self.client.post(url, data)
+                latencies.append((default_timer() - start) * 1000)
+            queries.append(len(captured.captured_queries))
+            if response.status_code not in answers:
+                failures += 1
+        return summarize(name, latencies, queries, failures)
+
+    def test_charging_api(self):
+        results = [
+            self.measure('getservicetype', '/api/promo/getservicetype',
+                         self.call),
+            self.measure('getservicetariff', '/api/promo/getservicetariff',
+                         lambda: self.call(self.rng.choice(PROMO_TYPES))),
+            self.measure('getsecavail', '/api/promo/getsecavail',
+                         lambda: self.call(self.rng.choice(PROMO_TYPES))),
+            # not everyone has a bulk promo to deduct from
+            self.measure('deduct', '/api/promo/deduct',
+                         lambda: self.call('B'), answers=(200, 402)),
+            self.measure('subscribe', '/api/promo/subscribe',
+                         lambda: {'imsi': self.rng.choice(self.imsis),
+                                  'keyword': self.rng.choice(self.keywords)}),
+        ]
+
+        report = {
+            'date': timezone.now().isoformat(),
+            'python': platform.python_version(),
+            'database': connection.vendor,
+            'subscribers': SUBSCRIBERS,
+            'promos': PROMOS,
+            'groups': GROUPS,
+            'calls': CALLS,
+            'results': results,
+        }
+        with open(OUTPUT, 'w') as output:
+            json.dump(report, output, indent=2, sort_keys=True)
+
+        print('\n%-18s %8s %8s %8s %8s %10s' % (
+            'endpoint', 'p50 ms', 'p95 ms', 'p99 ms', 'queries', 'failures'))
+        for item in results:
+            print('%-18s %8.2f %8.2f %8.2f %8.1f %10d' % (
+                item['name'], item['p50_ms'], item['p95_ms'], item['p99_ms'],
+                item['queries_mean'], item['failures']))
+        print('Results written to %s' % OUTPUT)
+
+        for item in results:
+            self.assertEqual(item['failures'], 0, item['name'])
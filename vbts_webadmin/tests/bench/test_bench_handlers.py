@@ -0,0 +1,149 @@
+"""
+Copyright (c) 2015-present, Philippine-California Advanced Research Institutes-
+The Village Base Station Project (PCARI-VBTS). All rights reserved.
+
+This source code is licensed under the BSD-style license found in the
+LICENSE file in the root directory of this source tree.
+
+-
+Benchmark of the overhead of serving /api/ calls, through the dashboard's
+full middleware stack and DRF's authentication and content negotiation
+(as before machine.py), and through MachineHandler. Skipped unless
+VBTS_BENCH is set:
+
+    VBTS_BENCH=1 python manage.py test vbts_webadmin.tests.bench
+
+The number of calls is set with VBTS_BENCH_CALLS. Results are printed,
+and written as JSON to VBTS_BENCH_HANDLERS_OUTPUT (bench_handlers.json by
+default) to compare runs.
+"""
+
+import json
+import os
+import platform
+from timeit import default_timer
+from unittest import skipUnless
+
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.signals import request_finished
+from django.core.signals import request_started
+from django.db import close_old_connections
+from django.db import connection
+from django.test import RequestFactory
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from mock import patch
+from rest_framework.settings import api_settings
+
+from vbts_webadmin import models
+from vbts_webadmin.machine import MachineHandler
+from vbts_webadmin.tests.bench.fakes import fake_core
+from vbts_webadmin.tests.bench.stats import summarize
+from vbts_webadmin.views import api
+
+CALLS = int(os.environ.get('VBTS_BENCH_CALLS', 500))
+OUTPUT = os.environ.get('VBTS_BENCH_HANDLERS_OUTPUT', 'bench_handlers.json')
+SUBSCRIBERS = 100
+
+# what views got from APIView before they were MachineAPIViews
+APIVIEW_DEFAULTS = {
+    'authentication_classes': api_settings.DEFAULT_AUTHENTICATION_CLASSES,
+    'permission_classes': api_settings.DEFAULT_PERMISSION_CLASSES,
+    'throttle_classes': api_settings.DEFAULT_THROTTLE_CLASSES,
+    'content_negotiation_class':
+        api_settings.DEFAULT_CONTENT_NEGOTIATION_CLASS,
+}
+
+
+@skipUnless(os.environ.get('VBTS_BENCH'), 'set VBTS_BENCH=1 to run')
+class HandlerBenchmark(TestCase):
+
+    """
+        Latency of /api/ calls through each WSGI handler
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        contacts = [models.Contact(imsi='IMSI00101%010d' % i,
+                                   callerid='63999%07d' % i)
+                    for i in range(SUBSCRIBERS)]
+        models.Contact.objects.bulk_create(contacts)
+        cls.numbers = dict((item.imsi, item.callerid) for item in contacts)
+        cls.job = models.Job.objects.create(kind='broadcast', total=1)
+
+    def setUp(self):
+        self.patchers = fake_core(self.numbers)
+        self.factory = RequestFactory()
+        # like the test client, keep the test's connection open
+        request_started.disconnect(close_old_connections)
+        request_finished.disconnect(close_old_connections)
+
+    def tearDown(self):
+        request_started.connect(close_old_connections)
+        request_finished.connect(close_old_connections)
+        for patcher in self.patchers:
+            patcher.stop()
+
+    def measure(self, name, handler, make_environ):
+        """ Makes CALLS requests to handler and sums them up """
+        latencies = []
+        queries = []
+        failures = 0
+        for i in range(CALLS):
+            environ = make_environ(i)
+            started = []
+            with CaptureQueriesContext(connection) as captured:
+                start = default_timer()
+                response = handler(
+                    environ, lambda status, headers: started.append(status))
+                b''.join(response)
+                response.close()
+                latencies.append((default_timer() - start) * 1000)
+            queries.append(len(captured.captured_queries))
+            if started[0] != '200 OK':
+                failures += 1
+        return summarize(name, latencies, queries, failures)
+
+    def service_type(self, i):
+        imsis = sorted(self.numbers)
+        return self.factory.post('/api/promo/getservicetype', {
+            'imsi': imsis[i % len(imsis)], 'trans': 'local_sms',
+            'dest': self.numbers[imsis[-1 - i % len(imsis)]]}).environ
+
+    def job_status(self, i):
+        return self.factory.get('/api/job/%s' % self.job.pk).environ
+
+    def test_handlers(self):
+        full = WSGIHandler()
+        machine = MachineHandler()
+        results = []
+        for endpoint, view, make_environ in (
+                ('getservicetype', api.GetServiceType, self.service_type),
+                ('job', api.GetJobStatus, self.job_status)):
+            with patch.multiple(view, **APIVIEW_DEFAULTS):
+                results.append(self.measure(
+                    '%s full' % endpoint, full, make_environ))
+            results.append(self.measure(
+                '%s machine' % endpoint, machine, make_environ))
+
+        report = {
+            'date': timezone.now().isoformat(),
+            'python': platform.python_version(),
+            'database': connection.vendor,
+            'calls': CALLS,
+            'results': results,
+        }
+        with open(OUTPUT, 'w') as output:
+            json.dump(report, output, indent=2, sort_keys=True)
+
+        print('\n%-24s %8s %8s %8s %8s %10s' % (
+            'handler', 'p50 ms', 'p95 ms', 'p99 ms', 'queries', 'failures'))
+        for item in results:
+            print('%-24s %8.2f %8.2f %8.2f %8.1f %10d' % (
+                item['name'], item['p50_ms'], item['p95_ms'], item['p99_ms'],
+                item['queries_mean'], item['failures']))
+        print('Results written to %s' % OUTPUT)
+
+        for item in results:
+            self.assertEqual(item['failures'], 0, item['name'])
@@ -0,0 +1,115 @@
+"""
+Copyright (c) 2015-present, Philippine-California Advanced Research Institutes-
+The Village Base Station Project (PCARI-VBTS). All rights reserved.
+
+This source code is licensed under the BSD-style license found in the
+LICENSE file in the root directory of this source tree.
+
+-
+Benchmark of broadcast throughput through the SMS backends: pipelined
+through one event socket connection (EventSocketBackend, against a fake
+event socket), and with a fork per message (FsCliBackend, with fs_cli
+replaced by /bin/true, so that only the cost of forking is counted).
+Skipped unless VBTS_BENCH is set:
+
+    VBTS_BENCH=1 python manage.py test vbts_webadmin.tests.bench
+
+The number of messages and how many are sent per call are set with
+VBTS_BENCH_MESSAGES and VBTS_BENCH_BATCH. Results are printed, and
+written as JSON to VBTS_BENCH_SMS_OUTPUT (bench_sms.json by default) to
+compare runs.
+"""
+
+import json
+import os
+import platform
+import socket
+from timeit import default_timer
+from unittest import skipUnless
+
+from django.test import SimpleTestCase
+from django.utils import timezone
+from mock import patch
+
+from vbts_webadmin import sms
+from vbts_webadmin.tests.bench.stats import summarize
+from vbts_webadmin.tests.utils import FakeEventSocket
+
+MESSAGES = int(os.environ.get('VBTS_BENCH_MESSAGES', 1000))
+BATCH = int(os.environ.get('VBTS_BENCH_BATCH', 50))
+OUTPUT = os.environ.get('VBTS_BENCH_SMS_OUTPUT', 'bench_sms.json')
+
+# event socket throughput over fs_cli's, see sms.py
+TARGET_RATIO = 10
+
+
+@skipUnless(os.environ.get('VBTS_BENCH'), 'set VBTS_BENCH=1 to run')
+class SmsBackendBenchmark(SimpleTestCase):
+
+    """
+        Messages per second through each SMS backend
+    """
+
+    def setUp(self):
+        self.messages = [('63999%07d' % i, 'Broadcast message %d' % i)
+                         for i in range(MESSAGES)]
+
+    def measure(self, name, backend):
+        """ Sends the messages BATCH at a time and sums it up """
+        latencies = []
+        failures = 0
+        for start in range(0, MESSAGES, BATCH):
+            began = default_timer()
+            try:
+                backend.send('0000', self.messages[start:start + BATCH])
+            except (socket.error, sms.SmsBackendError):
+                failures += 1
+            latencies.append((default_timer() - began) * 1000)
+        result = summarize(name, latencies, [0] * len(latencies), failures)
+        result['messages'] = MESSAGES
+        result['messages_per_second'] = MESSAGES / (sum(latencies) / 1000)
+        return result
+
+    def test_backends(self):
+        server = FakeEventSocket()
+        backend = sms.EventSocketBackend(port=server.port)
+        backend.connect()  # both are timed without setting up
+        event_socket = self.measure('event socket', backend)
+        backend.close()
+        server.stop()
+        self.assertEqual(len(server.commands), MESSAGES)
+
+        forks = []
+
+        def fork(cmd):
+            forks.append(cmd)
+            return os.system('/bin/true')
+
+        with patch.object(sms, 'system', side_effect=fork):
+            fs_cli = self.measure('fs_cli', sms.FsCliBackend())
+        self.assertEqual(len(forks), MESSAGES)
+
+        ratio = (event_socket['messages_per_second'] /
+                 fs_cli['messages_per_second'])
+        results = [event_socket, fs_cli]
+        report = {
+            'date': timezone.now().isoformat(),
+            'python': platform.python_version(),
+            'messages': MESSAGES,
+            'batch': BATCH,
+            'ratio': ratio,
+            'results': results,
+        }
+        with open(OUTPUT, 'w') as output:
+            json.dump(report, output, indent=2, sort_keys=True)
+
+        print('\n%-16s %8s %8s %8s %12s' % (
+            'backend', 'p50 ms', 'p95 ms', 'p99 ms', 'messages/s'))
+        for item in results:
+            print('%-16s %8.2f %8.2f %8.2f %12.0f' % (
+                item['name'], item['p50_ms'], item['p95_ms'], item['p99_ms'],
+                item['messages_per_second']))
+        print('Event socket over fs_cli: %.1fx' % ratio)
+        print('Results written to %s' % OUTPUT)
+
+        self.assertGreaterEqual(ratio, TARGET_RATIO)
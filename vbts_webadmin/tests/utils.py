@@ -0,0 +1,98 @@
+"""
+Copyright (c) 2015-present, Philippine-California Advanced Research Institutes-
+The Village Base Station Project (PCARI-VBTS). All rights reserved.
+
+This source code is licensed under the BSD-style license found in the
+LICENSE file in the root directory of this source tree.
+"""
+
+import socket
+import threading
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from vbts_webadmin.middleware import query_stats
+
+
+class QueryBudgetMixin(object):
+    """
+        TestCase mixin for keeping the number of queries a view makes
+        within a budget
+    """
+
+    def assertQueryBudget(self, budget, url, data=None, method='post'):
+        """
+            Requests url and fails if more than budget queries were made,
+            listing them
+        Returns:
+            the response
+        """
+        with CaptureQueriesContext(connection) as queries:
+            response = getattr(self.client, method)(url, data or {})
+
+        count, total, _, _ = query_stats(queries.captured_queries)
+        if count > budget:
+            self.fail('%s made %d queries (%.2fms), over its budget of %d:\n'
+                      '%s' % (url, count, total, budget, '\n'.join(
+                          query['sql'] for query in queries.captured_queries)))
+        return response
+
+
+class FakeEventSocket(object):
+    """
+        Bare minimum of FreeSWITCH's inbound event socket: accepts
+        connections one at a time, and can drop a connection after
+        answering a number of commands
+    """
+
+    def __init__(self, drop_after=None):
+        self.commands = []
+        self.connections = 0
+        self.drop_after = drop_after
+        self.server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.server.bind(('127.0.0.1', 0))
+        self.server.listen(1)
+        self.port = self.server.getsockname()[1]
+        self.thread = threading.Thread(target=self.serve)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def serve(self):
+        while True:
+            try:
+                conn, _ = self.server.accept()
+            except socket.error:
+                return
+            self.connections += 1
+            self.handle(conn)
+
+    def handle(self, conn):
+        # like mod_event_socket, don't hold replies back waiting for acks
+        conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        conn.sendall(b'Content-Type: auth/request\n\n')
+        data = b''
+        while True:
+            chunk = conn.recv(4096)
+            if not chunk:
+                break
+            data += chunk
+            while b'\n\n' in data:
+                cmd, data = data.split(b'\n\n', 1)
+                cmd = cmd.decode('utf-8')
+                if cmd.startswith('auth '):
+                    conn.sendall(b'Content-Type: command/reply\n'
+                                 b'Reply-Text: +OK accepted\n\n')
+                    continue
+                if self.drop_after is not None and \
+                        len(self.commands) == self.drop_after:
+                    self.drop_after = None
+                    conn.close()
+                    return
+                self.commands.append(cmd)
+                conn.sendall(b'Content-Type: api/response\n'
+                             b'Content-Length: 3\n\n+OK')
+        conn.close()
+
+    def stop(self):
+        self.server.close()
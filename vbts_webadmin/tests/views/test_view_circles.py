@@ -14,6 +14,7 @@ from django.utils import timezone
 from mock import Mock
 
 from vbts_webadmin import models
+from vbts_webadmin.tasks import broadcast
 from vbts_webadmin.tasks import send_sms
 
 
@@ -350,6 +351,7 @@ class CircleCrudTests(CircleBaseTestClass):
         """We should be able to send a broadcast sms to a circle"""
         self.login()
         send_sms.delay = Mock(return_value=None)
+        broadcast.delay = Mock(return_value=None)
         # We start with 1 message
         self.assertEqual(1, models.Message.objects.all().count())
         url = '/dashboard/circle/broadcast'
@@ -366,6 +368,7 @@ class CircleCrudTests(CircleBaseTestClass):
         """We should be able to send a broadcast sms to multiple circles"""
         self.login()
         send_sms.delay = Mock(return_value=None)
+        broadcast.delay = Mock(return_value=None)
         # We start with 1 message in DB
         self.assertEqual(1, models.Message.objects.all().count())
         url = '/dashboard/circle/broadcast'
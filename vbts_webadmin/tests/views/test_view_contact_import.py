@@ -0,0 +1,203 @@
+"""
+Copyright (c) 2015-present, Philippine-California Advanced Research Institutes-
+The Village Base Station Project (PCARI-VBTS). All rights reserved.
+
+This source code is licensed under the BSD-style license found in the
+LICENSE file in the root directory of this source tree.
+"""
+
+import io
+import shutil
+import tempfile
+
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import TestCase
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from mock import Mock
+
+from vbts_webadmin import importers
+from vbts_webadmin import models
+from vbts_webadmin.tasks import run_import
+
+HEADER = ('firstname,lastname,nickname,age,gender,municipality,barangay,'
+          'sitio,uuid,callerid,imsi\n')
+
+
+def contact_row(i, uuid=None, callerid=None, imsi=None):
+    return ['First%d' % i, 'Last%d' % i, 'Nick', '30', 'Male', 'San Luis',
+            'Dikapinisan', 'Dikapinisan Proper', str(uuid or 10000 + i),
+            callerid or '63999%07d' % i, imsi or 'IMSI0010100%08d' % i]
+
+
+class ContactImportTest(TestCase):
+
+    """
+        Bulk contact CSV imports
+    """
+
+    def setUp(self):
+        self.contact = models.Contact.objects.create(
+            callerid='639990000000', imsi='IMSI00101000000000')
+        self.profile = models.ContactProfile.objects.create(
+            uuid=1111, firstname='Manuel', lastname='Roxas', nickname='Manu',
+            age=30, gender='Male', municipality='San Luis',
+            barangay='Dikapinisan', sitio='Dikapinisan Proper')
+        models.ContactSimcards.objects.create(contact=self.contact,
+                                              contact_profile=self.profile)
+
+    def test_read_csv(self):
+        """ Rows are decoded as they are read """
+        docfile = io.BytesIO(HEADER.encode('utf-8') +
+                             u'Jos\xe9,"Dela Cruz, Jr."\n'.encode('utf-8'))
+        rows = list(importers.read_csv(docfile))
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(rows[1], [u'Jos\xe9', u'Dela Cruz, Jr.'])
+
+    def test_import_contacts(self):
+        """ New records are created and existing profiles updated """
+        updated = contact_row(0, uuid=1111, callerid='639990000000',
+                              imsi='IMSI00101000000000')
+        updated[0] = 'Manny'
+        rows = [contact_row(i) for i in range(1, 1201)] + [updated]
+
+        with CaptureQueriesContext(connection) as queries:
+            result = importers.import_contacts(rows)
+
+        self.assertEqual(result['imported'], 1201)
+        self.assertEqual(result['verify'], [])
+        self.assertEqual(models.Contact.objects.count(), 1201)
+        self.assertEqual(models.ContactSimcards.objects.count(), 1201)
+        self.assertEqual(models.ContactProfile.objects.get(uuid=1111).
+                         firstname, 'Manny')
+        simcard = models.ContactSimcards.objects.get(
+            contact__callerid='639990000042')
+        self.assertEqual(simcard.contact_profile.uuid, 10042)
+        # a handful of queries per chunk, not a few per row
+        self.assertLess(len(queries.captured_queries), 120)
+
+    def test_import_conflicts(self):
+        """ Invalid and conflicting rows are set aside for verification """
+        rows = [
+            contact_row(1, uuid=2222, callerid='639990000000'),
+            contact_row(2, imsi='IMSI00101000000000'),
+            contact_row(3, uuid='x'),
+            contact_row(4)[:6],
+            contact_row(5),
+            contact_row(6, uuid=3333, callerid='639990000005'),
+        ]
+        progress = Mock()
+        result = importers.import_contacts(rows, progress=progress)
+        conflicts = result['conflict']
+
+        self.assertEqual(result['imported'], 1)
+        # invalid rows come first, as they're weeded out before the rest
+        self.assertEqual(result['verify'], [rows[2], rows[3], rows[0],
+                                            rows[1], rows[5]])
+        processed, errors = progress.call_args[0]
+        self.assertEqual(processed, 6)
+        self.assertEqual(len(errors), 5)
+        self.assertEqual(conflicts[:2], [None, None])
+        self.assertEqual(conflicts[2][0], 1111)
+        self.assertEqual(conflicts[3:], [None, None])
+        self.assertFalse(models.ContactProfile.objects.filter(
+            uuid__in=[2222, 3333]).exists())
+
+    def test_upload(self):
+        """ Uploads are stored and imported by a job """
+        User.objects.create_user('Y', 'X@X.com', 'YY')
+        self.client.login(username='Y', password='YY')
+        data = HEADER + '\n'.join(','.join(contact_row(i))
+                                  for i in range(1, 4))
+        docfile = SimpleUploadedFile('contacts.csv', data.encode('utf-8'),
+                                     content_type='text/csv')
+        media_root = tempfile.mkdtemp()
+        delay, run_import.delay = run_import.delay, Mock(return_value=None)
+        try:
+            with override_settings(MEDIA_ROOT=media_root):
+                response = self.client.post('/dashboard/contact/uploadcsv', {
+                    'action': 1, 'object': 1, 'docfile': docfile})
+                job = models.Job.objects.get(kind='contact_import')
+                self.assertRedirects(response,
+                                     '/dashboard/job/view/%s' % job.pk)
+                run_import.delay.assert_called_once_with(job.pk)
+                run_import(job.pk)
+        finally:
+            run_import.delay = delay
+            shutil.rmtree(media_root)
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'D')
+        self.assertEqual(job.total, 3)
+        self.assertEqual(job.processed, 3)
+        self.assertEqual(job.failed, 0)
+        self.assertEqual(job.result['imported'], 3)
+        # creating the user also made the admin's simcard
+        self.assertEqual(models.ContactSimcards.objects.filter(
+            contact__callerid__startswith='63999').count(), 4)
+
+        response = self.client.get('/dashboard/job/view/%s' % job.pk)
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get('/dashboard/job/status/%s' % job.pk)
+        self.assertEqual(response.json()['failed'], 0)
+
+    def test_job_errors(self):
+        """ Failed rows are reported on the job """
+        rows = [','.join(contact_row(1)),
+                ','.join(contact_row(2, uuid=3333, callerid='639990000000'))]
+        data = HEADER + '\n'.join(rows)
+        media_root = tempfile.mkdtemp()
+        try:
+            with override_settings(MEDIA_ROOT=media_root):
+                document = models.Document.objects.create(
+                    name='contacts', description='contacts.csv',
+                    docfile=SimpleUploadedFile('contacts.csv',
+                                               data.encode('utf-8')))
+                job = models.Job.objects.create(kind='contact_import',
+                                                document=document)
+                run_import(job.pk)
+        finally:
+            shutil.rmtree(media_root)
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'D')
+        self.assertEqual(job.processed, 2)
+        self.assertEqual(job.failed, 1)
+        self.assertEqual(job.errors[0]['row'][8], '3333')
+        self.assertEqual(len(job.result['verify']), 1)
+        User.objects.create_user('Y', 'X@X.com', 'YY')
+        self.client.login(username='Y', password='YY')
+        response = self.client.get('/dashboard/job/status/%s' % job.pk)
+        self.assertEqual(response.json()['failed'], 1)
+        self.assertEqual(response.json()['errors'][0]['row'][8], '3333')
+
+        # the API is open to the network, so only the progress is there
+        response = self.client.get('/api/job/%s' % job.pk)
+        self.assertEqual(response.data['failed'], 1)
+        self.assertNotIn('errors', response.data)
+        self.assertNotIn('result', response.data)
+
+        self.client.logout()
+        response = self.client.get('/dashboard/job/status/%s' % job.pk)
+        self.assertEqual(response.status_code, 302)
+
+    def test_missing_headers(self):
+        """ Files without the expected columns fail the job """
+        media_root = tempfile.mkdtemp()
+        try:
+            with override_settings(MEDIA_ROOT=media_root):
+                document = models.Document.objects.create(
+                    name='contacts', description='contacts.csv',
+                    docfile=SimpleUploadedFile('contacts.csv',
+                                               b'firstname,lastname\n'))
+                job = models.Job.objects.create(kind='contact_import',
+                                                document=document)
+                run_import(job.pk)
+        finally:
+            shutil.rmtree(media_root)
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'F')
+        self.assertIn('Missing required headers', job.result['error'])
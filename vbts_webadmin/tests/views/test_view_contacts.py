@@ -229,3 +229,84 @@ class ContactBaseTestClass(TestCase):
     #     self.assertEqual(data['municipality'], contact.municipality)
     #     # contacts should still be 2
     #     self.assertEqual(2, models.ContactProfile.objects.all().count())
+
+
+class ContactSearchTest(TestCase):
+
+    """
+        Searching and paging the contacts list
+    """
+
+    def setUp(self):
+        User.objects.create_user('Z', 'Z@Z.com', 'ZZ')
+        self.client.login(username='Z', password='ZZ')
+        self.contact = models.Contact.objects.create(
+            callerid='639990000001', imsi='IMSI00101000000001')
+        self.profile = models.ContactProfile.objects.create(
+            uuid=2222, firstname='Juan', lastname='Dela Cruz', nickname='J',
+            age=30, gender='Male', municipality='San Luis',
+            barangay='Dikapinisan', sitio='Dikapinisan Proper')
+
+    def test_search_text(self):
+        """ The search text follows the contact's numbers and profile """
+        self.assertEqual(self.contact.search,
+                         '639990000001 imsi00101000000001')
+        simcard = models.ContactSimcards.objects.create(
+            contact=self.contact, contact_profile=self.profile)
+        self.contact.refresh_from_db()
+        self.assertEqual(self.contact.search,
+                         '639990000001 imsi00101000000001 juan dela cruz')
+
+        self.profile.firstname = 'Pedro'
+        self.profile.save()
+        self.contact.refresh_from_db()
+        self.assertIn('pedro', self.contact.search)
+
+        simcard.delete()
+        self.contact.refresh_from_db()
+        self.assertNotIn('pedro', self.contact.search)
+
+    def test_search(self):
+        """ Each section only lists the contacts that match """
+        models.ContactSimcards.objects.create(contact=self.contact,
+                                              contact_profile=self.profile)
+        models.Contact.objects.create(callerid='639990000002',
+                                      imsi='IMSI00101000000002')
+        models.Contact.objects.create(callerid='639170000002',
+                                      imsi='OFFNET639170000002')
+
+        response = self.client.get('/dashboard/contacts/', {
+            'search': 'JUAN 0001'})
+        self.assertEqual([item.contact_id for item in
+                          response.context['contacts_sims']],
+                         ['IMSI00101000000001'])
+        self.assertEqual(len(response.context['unreg_sims']), 0)
+
+        response = self.client.get('/dashboard/contacts/', {
+            'search': '0002'})
+        self.assertEqual(len(response.context['contacts_sims']), 0)
+        self.assertEqual([item.imsi for item in
+                          response.context['unreg_sims']],
+                         ['IMSI00101000000002'])
+        self.assertEqual([item.imsi for item in response.context['offnets']],
+                         ['OFFNET639170000002'])
+
+    def test_pages(self):
+        """ Every section is paged on its own """
+        models.Contact.objects.bulk_create([
+            models.Contact(callerid='6399900001%02d' % i,
+                           imsi='IMSI001010000001%02d' % i)
+            for i in range(20)])
+        response = self.client.get('/dashboard/contacts/')
+        unreg_sims = response.context['unreg_sims']
+        self.assertEqual(len(unreg_sims), 15)
+        self.assertIn('unreg_after=', unreg_sims.next_url)
+
+        response = self.client.get('/dashboard/contacts/' +
+                                   unreg_sims.next_url)
+        next_sims = response.context['unreg_sims']
+        self.assertTrue(next_sims.has_previous())
+        self.assertFalse(response.context['contacts_sims'].has_previous())
+        self.assertLess(next_sims.items[0].imsi, unreg_sims.items[-1].imsi)
+        self.assertContains(response, 'unreg_before=%s#menu1' %
+                            next_sims.items[0].imsi)
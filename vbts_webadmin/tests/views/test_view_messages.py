@@ -14,6 +14,7 @@ from django.utils import timezone
 from mock import Mock
 
 from vbts_webadmin import models
+from vbts_webadmin.tasks import broadcast
 from vbts_webadmin.tasks import send_sms
 
 
@@ -136,6 +137,7 @@ class MessageViewTest(TestCase):
         """We should be able to send an SMS to a subscriber"""
         self.login()
         send_sms.delay = Mock(return_value=None)
+        broadcast.delay = Mock(return_value=None)
         # We start with 1 message
         self.assertEqual(1, models.Message.objects.all().count())
         url = '/dashboard/message/send'
@@ -154,6 +156,7 @@ class MessageViewTest(TestCase):
         """We should be able to send an sms to a multiple subscribers"""
         self.login()
         send_sms.delay = Mock(return_value=None)
+        broadcast.delay = Mock(return_value=None)
         # We start with 1 message
         self.assertEqual(1, models.Message.objects.all().count())
         url = '/dashboard/message/send'
@@ -167,3 +170,35 @@ class MessageViewTest(TestCase):
         self.assertEqual(200, response.status_code)
         # Check if message count has incremented
         self.assertEqual(2, models.Message.objects.all().count())
+
+    def test_message_pages(self):
+        """Messages are paged newest first, by the last message seen"""
+        self.login()
+        models.Message.objects.bulk_create([
+            models.Message(author=self.admincontact, message='page %s' % i)
+            for i in range(20)])
+        response = self.client.get('/dashboard/messages/')
+        smss = response.context['smss']
+        self.assertEqual(len(smss), 15)
+        self.assertEqual(smss.count, 21)
+        self.assertFalse(smss.has_previous())
+        self.assertIn('after=%s' % smss.items[-1].pk, smss.next_url)
+        # the pager is there, with a link to the next page
+        self.assertContains(response, 'href="?after=%s">Next</a>' %
+                            smss.items[-1].pk)
+        self.assertContains(response, '21 in all')
+
+        response = self.client.get('/dashboard/messages/' + smss.next_url)
+        last = response.context['smss']
+        self.assertEqual(len(last), 6)
+        self.assertEqual(last.items[0].pk, smss.items[-1].pk - 1)
+        self.assertEqual(last.items[-1].pk, self.msg.pk)
+        self.assertFalse(last.has_next())
+
+        response = self.client.get('/dashboard/messages/' + last.previous_url)
+        self.assertEqual([item.pk for item in response.context['smss']],
+                         [item.pk for item in smss])
+
+        response = self.client.get('/dashboard/messages/', {'after': 'x'})
+        self.assertEqual([item.pk for item in response.context['smss']],
+                         [item.pk for item in smss])
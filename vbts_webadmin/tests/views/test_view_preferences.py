@@ -0,0 +1,65 @@
+"""
+Copyright (c) 2015-present, Philippine-California Advanced Research Institutes-
+The Village Base Station Project (PCARI-VBTS). All rights reserved.
+
+This source code is licensed under the BSD-style license found in the
+LICENSE file in the root directory of this source tree.
+"""
+
+from importlib import import_module
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.test import RequestFactory
+from django.test import TestCase
+
+from vbts_webadmin import models
+from vbts_webadmin.middleware import get_preferences
+
+
+class PreferencesTest(TestCase):
+
+    """
+        Timezone and language of the dashboard user
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user('Y', 'X@X.com', 'YY')
+        models.UserProfile.objects.filter(user=self.user).update(
+            timezone='Asia/Tokyo', language='tl')
+        self.factory = RequestFactory()
+
+    def request(self, path):
+        request = self.factory.get(path)
+        request.user = self.user
+        request.session = import_module(
+            settings.SESSION_ENGINE).SessionStore()
+        return request
+
+    def test_read_once(self):
+        """ The profile is read once per session """
+        request = self.request('/dashboard/')
+        with self.assertNumQueries(1):
+            self.assertEqual(get_preferences(request), ('Asia/Tokyo', 'tl'))
+        with self.assertNumQueries(0):
+            self.assertEqual(get_preferences(request), ('Asia/Tokyo', 'tl'))
+
+    def test_api(self):
+        """ API calls never look the user up """
+        request = self.request('/api/promo/status')
+        with self.assertNumQueries(0):
+            self.assertEqual(get_preferences(request), ('Asia/Manila', 'en'))
+
+    def test_profile_update(self):
+        """ Updating the profile updates the session """
+        self.client.login(username='Y', password='YY')
+        self.client.get('/dashboard/')
+        self.assertEqual(
+            self.client.session['vbts_preferences']['timezone'],
+            'Asia/Tokyo')
+
+        response = self.client.post('/dashboard/profile/update', {
+            'lang': 'en', 'tz': 'Asia/Manila'})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(self.client.session['vbts_preferences'], {
+            'timezone': 'Asia/Manila', 'language': 'en'})
@@ -8,10 +8,16 @@ LICENSE file in the root directory of this source tree.
 
 from django.contrib.auth.models import User
 from django.db import IntegrityError
+from django.db import connection
 from django.db import transaction
 from django.test import Client
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from mock import Mock
+from mock import patch
 
+from vbts_webadmin import entitlements
+from vbts_webadmin import importers
 from vbts_webadmin import models
 from vbts_webadmin.utils import float_to_mc
 
@@ -291,3 +297,67 @@ class PromoViewTest(TestCase):
         response = self.client.post(
             '/dashboard/promo/delete_subscription/1000')
         self.assertEqual(404, response.status_code)
+
+
+@patch('core.events.create_sms_event', Mock(return_value=None))
+@patch('core.subscriber.subscriber.get_account_balance',
+       Mock(return_value=10000000))
+class PromoGrantTest(TestCase):
+
+    """
+        Granting promos in bulk
+    """
+
+    def setUp(self):
+        entitlements.clear()
+        self.user = User.objects.create_user('Y', 'X@X.com', 'YY')
+        self.promo = models.Promo.objects.create(
+            author=self.user, name='Bulk Promo', price=float_to_mc(10),
+            promo_type='B', keyword='BULKPROMO', validity=2, local_sms=10,
+            local_call=10, globe_sms=5, globe_call=5, outside_sms=1,
+            outside_call=1)
+        self.contacts = [
+            models.Contact.objects.create(imsi='IMSI00101000000%04d' % i,
+                                          callerid='6399900%05d' % i)
+            for i in range(300)]
+
+    @patch('vbts_webadmin.tasks.send_sms_batch.delay')
+    def test_grant_promos(self, delay):
+        """ Subscriptions are made and announced in bulk """
+        rows = [['BULKPROMO', contact.callerid] for contact in self.contacts]
+        rows += [['NOPROMO', '639990000000'], ['BULKPROMO', '639000000000'],
+                 ['BULKPROMO']]
+        progress = Mock()
+
+        with CaptureQueriesContext(connection) as queries:
+            result = importers.import_promo_subscriptions(rows,
+                                                          progress=progress)
+        # promos, contacts, and a few inserts for the subscriptions
+        self.assertLess(len(queries.captured_queries), 10)
+
+        self.assertEqual(result['imported'], 300)
+        self.assertEqual(models.PromoSubscription.objects.filter(
+            promo=self.promo, globe_sms=5).count(), 300)
+        self.assertEqual(models.PromoSubscription.objects.active().count(),
+                         300)
+        processed, errors = progress.call_args[0]
+        self.assertEqual(processed, 303)
+        self.assertEqual([item['error'] for item in errors], [
+            'Expected 2 columns, got 1', 'Promo does not exist',
+            'Contact does not exist'])
+
+        self.assertEqual(delay.call_count, 1)
+        messages = delay.call_args[0][0]
+        self.assertEqual(len(messages), 300)
+        self.assertEqual(messages[0][0], self.contacts[0].callerid)
+        self.assertEqual(delay.call_args[1]['lane'], 'notification')
+
+    @patch('vbts_webadmin.tasks.send_sms_batch.delay', Mock())
+    def test_grant_invalidates_entitlements(self):
+        """ Cached entitlements are dropped, bulk_create sends no signals """
+        contact = self.contacts[0]
+        self.assertEqual(entitlements.get(contact.imsi).subscriptions, [])
+        importers.import_promo_subscriptions([['BULKPROMO',
+                                               contact.callerid]])
+        self.assertEqual(len(entitlements.get(contact.imsi).subscriptions),
+                         1)
@@ -17,9 +17,7 @@ from .autocomplete_light import CircleAutocomplete
 from .autocomplete_light import ContactAutocomplete
 from .autocomplete_light import SipBuddiesAutocomplete
 
-import vbts_webadmin.views.api
-import vbts_webadmin.views.api_groups
-import vbts_webadmin.views.apps
+import vbts_webadmin.urls_api
 import vbts_webadmin.views.dashboard
 import vbts_webadmin.views.circles
 import vbts_webadmin.views.configs
@@ -29,6 +27,7 @@ import vbts_webadmin.views.documents
 import vbts_webadmin.views.groups
 import vbts_webadmin.views.group_batch
 import vbts_webadmin.views.inforequests
+import vbts_webadmin.views.jobs
 import vbts_webadmin.views.messages
 import vbts_webadmin.views.promos
 import vbts_webadmin.views.promos_batch
@@ -109,6 +108,14 @@ urlpatterns += [url(r'^dashboard/groups/',
                     name='group_upload_csv'),
                 ]
 
+"""Jobs """
+urlpatterns += [
+    url(r'^dashboard/job/view/(?P<pk>\d+)$',
+        vbts_webadmin.views.jobs.job_view, name='job_detail'),
+    url(r'^dashboard/job/status/(?P<pk>\d+)$',
+        vbts_webadmin.views.jobs.job_status, name='job_status'),
+]
+
 """Files """
 urlpatterns += [
     url(r'^dashboard/documents/',
@@ -238,7 +245,7 @@ urlpatterns += [url(r'^dashboard/contacts/',
                 url(r'^dashboard/contact/uploadcsv',
                     vbts_webadmin.views.contact_batch.simple_upload,
                     name='contact_upload_csv'),
-                url(r'^dashboard/contact/verify',
+                url(r'^dashboard/contact/verify/(?P<pk>\d+)$',
                     vbts_webadmin.views.contact_batch.upload_verify,
                     name='contact_upload_verify'),
                 ]
@@ -276,41 +283,8 @@ urlpatterns += [
         vbts_webadmin.views.subscribers.subscribers_list, name='subscribers'),
 ]
 
-"""APIs """
-urlpatterns += [
-    url(r'^api/contact/create$', vbts_webadmin.views.api.CreateContact.as_view()),
-
-    url(r'^api/group/create$', vbts_webadmin.views.api_groups.CreateGroup.as_view()),
-    url(r'^api/group/delete$', vbts_webadmin.views.api_groups.DeleteGroup.as_view()),
-    url(r'^api/group/send$', vbts_webadmin.views.api_groups.SendGroupMsg.as_view()),
-    url(r'^api/group/edit$', vbts_webadmin.views.api_groups.EditGroupMems.as_view()),
-
-    url(r'^api/report/submit$', vbts_webadmin.views.api.SubmitReport.as_view()),
-
-    url(r'^api/service/subscribe$',
-        vbts_webadmin.views.api.SubscribeToService.as_view()),
-    url(r'^api/service/unsubscribe$',
-        vbts_webadmin.views.api.UnsubscribeToService.as_view()),
-    url(r'^api/service/send$', vbts_webadmin.views.api.SendSubscribersMsg.as_view()),
-    url(r'^api/service/status$', vbts_webadmin.views.api.GetServiceStatus.as_view()),
-    url(r'^api/service/price', vbts_webadmin.views.api.GetLocalServicePrice.as_view()),
-    url(r'^api/service/event', vbts_webadmin.views.api.CreateServiceEvent.as_view()),
-    url(r'^api/service/', vbts_webadmin.views.apps.service_details),
-
-    url(r'^api/promo/subscribe$', vbts_webadmin.views.api.PromoSubscribe.as_view()),
-    url(r'^api/promo/unsubscribe$',
-        vbts_webadmin.views.api.PromoUnsubscribe.as_view()),
-    url(r'^api/promo/getservicetype$',
-        vbts_webadmin.views.api.GetServiceType.as_view()),
-    url(r'^api/promo/getminbal$',
-        vbts_webadmin.views.api.GetRequiredBalance.as_view()),
-    url(r'^api/promo/getservicetariff',
-        vbts_webadmin.views.api.GetServiceTariff.as_view()),
-    url(r'^api/promo/getsecavail', vbts_webadmin.views.api.GetSecAvail.as_view()),
-    url(r'^api/promo/deduct', vbts_webadmin.views.api.QuotaDeduct.as_view()),
-    url(r'^api/promo/status', vbts_webadmin.views.api.GetPromoStatus.as_view()),
-    url(r'^api/promo/info', vbts_webadmin.views.api.GetPromoInfo.as_view()),
-]
+"""APIs, see urls_api """
+urlpatterns += vbts_webadmin.urls_api.urlpatterns
 
 
 """ IVRs """
@@ -0,0 +1,59 @@
+"""
+Copyright (c) 2015-present, Philippine-California Advanced Research Institutes-
+The Village Base Station Project (PCARI-VBTS). All rights reserved.
+
+This source code is licensed under the BSD-style license found in the
+LICENSE file in the root directory of this source tree.
+
+-
+URLs of the API called by FreeSWITCH. These are part of the site's URLs,
+and are also the whole URLconf of requests served by
+machine.MachineHandler, so that they're resolved without going through
+all of the dashboard's patterns first.
+"""
+
+from django.conf.urls import url
+
+import vbts_webadmin.views.api
+import vbts_webadmin.views.api_groups
+import vbts_webadmin.views.apps
+
+urlpatterns = [
+    url(r'^api/contact/create$', vbts_webadmin.views.api.CreateContact.as_view()),
+
+    url(r'^api/group/create$', vbts_webadmin.views.api_groups.CreateGroup.as_view()),
+    url(r'^api/group/delete$', vbts_webadmin.views.api_groups.DeleteGroup.as_view()),
+    url(r'^api/group/send$', vbts_webadmin.views.api_groups.SendGroupMsg.as_view()),
+    url(r'^api/group/edit$', vbts_webadmin.views.api_groups.EditGroupMems.as_view()),
+
+    url(r'^api/report/submit$', vbts_webadmin.views.api.SubmitReport.as_view()),
+
+    url(r'^api/service/subscribe$',
+        vbts_webadmin.views.api.SubscribeToService.as_view()),
+    url(r'^api/service/unsubscribe$',
+        vbts_webadmin.views.api.UnsubscribeToService.as_view()),
+    url(r'^api/service/send$', vbts_webadmin.views.api.SendSubscribersMsg.as_view()),
+    url(r'^api/service/status$', vbts_webadmin.views.api.GetServiceStatus.as_view()),
+    url(r'^api/service/price', vbts_webadmin.views.api.GetLocalServicePrice.as_view()),
+    url(r'^api/service/event', vbts_webadmin.views.api.CreateServiceEvent.as_view()),
+    url(r'^api/service/', vbts_webadmin.views.apps.service_details),
+
+    url(r'^api/promo/subscribe$', vbts_webadmin.views.api.PromoSubscribe.as_view()),
+    url(r'^api/promo/unsubscribe$',
+        vbts_webadmin.views.api.PromoUnsubscribe.as_view()),
+    url(r'^api/promo/getservicetype$',
+        vbts_webadmin.views.api.GetServiceType.as_view()),
+    url(r'^api/promo/getminbal$',
+        vbts_webadmin.views.api.GetRequiredBalance.as_view()),
+    url(r'^api/promo/getservicetariff',
+        vbts_webadmin.views.api.GetServiceTariff.as_view()),
+    url(r'^api/promo/getsecavail', vbts_webadmin.views.api.GetSecAvail.as_view()),
+    url(r'^api/promo/authorize$', vbts_webadmin.views.api.Authorize.as_view()),
+    url(r'^api/promo/deduct', vbts_webadmin.views.api.QuotaDeduct.as_view()),
+    url(r'^api/promo/status', vbts_webadmin.views.api.GetPromoStatus.as_view()),
+    url(r'^api/promo/info', vbts_webadmin.views.api.GetPromoInfo.as_view()),
+    url(r'^api/job/(?P<pk>\d+)$',
+        vbts_webadmin.views.api.GetJobStatus.as_view()),
+    url(r'^api/sms/metrics$',
+        vbts_webadmin.views.api.GetSmsMetrics.as_view()),
+]
@@ -123,3 +123,102 @@ def create_periodic_task(task_name, period, every, args=None, kwargs=None):
         ptask.kwargs = kwargs
     ptask.save()
     return ptask
+
+
+class KeysetPage(object):
+    """
+        A page of items, see keyset_paginate(). Iterates over the items,
+        next_url and previous_url are None on the last and first page.
+    """
+
+    def __init__(self, items, next_url, previous_url, count=None,
+                 count_is_exact=True):
+        self.items = items
+        self.next_url = next_url
+        self.previous_url = previous_url
+        self.count = count
+        self.count_is_exact = count_is_exact
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+    def has_next(self):
+        return self.next_url is not None
+
+    def has_previous(self):
+        return self.previous_url is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+def _keyset_url(request, drop, param, value):
+    query = request.GET.copy()
+    for name in drop:
+        query.pop(name, None)
+    query[param] = value
+    return '?' + query.urlencode()
+
+
+def keyset_paginate(request, queryset, per_page=15, prefix='',
+                    count_limit=None):
+    """
+        Pages a queryset newest first (by -pk), by the pk of the item
+        the page comes after or before instead of an OFFSET, so that
+        pages deep into a long history cost as much as the first one and
+        no COUNT(*) is needed. The cursors are taken from request.GET,
+        and kept in the next and previous urls along with the other
+        parameters, ie: search.
+    Args:
+        request: request of the list view
+        queryset: items to page
+        per_page: items per page
+        prefix: of the GET parameters (<prefix>after and <prefix>before),
+            for views with more than one list
+        count_limit: if set, items are counted, but only up to this many
+
+    Returns:
+        KeysetPage
+    """
+    after_param = prefix + 'after'
+    before_param = prefix + 'before'
+    drop = (after_param, before_param)
+    after = request.GET.get(after_param)
+    before = request.GET.get(before_param)
+
+    items = None
+    try:
+        if after:
+            items = list(queryset.filter(pk__lt=after).order_by(
+                '-pk')[:per_page + 1])
+            has_next, has_previous = len(items) > per_page, True
+            items = items[:per_page]
+        elif before:
+            items = list(queryset.filter(pk__gt=before).order_by(
+                'pk')[:per_page + 1])
+            has_next, has_previous = True, len(items) > per_page
+            items = items[:per_page][::-1]
+    except ValueError:  # not a pk
+        items = None
+    if not items:
+        # first page, or the cursor went past the end
+        items = list(queryset.order_by('-pk')[:per_page + 1])
+        has_next, has_previous = len(items) > per_page, False
+        items = items[:per_page]
+
+    next_url = previous_url = None
+    if has_next:
+        next_url = _keyset_url(request, drop, after_param, items[-1].pk)
+    if has_previous:
+        previous_url = _keyset_url(request, drop, before_param, items[0].pk)
+
+    count = None
+    count_is_exact = True
+    if count_limit is not None:
+        count = queryset.order_by()[:count_limit + 1].count()
+        count_is_exact = count <= count_limit
+        count = min(count, count_limit)
+    return KeysetPage(items, next_url, previous_url, count, count_is_exact)
@@ -12,36 +12,37 @@ from core import billing
 from core import events
 from core import number_utilities
 from core.subscriber import subscriber as endaga_sub
-from django.db.models import Q
 from django.utils import timezone as timezone
+from django.utils.http import urlencode
 from django.utils.translation import ugettext as _
-from pytz import timezone as pytz_timezone
 from rest_framework import status
 from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
-from rest_framework.views import APIView
 
-from vbts_webadmin.celery import app
-from vbts_webadmin.models import Config
+from vbts_webadmin import carriers
+from vbts_webadmin import charging
+from vbts_webadmin import config
+from vbts_webadmin import keywords
+from vbts_webadmin import resolver
+from vbts_webadmin import sms
+from vbts_webadmin.machine import MachineAPIView
 from vbts_webadmin.models import Contact
 from vbts_webadmin.models import Group
-from vbts_webadmin.models import GroupMembers
+from vbts_webadmin.models import Job
 from vbts_webadmin.models import Message
 from vbts_webadmin.models import MessageRecipients
 from vbts_webadmin.models import Promo
 from vbts_webadmin.models import PromoSubscription
-from vbts_webadmin.models import Report
 from vbts_webadmin.models import ReportMessages
-from vbts_webadmin.models import Service
 from vbts_webadmin.models import ServiceEvents
 from vbts_webadmin.models import ServiceSubscribers
 from vbts_webadmin.renderers import PlainTextRenderer
-from vbts_webadmin.tasks import purge_entry
 from vbts_webadmin.tasks import send_sms
+from vbts_webadmin.tasks import start_broadcast
 from vbts_webadmin.utils import mc_to_float
 
 
-class CreateContact(APIView):
+class CreateContact(MachineAPIView):
     """
         User wanted to register
         <base_url>/api/contact?
@@ -86,7 +87,7 @@ class CreateContact(APIView):
         return Response("ERROR", status=status.HTTP_400_BAD_REQUEST)
 
 
-class SubmitReport(APIView):
+class SubmitReport(MachineAPIView):
     """ Create a report
         <base_url>/api/report/submit/?
         Data arguments:
@@ -116,11 +117,9 @@ class SubmitReport(APIView):
             return Response("ERROR: Not registered subscriber.",
                             status=status.HTTP_400_BAD_REQUEST)
 
-        try:
-            report = Report.objects.filter(
-                Q(keyword=request.data['keyword'].upper()) &
-                Q(status='P'))[0]
-        except BaseException:
+        report = keywords.lookup(keywords.REPORT, request.data['keyword'],
+                                 published=True)
+        if report is None:
             send_sms.delay(subscriber.callerid, '0000',
                            _("Sorry we can't process your request. "
                              "Invalid keyword."))
@@ -129,7 +128,7 @@ class SubmitReport(APIView):
 
         new_report = ReportMessages()
         new_report.sender = subscriber
-        new_report.report = report
+        new_report.report_id = report.pk
         new_report.message = request.data['message']
         new_report.date = timezone.now()
         new_report.save()
@@ -137,11 +136,11 @@ class SubmitReport(APIView):
         send_sms.delay(subscriber.callerid, '0000',
                        _("You have successfully sent a report to %s.")
                        % report.keyword)
-        for manager in report.managers.all():
-            send_sms.delay(manager.callerid, '0000',
+        for _imsi, manager_callerid in report.managers:
+            send_sms.delay(manager_callerid, '0000',
                            _("New report from %(manager)s. "
                              "%(keyword)s:%(msg)s") % ({
-                                 'manager': manager.callerid,
+                                 'manager': manager_callerid,
                                  'keyword': report.keyword,
                                  'msg': new_report.message
                              }))
@@ -149,7 +148,7 @@ class SubmitReport(APIView):
         return Response('OK CREATED', status=status.HTTP_200_OK)
 
 
-class SubscribeToService(APIView):
+class SubscribeToService(MachineAPIView):
     """ Subscribe to a service.
         <base_url>/api/service/subscribe/?
         Data arguments:
@@ -179,11 +178,9 @@ class SubscribeToService(APIView):
             return Response("ERROR: Not registered subscriber.",
                             status=status.HTTP_400_BAD_REQUEST)
 
-        try:
-            service = Service.objects.filter(
-                keyword=request.data['keyword'].upper(),
-                service_type='P', status='P')[0]
-        except BaseException:
+        service = keywords.lookup(keywords.SERVICE, request.data['keyword'],
+                                  published=True)
+        if service is None or service.service_type != 'P':
             send_sms.delay(subscriber.callerid, '0000',
                            _("Sorry we can't process your request. "
                              "Invalid keyword."))
@@ -191,7 +188,7 @@ class SubscribeToService(APIView):
                             status=status.HTTP_400_BAD_REQUEST)
 
         is_duplicate = ServiceSubscribers.objects. \
-            filter(service=service, subscriber=subscriber).exists()
+            filter(service_id=service.pk, subscriber=subscriber).exists()
 
         if is_duplicate:
             send_sms.delay(
@@ -213,7 +210,7 @@ class SubscribeToService(APIView):
 
             # user passes above check, has enough balance, so sign him up!
             new_subscription = ServiceSubscribers(subscriber=subscriber,
-                                                  service=service)
+                                                  service_id=service.pk)
             new_subscription.date_joined = timezone.now()
             new_subscription.save()
             # finally, deduct service.price from subscriber's balance
@@ -226,7 +223,7 @@ class SubscribeToService(APIView):
             return Response('OK SUBSCRIBED', status=status.HTTP_200_OK)
 
 
-class UnsubscribeToService(APIView):
+class UnsubscribeToService(MachineAPIView):
     """ Unsubscribe to a service.
         <base_url>/api/service/unsubscribe/?
         Data arguments:
@@ -257,14 +254,14 @@ class UnsubscribeToService(APIView):
             return Response("ERROR: Not registered subscriber.",
                             status=status.HTTP_400_BAD_REQUEST)
 
+        service = keywords.lookup(keywords.SERVICE, keyword)
         try:
             subscription = ServiceSubscribers.objects.filter(
-                service__keyword__exact=keyword,
-                subscriber__imsi__exact=request.data['imsi'])[0]
+                service_id=service.pk, subscriber=subscriber)[0]
             subscription.delete()
             send_sms.delay(subscriber.callerid, '0000',
                            _("You have successfully unsubscribed to %s.")
-                           % subscription.service.name)
+                           % service.name)
             return Response('OK UNSUBSCRIBED', status=status.HTTP_200_OK)
         except BaseException:
             send_sms.delay(subscriber.callerid, '0000', _(
@@ -274,7 +271,7 @@ class UnsubscribeToService(APIView):
                             status=status.HTTP_400_BAD_REQUEST)
 
 
-class GetServiceStatus(APIView):
+class GetServiceStatus(MachineAPIView):
     """ Get the subscriber's status for a particular service
         <base_url>/api/service/status/?
         Data arguments:
@@ -302,11 +299,9 @@ class GetServiceStatus(APIView):
             return Response("ERROR: Not registered subscriber.",
                             status=status.HTTP_404_NOT_FOUND)
 
-        try:
-            service = Service.objects.filter(
-                keyword=request.data['keyword'].upper(),
-                service_type='P', status='P')[0]
-        except BaseException:
+        service = keywords.lookup(keywords.SERVICE, request.data['keyword'],
+                                  published=True)
+        if service is None or service.service_type != 'P':
             send_sms.delay(subscriber.callerid, '0000',
                            _("Sorry we can't process your request. "
                              "Invalid keyword."))
@@ -314,7 +309,7 @@ class GetServiceStatus(APIView):
                             status=status.HTTP_400_BAD_REQUEST)
 
         is_subscribed = ServiceSubscribers.objects. \
-            filter(service=service, subscriber=subscriber).exists()
+            filter(service_id=service.pk, subscriber=subscriber).exists()
 
         if is_subscribed:
             send_sms.delay(subscriber.callerid, '0000',
@@ -330,7 +325,7 @@ class GetServiceStatus(APIView):
                             status=status.HTTP_200_OK)
 
 
-class GetLocalServicePrice(APIView):
+class GetLocalServicePrice(MachineAPIView):
     """ Get the rate/price for a particular local service
         <base_url>/api/service/price/?
         Data arguments:
@@ -344,15 +339,12 @@ class GetLocalServicePrice(APIView):
             return Response("ERROR: Missing arguments.",
                             status=status.HTTP_400_BAD_REQUEST)
 
-        try:
-            price = Service.objects.get(
-                keyword=request.POST['keyword'].upper()).price
-        except BaseException:
-            price = 0
+        service = keywords.lookup(keywords.SERVICE, request.POST['keyword'])
+        price = service.price if service is not None else 0
         return Response(price, status=status.HTTP_200_OK)
 
 
-class CreateServiceEvent(APIView):
+class CreateServiceEvent(MachineAPIView):
     """ Creates a Service Event Entry
         <base_url>/api/service/event/?
         Data arguments:
@@ -368,15 +360,17 @@ class CreateServiceEvent(APIView):
             return Response("ERROR: Missing arguments.",
                             status=status.HTTP_400_BAD_REQUEST)
 
+        service = keywords.lookup(keywords.SERVICE, request.POST['keyword'])
         try:
-            service = Service.objects.get(keyword=request.POST['keyword'])
             subscriber = Contact.objects.get(imsi=request.POST['imsi'])
         except BaseException:
+            subscriber = None
+        if service is None or subscriber is None:
             return Response('BAD ARGS', status=status.HTTP_400_BAD_REQUEST)
 
         try:
             event = "Sent info request to '%s' service" % service.keyword
-            ServiceEvents.objects.create(service=service,
+            ServiceEvents.objects.create(service_id=service.pk,
                                          subscriber=subscriber,
                                          event=event)
             return Response('OK EVENT', status=status.HTTP_200_OK)
@@ -385,7 +379,7 @@ class CreateServiceEvent(APIView):
                             status=status.HTTP_400_BAD_REQUEST)
 
 
-class SendSubscribersMsg(APIView):
+class SendSubscribersMsg(MachineAPIView):
     """ Send message to service's subscribers.
         <base_url>/api/service/send/?
         Data arguments:
@@ -407,10 +401,8 @@ class SendSubscribersMsg(APIView):
 
         imsi = request.data['imsi']
         keyword = request.data['keyword']
-        try:
-            service = Service.objects.filter(keyword=keyword.upper(),
-                                             status='P')[0]
-        except BaseException:
+        service = keywords.lookup(keywords.SERVICE, keyword, published=True)
+        if service is None:
             send_sms.delay(endaga_sub.get_numbers_from_imsi(imsi)[0], '0000',
                            _("Sorry we can't process your request. "
                              "Invalid service."))
@@ -419,10 +411,9 @@ class SendSubscribersMsg(APIView):
 
         # check first if sender is the service manager
         # if so, propagate message to all service subscribers
-        if service.managers.filter(imsi=request.data['imsi']).exists():
-            for subscriber in service.subscribers.all():
-                send_sms.delay(subscriber.callerid, '0000',
-                               _("ANNOUNCEMENT: %s") % request.data['message'])
+        if any(manager[0] == imsi for manager in service.managers):
+            start_broadcast({'type': 'services', 'ids': [service.pk]}, '0000',
+                            _("ANNOUNCEMENT: %s") % request.data['message'])
             return Response('ANNOUNCEMENT SENT', status=status.HTTP_200_OK)
 
         else:
@@ -434,7 +425,7 @@ class SendSubscribersMsg(APIView):
                             % keyword, status=status.HTTP_400_BAD_REQUEST)
 
 
-class PromoSubscribe(APIView):
+class PromoSubscribe(MachineAPIView):
     """ Subscribe to a promo
         <base_url>/api/promo/subscribe?
         Data arguments:
@@ -466,27 +457,16 @@ class PromoSubscribe(APIView):
         # We put code to optionally limit promo subscriptions
         # this depends on the limit type declared in the configs
 
-        try:
-            limit_type = Config.objects.get(key='promo_limit_type').value
-        except Config.DoesNotExist:
-            limit_type = 'NA'
-
-        try:
-            max_promo_subscription = int(Config.objects.get(
-                key='max_promo_subscription').value)
-        except Config.DoesNotExist:
-            max_promo_subscription = 1
+        limit_type = config.get_str('promo_limit_type', 'NA')
+        max_promo_subscription = config.get_int('max_promo_subscription', 1)
+        min_balance_required = config.get_float('min_balance_required', 0)
 
-        try:
-            min_balance_required = float(Config.objects.get(
-                key='min_balance_required').value)
-        except Config.DoesNotExist:
-            min_balance_required = 0
+        entry = keywords.lookup(keywords.PROMO, keyword)
 
         # type A: Limit number of subscription per promo
-        if limit_type == 'A':
-            count = PromoSubscription.objects.filter(
-                promo__keyword__exact=keyword, contact=subscriber).count()
+        if limit_type == 'A' and entry is not None:
+            count = PromoSubscription.objects.active().filter(
+                promo_id=entry.pk, contact=subscriber).count()
             if count >= max_promo_subscription:
                 send_sms.delay(subscriber.callerid, '0000',
                                _("You have to many promo subscriptions."))
@@ -495,7 +475,7 @@ class PromoSubscribe(APIView):
 
         # type B: Limit number of subscription for all promos
         elif limit_type == 'B':
-            count = PromoSubscription.objects.filter(
+            count = PromoSubscription.objects.active().filter(
                 contact=subscriber).count()
             if count >= max_promo_subscription:
                 send_sms.delay(subscriber.callerid, '0000',
@@ -506,7 +486,7 @@ class PromoSubscribe(APIView):
             pass  # proceed as usual
 
         try:
-            promo = Promo.objects.get(keyword__exact=keyword)
+            promo = Promo.objects.get(pk=entry.pk)
         except BaseException:  # bad promo keyword
             send_sms.delay(subscriber.callerid, '0000',
                            _("You made a bad promo request."))
@@ -541,10 +521,7 @@ class PromoSubscribe(APIView):
         # price is expressed in millicents
         endaga_sub.subtract_credit(imsi, str(promo.price))
 
-        try:
-            tz = Config.objects.get(key='timezone').value
-        except Config.DoesNotExist:
-            tz = pytz_timezone('Asia/Manila')
+        tz = config.get_timezone()
 
         # present time to subscriber according to defined timezone
         expiry = new_subscription.date_expiration.astimezone(tz). \
@@ -558,12 +535,7 @@ class PromoSubscribe(APIView):
                              'expiry': expiry
                          }))
 
-        # and then create a purge task
-        # let's use the PK as the task_id, so that we dont have to create
-        # a new field to store the id. this might be OK for now.
-        purge_entry.apply_async(eta=new_subscription.date_expiration,
-                                args=[new_subscription.pk],
-                                task_id=str(new_subscription.pk))
+        # expire_subscriptions takes care of removing it once it expires
 
         # we should also create an event
         reason = "Promo subscription: %s" % promo.keyword
@@ -573,41 +545,156 @@ class PromoSubscribe(APIView):
         return Response('OK SUBSCRIBE', status=status.HTTP_200_OK)
 
 
-def is_dest_globe(dest):
-    prefix_globe = [
-        '63905',
-        '63906',
-        '63915',
-        '63916',
-        '63917',
-        '63926',
-        '63927',
-        '63935',
-        '63945',
-        '63955',
-        '63956',
-        '63966',
-        '63975',
-        '63976',
-        '63977',
-        '63995',
-        '63997',
-    ]
-
-    prefix_globe_abscbn = ['63937']
-
-    prefix_globe_cherry = ['63996']
-
-    prefix_tmbrgy = ['63936']
-
-    if dest[:5] in prefix_globe + prefix_globe_abscbn + \
-            prefix_globe_cherry + prefix_tmbrgy:
-        return True
+def get_service_type(imsi, transaction, dest):
+    """
+        Checks how the subscriber should be charged for a transaction
+    Args:
+        imsi: imsi of subscriber
+        transaction: either [local, outside] + [call, sms]
+        dest: destination callerid
+
+    Returns:
+        either [U_, B_, D_, G_] + [local, globe, outside] + [call, sms],
+        or the transaction itself if regular rates apply
+    """
+    service_type = transaction
+
+    tier = None if resolver.is_local(dest) else carriers.lookup(dest)
+    if tier:
+        # replace first word with the carrier's tier, ie: globe
+        service_type = tier + '_' + transaction.split('_')[1]
+
+    # follows U/B/D/G priority order, and regular rates apply
+    # if none of the subscriptions has allocation for the transaction
+    charging_type = charging.get_service_type(imsi, service_type, dest)
+    if charging_type != service_type:
+        return charging_type
+    return transaction
+
+
+def get_required_balance(transaction, tariff):
+    """
+        Gets the minimum balance required for a transaction
+    Args:
+        transaction: ['U', 'B', 'D', 'G', ''] + ['local', 'outside']
+                     + ['call', 'sms']
+        tariff: regular or discounted tariff of the transaction
+
+    Returns:
+        min balance, as string
+    """
+    if 'U_' in transaction or 'B_' in transaction:
+        # at least 1 peso required to use promo quotas
+        return config.get_str('promo_req_min_balance', '0')
+    # apply existing tariff for regular or discounted types
+    return tariff
+
+
+def get_service_tariff(imsi, transaction, dest):
+    """
+        Gets service tariff applicable for given service_type and
+        target destination, if applicable
+    Args:
+        imsi: subcriber's IMSI
+        transaction: either [U_, B_, D_, G_] + [local, outside] + [call, sms]
+        dest: destination number, can be empty if local
+
+    Returns:
+        tariff, as string
+    """
+    promo_type, service_type = extract_types(transaction)
+
+    # Assume first that regular tariffs will be applied
+    # then overwrite later if promos apply.
+    # Kinda weird, but this avoid 'ret' being unset if Disc
+    # promo is suddenly purged by celery while traversing FS dialplan
+    if 'sms' in service_type:
+        call_or_sms = 'sms'
     else:
-        return False
+        call_or_sms = 'call'
+    destination_number = number_utilities.strip_number(dest)
+
+    ret = str(billing.get_service_tariff(
+        carriers.get_billing_type(service_type),
+        call_or_sms,
+        destination_number)
+    )
+
+    # if unli or bulk, no tariff
+    if promo_type == 'U' or promo_type == 'B':
+        ret = '0'
+
+    # if discounted, get tariff from earliest subscribed discounted promo
+    elif promo_type in ['D', 'G']:
+        promo = charging.find_subscription(
+            charging.get_subscriptions(imsi), promo_type, service_type)
+
+        if promo and (promo_type == 'D' or
+                      charging.is_group_member(imsi, dest)):
+            ret = str(charging.get_allocation(promo, service_type))
+            # else, regular tariffs from above will apply
+
+    return ret
+
 
+def get_sec_avail(imsi, transaction, balance, dest):
+    """
+        Gets to number of available seconds that a subscriber can use to call
+        For promo types, max is configurable, default is 1 day
+    Args:
+        imsi:   subscriber IMSI
+        transaction: either [U_, B_, D_, G_] + [local, outside] + [call]
+        balance: subscriber balance, expressed in millicents
+        dest:   the destination number, if applicable
 
-class GetServiceType(APIView):
+    Returns:
+        seconds available, as string
+    """
+    promo_type, service_type = extract_types(transaction)
+    destination_number = number_utilities.strip_number(dest)
+
+    # This is the number of seconds available
+    # based on the subs current balance
+    sec_avail = int(billing.get_seconds_available(
+                    int(balance),
+                    carriers.get_billing_type(service_type),
+                    destination_number))
+
+    max_call_duration = config.get_int('max_call_duration', 0)
+    if max_call_duration <= 0:
+        # cap call at 1-day duration limit
+        max_call_duration = 24 * 60 * 60
+
+    # if unli, no tariff
+    if promo_type == 'U':
+        sec_avail = max_call_duration
+
+    # if bulk, depends on remaining quota
+    elif promo_type == 'B':
+        promo = charging.find_subscription(
+            charging.get_subscriptions(imsi), promo_type, service_type)
+        if promo:
+            sec_avail = charging.get_allocation(promo, service_type) * 60
+
+    # if discounted, get tariff from earliest subscribed discounted promo
+    elif promo_type in ['D', 'G']:
+        promo = charging.find_subscription(
+            charging.get_subscriptions(imsi), promo_type, service_type)
+
+        if promo:
+            disc_rate = charging.get_allocation(promo, service_type)
+            whole, deci = divmod(balance, disc_rate)
+            sec_avail = int(whole) * 60
+
+    # If afforded/available seconds is greater than limit,
+    # then we use the call duration limit
+    if sec_avail > max_call_duration:
+        return str(max_call_duration)
+    # Else, use what's originally available
+    return str(sec_avail)
+
+
+class GetServiceType(MachineAPIView):
     """ Checks how the subscriber should be charged based on their
         transaction (call or sms) and their promo quotas
         Data Args:
@@ -627,56 +714,14 @@ class GetServiceType(APIView):
         if not all(i in request.POST for i in needed_fields):
             return Response("Missing Args", status=status.HTTP_400_BAD_REQUEST)
 
-        imsi = request.data['imsi']
-        ret = transaction = request.data['trans']
-        dest = request.data['dest']
-
-        # Kludge!
-        try:
-            endaga_sub.get_imsi_from_number(dest)
-            local = True
-        except BaseException:
-            local = False
-
-        if not local and is_dest_globe(dest):
-            # replace first word with globe keyword
-            transaction = 'globe_' + transaction.split('_')[1]
-
-        # check first if subscriber has subscribed to U/B/D promos
-        # follows priority order
-
-        # we also have to check that the subscriber has allocation
-        # for the transaction. For example: if a user wants to do
-        # outside sms but only has promo allocation for unli local sms, then
-        # we should apply regular rates
-        for promo_type in ['U', 'B', 'D', 'G']:
-            query = transaction + '__gt'
-            listed_promos = PromoSubscription.objects.filter(
-                contact__imsi__exact=imsi, promo__promo_type=promo_type,
-                **{query: 0}).order_by('date_expiration')
-            if listed_promos:
-                if promo_type == 'G':  # check destination number
-                    try:
-                        GroupMembers.objects.get(group__owner__exact=imsi,
-                                                 user__callerid=dest)
-                        break
-                    except BaseException:
-                        pass  # destination not a group member, do nothing
-                else:
-                    break
-        # No promo subscriptions
-        else:
-            return Response(ret, status=status.HTTP_200_OK)
-
-        # NOTE: get the first item from queryset since that would expire first
-        key = 'listed_promos[0].%s' % transaction
-        if eval(key) > 0:
-            ret = '%s_%s' % (promo_type, transaction)
+        ret = get_service_type(request.data['imsi'],
+                               request.data['trans'],
+                               request.data['dest'])
 
         return Response(ret, status=status.HTTP_200_OK)
 
 
-class GetRequiredBalance(APIView):
+class GetRequiredBalance(MachineAPIView):
     """
         <base_url>/api/promo/getminbal?
         Get the required minimum balance depending on transaction
@@ -700,15 +745,8 @@ class GetRequiredBalance(APIView):
         if not all(i in request.POST for i in needed_fields):
             return Response("Missing Args", status=status.HTTP_400_BAD_REQUEST)
 
-        if 'U_' in request.data['trans'] or 'B_' in request.data['trans']:
-            # at least 1 peso required to use promo quotas
-            try:
-                min_bal = Config.objects.get(key='promo_req_min_balance').value
-            except Config.DoesNotExist:
-                min_bal = '0'
-        # apply existing tariff for regular or discounted types
-        else:
-            min_bal = request.data['tariff']
+        min_bal = get_required_balance(request.data['trans'],
+                                       request.data['tariff'])
 
         return Response(min_bal, status=status.HTTP_200_OK)
 
@@ -735,7 +773,7 @@ def extract_types(transaction):
     return promo_type, service_type
 
 
-class GetServiceTariff(APIView):
+class GetServiceTariff(MachineAPIView):
     """
         <base_url>/api/promo/getservicetariff?
         Gets service tariff applicable for given service_type and
@@ -752,68 +790,14 @@ class GetServiceTariff(APIView):
         if not all(i in request.POST for i in needed_fields):
             return Response("Missing Args", status=status.HTTP_400_BAD_REQUEST)
 
-        promo_type, service_type = extract_types(request.data['trans'])
-        imsi = request.data['imsi']
-        dest = request.data['dest']
-
-        # Assume first that regular tariffs will be applied
-        # then overwrite later if promos apply.
-        # Kinda weird, but this avoid 'ret' being unset if Disc
-        # promo is suddenly purged by celery while traversing FS dialplan
-        if 'sms' in service_type:
-            call_or_sms = 'sms'
-        else:
-            call_or_sms = 'call'
-        destination_number = number_utilities.strip_number(dest)
-
-        # Kludge!
-        if 'globe' in service_type:
-            # replace first word with globe keyword
-            ret = str(billing.get_service_tariff(
-                'outside_' + service_type.split('_')[1],
-                call_or_sms,
-                destination_number)
-            )
-        else:
-            ret = str(billing.get_service_tariff(
-                service_type,
-                call_or_sms,
-                destination_number)
-            )
-
-        # if unli or bulk, no tariff
-        if promo_type == 'U' or promo_type == 'B':
-            ret = '0'
-
-        # if discounted, get tariff from earliest subscribed discounted promo
-        elif promo_type in ['D']:
-            query = service_type + '__gt'
-            promo = PromoSubscription.objects.filter(
-                contact__imsi__exact=imsi, promo__promo_type=promo_type,
-                **{query: 0}).order_by('date_expiration')
-
-            if promo:
-                key = 'promo[0].%s' % service_type
-                ret = str(eval(key))
-                # else, regular tariffs from above will apply
-
-        elif promo_type in ['G']:
-            query = service_type + '__gt'
-            promo = PromoSubscription.objects.filter(
-                contact__imsi__exact=imsi, promo__promo_type=promo_type,
-                **{query: 0}).order_by('date_expiration')
-            member = GroupMembers.objects.filter(
-                group__owner__imsi__exact=imsi, user__callerid__exact=dest)
-
-            if promo and member:
-                key = 'promo[0].%s' % service_type
-                ret = str(eval(key))
-                # else, regular tariffs from above will apply
+        ret = get_service_tariff(request.data['imsi'],
+                                 request.data['trans'],
+                                 request.data['dest'])
 
         return Response(ret, status=status.HTTP_200_OK)
 
 
-class GetSecAvail(APIView):
+class GetSecAvail(MachineAPIView):
     """
         Gets to number of available seconds that a subscriber can use to call
         For promo types, max is configurable, default is 180 seconds
@@ -831,78 +815,56 @@ class GetSecAvail(APIView):
         if not all(i in request.POST for i in needed_fields):
             return Response("Missing Args", status=status.HTTP_400_BAD_REQUEST)
 
-        imsi = request.data['imsi']
-        promo_type, service_type = extract_types(request.data['trans'])
-        balance = int(request.data['balance'])
-        dest = request.data['dest']
+        ret = get_sec_avail(request.data['imsi'],
+                            request.data['trans'],
+                            int(request.data['balance']),
+                            request.data['dest'])
 
-        destination_number = number_utilities.strip_number(dest)
+        return Response(ret, status=status.HTTP_200_OK)
 
-        # This is the number of seconds available
-        # based on the subs current balance
-        if 'globe' in service_type:
-            # replace first word with globe keyword
-            sec_avail = int(billing.get_seconds_available(
-                            int(balance),
-                            'outside_' + service_type.split('_')[1],
-                            destination_number)
-                            )
 
-        else:
-            sec_avail = int(billing.get_seconds_available(
-                            int(balance),
-                            service_type,
-                            destination_number))
+class Authorize(MachineAPIView):
+    """
+        <base_url>/api/promo/authorize?
+        Everything the chatplan/dialplan needs to set up a transaction in a
+        single round trip, instead of calling getservicetype, getminbal,
+        getservicetariff and getsecavail one after the other
+        Data Args:
+            imsi: imsi of subscriber
+            trans: either [local, outside] + [call, sms]
+            dest: destination callerid
+            balance: subscriber balance, expressed in millicents
+        Output:
+            service_type=<type>&tariff=<tariff>&min_bal=<min bal>
+            and &sec_avail=<seconds> for calls
+    """
 
-        try:
-            max_call_duration = Config.objects.get(
-                key='max_call_duration').value
-            if int(max_call_duration) <= 0:
-                raise ValueError
-        except (Config.DoesNotExist, ValueError):
-            # cap call at 1-day duration limit
-            max_call_duration = 24 * 60 * 60
-
-        # if unli, no tariff
-        if promo_type == 'U':
-            sec_avail = max_call_duration
-
-        # if bulk, depends on remaining quota
-        elif promo_type == 'B':
-            query = service_type + '__gt'
-            promo = PromoSubscription.objects.filter(
-                contact__imsi__exact=imsi, promo__promo_type=promo_type,
-                **{query: 0}).order_by('date_expiration')
-            if promo:
-                key = 'promo[0].%s' % service_type
-                sec_avail = eval(key) * 60
-
-        # if discounted, get tariff from earliest subscribed discounted promo
-        elif promo_type in ['D', 'G']:
-            query = service_type + '__gt'
-            promo = PromoSubscription.objects.filter(
-                contact__imsi__exact=imsi, promo__promo_type=promo_type,
-                **{query: 0}).order_by('date_expiration')
-
-            if promo:
-                key = 'promo[0].%s' % service_type
-                disc_rate = eval(key)
-                whole, deci = divmod(balance, disc_rate)
-                sec_avail = int(whole) * 60
-
-        # If afforded/available seconds is greater than limit,
-        # then we use the call duration limit
-        if sec_avail > int(max_call_duration):
-            ret = str(max_call_duration)
-        # Else, use what's originally available
-        else:
-            ret = str(sec_avail)
+    renderer_classes = (PlainTextRenderer,)
 
-        return Response(ret, status=status.HTTP_200_OK)
+    def post(self, request, format=None):
+        needed_fields = ["imsi", "trans", "dest", "balance"]
+        if not all(i in request.POST for i in needed_fields):
+            return Response("Missing Args", status=status.HTTP_400_BAD_REQUEST)
+
+        imsi = request.data['imsi']
+        dest = request.data['dest']
 
+        service_type = get_service_type(imsi, request.data['trans'], dest)
+        tariff = get_service_tariff(imsi, service_type, dest)
+        ret = [('service_type', service_type),
+               ('tariff', tariff),
+               ('min_bal', get_required_balance(service_type, tariff))]
+        if 'call' in service_type:
+            ret.append(('sec_avail', get_sec_avail(
+                imsi, service_type, int(request.data['balance']), dest)))
 
-class QuotaDeduct(APIView):
-    """ Applicable only for Bulk promo types
+        return Response(urlencode(ret), status=status.HTTP_200_OK)
+
+
+class QuotaDeduct(MachineAPIView):
+    """ Applicable only for Bulk promo types. Quota is taken from the
+        earliest expiring subscription first and spills over to the next
+        ones; nothing is deducted if the subscriber doesn't have enough.
         Args:
             trans: transaction type, any of the ff combinations
                    ['U', 'B', 'D', 'G' ''] + ['local', 'outside']
@@ -911,9 +873,9 @@ class QuotaDeduct(APIView):
             imsi: subscriber's IMSI
             amount: if sms transaction, default is 1
                     if call transaction, this is call duration (in mins)
-            tariff: exisiting call_tariff, as returned by VBTS_Get_Call_Tariff
         Output:
-            min_bal: minimum balance required
+            'OK <remaining quota for the service type>', or with status 402,
+            'Insufficient quota <remaining quota>' if nothing was deducted
     """
 
     renderer_classes = (JSONRenderer,)
@@ -925,31 +887,23 @@ class QuotaDeduct(APIView):
 
         imsi = request.data['imsi']
         promo_type, service_type = extract_types(request.data['trans'])
-        amount = int(request.data['amount'])
+        try:
+            amount = int(request.data['amount'])
+        except ValueError:
+            amount = 0
+        if amount <= 0:
+            return Response("Invalid amount",
+                            status=status.HTTP_400_BAD_REQUEST)
 
         if promo_type == 'B':
-            query = service_type + '__gte'
-            subscription = PromoSubscription.objects.filter(
-                contact__imsi__exact=imsi, promo__promo_type='B',
-                **{query: amount}).order_by('date_expiration')
-
-            if subscription:
-                if 'local_sms' in service_type:
-                    subscription[0].local_sms -= amount
-                elif 'local_call' in service_type:
-                    subscription[0].local_call -= amount
-                elif 'globe_sms' in service_type:
-                    subscription[0].globe_sms -= amount
-                elif 'globe_call' in service_type:
-                    subscription[0].globe_call -= amount
-                elif 'outside_sms' in service_type:
-                    subscription[0].outside_sms -= amount
-                elif 'outside_call' in service_type:
-                    subscription[0].outside_call -= amount
-                subscription[0].save()
-
-            ret = 'OK'
-            status_code = status.HTTP_200_OK
+            deducted, remaining = charging.deduct_quota(imsi, service_type,
+                                                        amount)
+            if deducted:
+                ret = 'OK %d' % remaining
+                status_code = status.HTTP_200_OK
+            else:
+                ret = 'Insufficient quota %d' % remaining
+                status_code = status.HTTP_402_PAYMENT_REQUIRED
 
         else:
             ret = 'Not Bulk promo'
@@ -958,7 +912,66 @@ class QuotaDeduct(APIView):
         return Response(ret, status=status_code)
 
 
-class GetPromoStatus(APIView):
+# Lines of the promo status message, by promo type and service type.
+# Discount prices are filled in as pesos, bulk quotas as they are, and
+# unlimited promos only say what they cover.
+_DISCOUNT_STATUS = {
+    'local_sms': "%(keyword)s local texts discount price: P%(value)s",
+    'local_call': "%(keyword)s local call/min discount price: P%(value)s",
+    'globe_sms': "%(keyword)s Globe texts discount price: P%(value)s",
+    'globe_call': "%(keyword)s Globe call/min discount price: P%(value)s",
+    'outside_sms': "%(keyword)s outside texts discount price: P%(value)s",
+    'outside_call': "%(keyword)s outside call/min discount price: "
+                    "P%(value)s",
+}
+PROMO_STATUS_FORMATS = dict(
+    [(('D', field), line) for field, line in _DISCOUNT_STATUS.items()] +
+    [(('G', field), line) for field, line in _DISCOUNT_STATUS.items()] + [
+        (('B', 'local_sms'), "%(keyword)s local texts: %(value)s"),
+        (('B', 'local_call'), "%(keyword)s local call mins: %(value)s"),
+        (('B', 'globe_sms'), "%(keyword)s Globe texts: %(value)s"),
+        (('B', 'globe_call'), "%(keyword)s Globe call mins: %(value)s"),
+        (('B', 'outside_sms'), "%(keyword)s outside texts: %(value)s"),
+        (('B', 'outside_call'), "%(keyword)s outside call mins: %(value)s"),
+        (('U', 'local_sms'), "%(keyword)s unli local texts"),
+        (('U', 'local_call'), "%(keyword)s unli local calls"),
+        (('U', 'globe_sms'), "%(keyword)s unli Globe texts"),
+        (('U', 'globe_call'), "%(keyword)s unli Globe calls"),
+        (('U', 'outside_sms'), "%(keyword)s unli outside texts"),
+        (('U', 'outside_call'), "%(keyword)s unli outside calls"),
+    ])
+
+
+def format_promo_status(subscriptions, tz):
+    """
+        Builds the promo status message sent by GetPromoStatus
+    Args:
+        subscriptions: PromoSubscriptions, with their promo already loaded
+        tz: timezone to show expiration dates in
+
+    Returns:
+        message, with lines separated by an escaped newline
+    """
+    lines = []
+    for item in subscriptions:
+        promo_type = item.promo.promo_type
+        keyword = item.promo.keyword
+        lines.append("Your %s promo status: " % keyword)
+        for field in charging.SERVICE_TYPES:
+            value = getattr(item, field)
+            line = PROMO_STATUS_FORMATS.get((promo_type, field))
+            if not value or line is None:
+                continue
+            if promo_type in ('D', 'G'):
+                value = mc_to_float(value)
+            lines.append(line % {'keyword': keyword, 'value': value})
+        if item.date_expiration is not None:
+            lines.append("Exp: %s" % item.date_expiration.astimezone(
+                tz).strftime("%m/%d/%y %I:%M%p"))
+    return "\\n".join(lines)
+
+
+class GetPromoStatus(MachineAPIView):
     """
         <base_url>/api/promo/status?
         API call to query the status of a subscriber's promo subscription
@@ -975,89 +988,28 @@ class GetPromoStatus(APIView):
         callerid = endaga_sub.get_numbers_from_imsi(imsi)[0]
 
         if not keyword:
-            subscriptions = PromoSubscription.objects.filter(
+            subscriptions = PromoSubscription.objects.active().filter(
                 contact__imsi__exact=imsi). \
                 order_by('date_expiration')
         else:
-            subscriptions = PromoSubscription.objects.filter(
-                contact__imsi__exact=imsi, promo__keyword=keyword). \
+            promo = keywords.lookup(keywords.PROMO, keyword)
+            subscriptions = PromoSubscription.objects.active().filter(
+                contact__imsi__exact=imsi,
+                promo_id=promo.pk if promo is not None else None). \
                 order_by('date_expiration')
+        subscriptions = subscriptions.select_related('promo')
         if not subscriptions:
             send_sms.delay(callerid, '0000',
                            _("You have no %s subscriptions.") % keyword)
 
         else:
-            msg = ""
-
-            try:
-                tz = Config.objects.get(key='timezone').value
-            except Config.DoesNotExist:
-                tz = pytz_timezone('Asia/Manila')
-
-            for item in subscriptions:
-                msg += "Your %s promo status: \\n" % item.promo.keyword
-                expiry = item.date_expiration. \
-                    astimezone(tz).strftime("%m/%d/%y %I:%M%p")
-
-                if item.promo.promo_type == 'D' or item.promo.promo_type == 'G':
-                    if item.local_sms:
-                        msg += "%s local texts discount price: P%s\\n" % (
-                            item.promo.keyword, mc_to_float(item.local_sms))
-                    if item.local_call:
-                        msg += "%s local call/min discount price: P%s\\n" % (
-                            item.promo.keyword, mc_to_float(item.local_call))
-                    if item.globe_sms:
-                        msg += "%s Globe texts discount price: P%s\\n" % (
-                            item.promo.keyword, mc_to_float(item.globe_sms))
-                    if item.globe_call:
-                        msg += "%s Globe call/min discount price: P%s\\n" % (
-                            item.promo.keyword, mc_to_float(item.globe_call))
-                    if item.outside_sms:
-                        msg += "%s outside texts discount price: P%s\\n" % (
-                            item.promo.keyword, mc_to_float(item.outside_sms))
-                    if item.outside_call:
-                        msg += "%s outside call/min discount price: P%s\\n" % (
-                            item.promo.keyword, mc_to_float(item.outside_call))
-                elif item.promo.promo_type == 'B':
-                    if item.local_sms:
-                        msg += "%s local texts: %s\\n" % (
-                            item.promo.keyword, item.local_sms)
-                    if item.local_call:
-                        msg += "%s local call mins: %s\\n" % (
-                            item.promo.keyword, item.local_call)
-                    if item.globe_sms:
-                        msg += "%s Globe texts: %s\\n" % (
-                            item.promo.keyword, item.globe_sms)
-                    if item.globe_call:
-                        msg += "%s Globe call mins: %s\\n" % (
-                            item.promo.keyword, item.globe_call)
-                    if item.outside_sms:
-                        msg += "%s outside texts: %s\\n" % (
-                            item.promo.keyword, item.outside_sms)
-                    if item.outside_call:
-                        msg += "%s outside call mins: %s\\n" % (
-                            item.promo.keyword, item.outside_call)
-                elif item.promo.promo_type == 'U':
-                    if item.local_sms:
-                        msg += "%s unli local texts\\n" % item.promo.keyword
-                    if item.local_call:
-                        msg += "%s unli local calls\\n" % item.promo.keyword
-                    if item.globe_sms:
-                        msg += "%s unli Globe texts\\n" % item.promo.keyword
-                    if item.globe_call:
-                        msg += "%s unli Globe calls\\n" % item.promo.keyword
-                    if item.outside_sms:
-                        msg += "%s unli outside texts\\n" % item.promo.keyword
-                    if item.outside_call:
-                        msg += "%s unli outside calls\\n" % item.promo.keyword
-                msg += "Exp: %s\\n" % expiry
-
-            send_sms.delay(callerid, '0000', msg[:-2])
+            send_sms.delay(callerid, '0000', format_promo_status(
+                subscriptions, config.get_timezone()))
 
         return Response('OK', status=status.HTTP_200_OK)
 
 
-class PromoUnsubscribe(APIView):
+class PromoUnsubscribe(MachineAPIView):
     renderer_classes = (JSONRenderer,)
 
     def post(self, request, format=None):
@@ -1068,15 +1020,15 @@ class PromoUnsubscribe(APIView):
         imsi = request.data['imsi']
         keyword = request.data['keyword']
         callerid = endaga_sub.get_numbers_from_imsi(imsi)[0]
+        promo = keywords.lookup(keywords.PROMO, keyword)
         subscriptions = PromoSubscription.objects.filter(
-            contact__imsi__exact=imsi, promo__keyword=keyword)
+            contact__imsi__exact=imsi,
+            promo_id=promo.pk if promo is not None else None)
         if not subscriptions:
             send_sms.delay(callerid, '0000',
                            _("You have no %s subscriptions.") % keyword)
             ret = 'FAIL UNSUBSCRIBE'
         else:
-            for item in subscriptions:
-                app.control.revoke(str(item.id), terminate=True)
             subscriptions.delete()
             msg = _("You are now unsubscribed from your %s promos.") % keyword
             send_sms.delay(callerid, '0000', msg)
@@ -1091,7 +1043,7 @@ class PromoUnsubscribe(APIView):
         return Response(ret, status=status.HTTP_200_OK)
 
 
-class GetPromoInfo(APIView):
+class GetPromoInfo(MachineAPIView):
     """
         <base_url>/api/promo/info?
         API call to get info on particular promo
@@ -1107,11 +1059,47 @@ class GetPromoInfo(APIView):
         keyword = request.data['keyword']
         callerid = endaga_sub.get_numbers_from_imsi(imsi)[0]
 
-        try:
-            promo = Promo.objects.get(keyword__exact=keyword)
+        promo = keywords.lookup(keywords.PROMO, keyword)
+        if promo is not None:
             msg = promo.description
-        except BaseException:
+        else:
             msg = "You have entered an invalid promo keyword."
         send_sms.delay(callerid, '0000', msg)
 
         return Response('OK', status=status.HTTP_200_OK)
+
+
+class GetJobStatus(MachineAPIView):
+    """
+        <base_url>/api/job/<pk>
+        Progress of a background job, ie: a broadcast. Errors and results
+        are only shown on the dashboard (see jobs.job_status).
+        Output:
+            id, kind, status, total, processed and failed of the job
+    """
+
+    renderer_classes = (JSONRenderer,)
+
+    def get(self, request, pk, format=None):
+        try:
+            job = Job.objects.get(pk=pk)
+        except Job.DoesNotExist:
+            return Response("Not Found", status=status.HTTP_404_NOT_FOUND)
+
+        return Response(job.as_dict(details=False),
+                        status=status.HTTP_200_OK)
+
+
+class GetSmsMetrics(MachineAPIView):
+    """
+        <base_url>/api/sms/metrics
+        Outbound SMS queue depth and latency, per lane
+        Output:
+            list of lane, queue, rate, queued (None if unknown), sent,
+            avg_latency and max_latency (in seconds)
+    """
+
+    renderer_classes = (JSONRenderer,)
+
+    def get(self, request, format=None):
+        return Response(sms.get_metrics(), status=status.HTTP_200_OK)
@@ -7,63 +7,149 @@ LICENSE file in the root directory of this source tree.
 """
 
 from core import number_utilities
+from django.db import transaction as db_transaction
 from django.utils import timezone as timezone
 from django.utils.translation import ugettext as _
 from rest_framework import status
 from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
-from rest_framework.views import APIView
 
-from vbts_webadmin.models import Config
+from vbts_webadmin import config
+from vbts_webadmin import entitlements
+from vbts_webadmin import resolver
+from vbts_webadmin.machine import MachineAPIView
 from vbts_webadmin.models import Contact
 from vbts_webadmin.models import Group
 from vbts_webadmin.models import GroupMembers
 from vbts_webadmin.models import Message
-from vbts_webadmin.models import MessageRecipients
 from vbts_webadmin.tasks import send_sms
+from vbts_webadmin.tasks import start_broadcast
 
 
-def add_group_members(mems, group):
+def canonicalize_members(mems):
     """
-        Adds group member entries
+        Canonicalizes member callerIDs
     Args:
         mems: CSV of member callerIDs
-        group: Group instance in which callerIDs will be added
 
     Returns:
-        invalid: list containing caller ids that the system failed to add
-                 if all numbers were successfully added, this is an empty list
+        tuple of (valid callerIDs in the order given, without duplicates,
+        and the invalid ones)
     """
-
+    callerids = []
     invalid = []
     for caller_id in str(mems).split(','):
         if not caller_id:
             continue
         try:
             caller_id = number_utilities.canonicalize(caller_id)
-
-            if len(caller_id) < 10 or len(caller_id) > 12:
-                raise Exception("Canonicalized cellphone numbers "
-                                "must be 12 digits long and "
-                                "canonicalized landline numbers "
-                                "must be 10 digits long.")
-
-            # Also handle caller_ids that are not within VBTS network
-            try:
-                mem = Contact.objects.get(callerid=caller_id)
-            except BaseException:
-                mem = Contact.objects.create(imsi="OFFNET" + caller_id,
-                                             callerid=caller_id)
-
-            GroupMembers.objects.create(user=mem,
-                                        group=group)
         except BaseException:
             invalid.append(caller_id)
+            continue
+        if len(caller_id) < 10 or len(caller_id) > 12:
+            # Canonicalized cellphone numbers must be 12 digits long and
+            # canonicalized landline numbers must be 10 digits long.
+            invalid.append(caller_id)
+        elif caller_id not in callerids:
+            callerids.append(caller_id)
+    return callerids, invalid
+
+
+def get_member_imsis(callerids):
+    """
+        Gets the contacts of member callerIDs with one query, and creates
+        the missing ones with another. Callerids that aren't within the
+        VBTS network get an OFFNET contact.
+    Returns:
+        tuple of (dict of callerID to IMSI, and the callerIDs that can't
+        be added, ie: their IMSI belongs to another contact)
+    """
+    imsis = dict(Contact.objects.filter(callerid__in=callerids).values_list(
+        'callerid', 'imsi'))
+    missing = dict((caller_id, resolver.get_imsi(caller_id) or
+                    "OFFNET" + caller_id)
+                   for caller_id in callerids if caller_id not in imsis)
+    if not missing:
+        return imsis, []
+
+    taken = set(Contact.objects.filter(imsi__in=missing.values()).values_list(
+        'imsi', flat=True))
+    invalid = [caller_id for caller_id in callerids
+               if missing.get(caller_id) in taken]
+    new_contacts = [Contact(imsi=imsi, callerid=caller_id,
+                            search=Contact.search_text(caller_id, imsi))
+                    for caller_id, imsi in missing.items()
+                    if imsi not in taken]
+    Contact.objects.bulk_create(new_contacts)
+    if any(resolver.is_local_imsi(item.imsi) for item in new_contacts):
+        resolver.refresh()  # bulk_create doesn't send post_save
+    imsis.update((item.callerid, item.imsi) for item in new_contacts)
+    return imsis, invalid
+
+
+def reconcile_group_members(mems, group, replace=True):
+    """
+        Sets the members of a group, in one transaction and with a handful
+        of queries whatever the number of members: only the members that
+        aren't there yet are inserted, and if replacing, only those that
+        are no longer wanted are deleted.
+    Args:
+        mems: CSV of member callerIDs
+        group: Group instance whose members are set
+        replace: whether members not in mems are removed
 
+    Returns:
+        invalid: list containing caller ids that the system failed to add
+                 if all numbers were successfully added, this is an empty list
+    """
+    callerids, invalid = canonicalize_members(mems)
+    with db_transaction.atomic():
+        imsis, failed = get_member_imsis(callerids)
+        invalid.extend(failed)
+        wanted = [imsis[caller_id] for caller_id in callerids
+                  if caller_id in imsis]
+        current = set(GroupMembers.objects.filter(group=group).values_list(
+            'user_id', flat=True))
+        if replace and current - set(wanted):
+            GroupMembers.objects.filter(
+                group=group, user_id__in=current - set(wanted)).delete()
+        GroupMembers.objects.bulk_create([
+            GroupMembers(group=group, user_id=imsi)
+            for imsi in wanted if imsi not in current])
+    # bulk_create doesn't send post_save
+    entitlements.invalidate(group.owner_id)
     return invalid
 
 
-class CreateGroup(APIView):
+def add_group_members(mems, group):
+    """
+        Adds group member entries, see reconcile_group_members()
+    Args:
+        mems: CSV of member callerIDs
+        group: Group instance in which callerIDs will be added
+
+    Returns:
+        invalid: list containing caller ids that the system failed to add
+                 if all numbers were successfully added, this is an empty list
+    """
+    return reconcile_group_members(mems, group, replace=False)
+
+
+def set_group_members(mems, group):
+    """
+        Replaces the members of a group, see reconcile_group_members()
+    Args:
+        mems: CSV of member callerIDs
+        group: Group instance whose members are replaced
+
+    Returns:
+        invalid: list containing caller ids that the system failed to add
+                 if all numbers were successfully added, this is an empty list
+    """
+    return reconcile_group_members(mems, group, replace=True)
+
+
+class CreateGroup(MachineAPIView):
     """ Create a group; to be used in F&F promo
         <base_url>/api/group?
         Data arguments:
@@ -86,8 +172,8 @@ class CreateGroup(APIView):
         # We put code to optionally the number of groups that a user can
         # create. This depends on the max number declared in the configs
 
-        max_groups_per_subscriber = Config.objects.get(
-            key='max_groups_per_subscriber').value
+        max_groups_per_subscriber = config.get_str(
+            'max_groups_per_subscriber', 'NA')
         count = Group.objects.filter(owner=requester).count()
         if max_groups_per_subscriber == 'NA':
             pass  # unlimited, do nothing
@@ -136,7 +222,7 @@ class CreateGroup(APIView):
         return Response('OK CREATED', status=status.HTTP_200_OK)
 
 
-class EditGroupMems(APIView):
+class EditGroupMems(MachineAPIView):
     """ Edit members of the group
         <base_url>/api/group/edit
         Data arguments:
@@ -177,11 +263,7 @@ class EditGroupMems(APIView):
 
         delta = timezone.now() - group.last_modified
 
-        try:
-            group_edit_interval = Config.objects.get(
-                key='group_edit_interval').value
-        except Config.DoesNotExist:
-            group_edit_interval = 30
+        group_edit_interval = config.get_int('group_edit_interval', 30)
 
         if delta.days < group_edit_interval:
             send_sms.delay(
@@ -192,9 +274,8 @@ class EditGroupMems(APIView):
                             status=status.HTTP_400_BAD_REQUEST)
 
         else:
-            group.members.clear()   # clear existing group members first
-            group.save()            # then add the new set of members
-            invalid = add_group_members(mems, group)
+            invalid = set_group_members(mems, group)
+            group.save()
 
         send_sms.delay(group.owner.callerid, '0000',
                        _("Your group %s has been successfully edited.")
@@ -204,12 +285,12 @@ class EditGroupMems(APIView):
                            _("However, we failed to add the following to "
                              "group %(group)s. %(invalid)s") % ({
                                  'group': group.name,
-                                 'inavlid': str(invalid)
+                                 'invalid': str(invalid)
                              }))
         return Response('OK EDIT', status=status.HTTP_200_OK)
 
 
-class DeleteGroup(APIView):
+class DeleteGroup(MachineAPIView):
     """ Delete a group
         <base_url>/api/group/delete
         Data arguments:
@@ -245,7 +326,7 @@ class DeleteGroup(APIView):
             return Response('DELETE FAIL', status=status.HTTP_400_BAD_REQUEST)
 
 
-class SendGroupMsg(APIView):
+class SendGroupMsg(MachineAPIView):
     """ Send a message to a group
         <base_url>/api/group/send?
         Data arguments:
@@ -284,27 +365,8 @@ class SendGroupMsg(APIView):
         message.published_date = timezone.now()
         message.save()
 
-        failed = []
-        invalid_callerid = False
-
-        for member in members:
-            recipient = MessageRecipients.objects.create(message=message,
-                                                         user=member.user)
-            try:
-                send_sms.delay(recipient.user.callerid,
-                               sender.callerid,
-                               message.message)
-                recipient.save()
-
-            except openbts.exceptions.InvalidRequestError:
-                invalid_callerid = True
-                failed.append(recipient.user.callerid)
-
-        if invalid_callerid:
-            send_sms.delay(sender.callerid, '0000',
-                           _("Failed to send your message to: %s.") % failed)
-            return Response("", status=status.HTTP_400_BAD_REQUEST)
-        else:
-            send_sms.delay(sender.callerid, '0000',
-                           _("Successfully sent your message to the group."))
-            return Response('OK SEND', status=status.HTTP_200_OK)
+        start_broadcast({'type': 'groups', 'ids': [group.id]},
+                        sender.callerid, message.message, message)
+        send_sms.delay(sender.callerid, '0000',
+                       _("Successfully queued your message to the group."))
+        return Response('OK SEND', status=status.HTTP_200_OK)
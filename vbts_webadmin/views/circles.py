@@ -14,7 +14,6 @@ from crispy_forms.layout import Layout, Submit
 from dal import autocomplete
 from django.contrib import messages as alerts
 from django.contrib.auth.decorators import login_required
-from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
 from django.core.urlresolvers import reverse_lazy
 from django.db.models import Q
 from django.forms import CharField, ModelForm, Textarea, SelectMultiple
@@ -25,8 +24,8 @@ from vbts_webadmin.forms import SearchForm
 from vbts_webadmin.models import Circle
 from vbts_webadmin.models import CircleUsers
 from vbts_webadmin.models import Message
-from vbts_webadmin.models import MessageRecipients
-from vbts_webadmin.tasks import send_sms
+from vbts_webadmin.tasks import start_broadcast
+from vbts_webadmin.utils import keyset_paginate
 
 
 class CircleForm(ModelForm):
@@ -124,23 +123,10 @@ def circle_list(request, template_name='circles/list.html'):
     else:
         circles = Circle.objects.all()
 
-    paginator = Paginator(circles, 15)
-    page = request.GET.get('page')
-
-    is_paginated = False
-    if paginator.num_pages > 1:
-        is_paginated = True
-
-    try:
-        circles = paginator.page(page)
-    except PageNotAnInteger:
-        circles = paginator.page(1)
-    except EmptyPage:
-        circles = paginator.page(paginator.num_pages)
+    circles = keyset_paginate(request, circles)
 
     form = SearchForm(form_action='circles')
     data['circles'] = circles
-    data['is_paginated'] = is_paginated
     data['form'] = form
     return render(request, template_name, data)
 
@@ -158,16 +144,13 @@ def circle_view(request, pk, template_name='circles/detail.html'):
                                              'message'))
         message.published_date = datetime.now()
         message.save()
-        members = CircleUsers.objects.filter(circle_id=circle.id)
-        for member in members:
-            MessageRecipients.objects.create(message=message,
-                                             user=member.user)
-            send_sms.delay(member.user.callerid,
-                           sender.callerid,
-                           message.message)
+        job = start_broadcast({'type': 'circles', 'ids': [circle.id]},
+                              sender.callerid, message.message, message)
         alerts.success(
-            request, _("You've successfully broadcasted to  %s's members.") %
-            circle.name)
+            request,
+            _("You've successfully queued the broadcast to %(name)s's "
+              "members (job #%(job)s).") % {'name': circle.name,
+                                            'job': job.pk})
     return render(request, template_name, {'circle': circle, 'form': form})
 
 
@@ -227,15 +210,10 @@ def circle_broadcast(request, pk=None, template_name='circles/sms.html'):
                                              'message'))
         message.published_date = datetime.now()
         message.save()
-        for circle in request.POST.getlist('circles'):
-            members = CircleUsers.objects.filter(circle_id=circle)
-            for member in members:
-                MessageRecipients.objects.create(message=message,
-                                                 user=member.user)
-                send_sms.delay(member.user.callerid,
-                               sender.callerid,
-                               message.message)
-            alerts.success(request, _("You've successfully broadcasted \
-                the message."))
+        job = start_broadcast({'type': 'circles',
+                               'ids': request.POST.getlist('circles')},
+                              sender.callerid, message.message, message)
+        alerts.success(request, _("You've successfully queued the broadcast "
+                                  "(job #%s).") % job.pk)
         return circle_list(request)
     return render(request, template_name, {'form': form})
@@ -11,9 +11,6 @@ from crispy_forms.layout import HTML
 from crispy_forms.layout import Submit
 from django.contrib import messages as alerts
 from django.contrib.auth.decorators import login_required
-from django.core.paginator import EmptyPage
-from django.core.paginator import PageNotAnInteger
-from django.core.paginator import Paginator
 from django.core.urlresolvers import reverse_lazy
 from django.db.models import Q
 from django.forms import ModelForm
@@ -23,6 +20,7 @@ from django.utils.translation import ugettext as _
 
 from vbts_webadmin.forms import SearchForm
 from vbts_webadmin.models import Config
+from vbts_webadmin.utils import keyset_paginate
 
 
 class ConfigForm(ModelForm):
@@ -57,23 +55,10 @@ def config_list(request, template_name='configs/list.html'):
     else:
         configs = Config.objects.all()
 
-    paginator = Paginator(configs, 15)
-    page = request.GET.get('page')
-
-    is_paginated = False
-    if paginator.num_pages > 1:
-        is_paginated = True
-
-    try:
-        configs = paginator.page(page)
-    except PageNotAnInteger:
-        configs = paginator.page(1)
-    except EmptyPage:
-        configs = paginator.page(paginator.num_pages)
+    configs = keyset_paginate(request, configs)
 
     form = SearchForm(form_action='configs')
     data['configs'] = configs
-    data['is_paginated'] = is_paginated
     data['form'] = form
     return render(request, template_name, data)
 
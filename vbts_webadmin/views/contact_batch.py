@@ -8,9 +8,6 @@ LICENSE file in the root directory of this source tree.
 
 from __future__ import absolute_import
 
-import csv
-import io
-
 from crispy_forms.helper import FormHelper
 from crispy_forms.layout import Fieldset
 from crispy_forms.layout import HTML
@@ -18,21 +15,17 @@ from crispy_forms.layout import Layout
 from crispy_forms.layout import Submit
 from django import forms
 from django.conf import settings
-from django.contrib import messages as alerts
 from django.contrib.auth.decorators import login_required
 from django.core.urlresolvers import reverse_lazy
+from django.shortcuts import get_object_or_404
 from django.shortcuts import redirect
 from django.shortcuts import render
 from django.template.defaultfilters import filesizeformat
-from django.utils import timezone
 from django.utils.translation import ugettext as _
 
-from vbts_webadmin.models import Contact
-from vbts_webadmin.models import ContactProfile
-from vbts_webadmin.models import ContactSimcards
 from vbts_webadmin.models import Document
-from vbts_webadmin.models import Group
-from vbts_webadmin.views import api_groups
+from vbts_webadmin.models import Job
+from vbts_webadmin.tasks import start_import
 
 
 class DocumentForm(forms.ModelForm):
@@ -101,108 +94,14 @@ class VerifyForm(forms.ModelForm):
 
 @login_required
 def simple_upload(request, template_name='contacts/upload_csv.html'):
-    csv_subs_len = 2
-    csv_group_len = 6
-    csv_contact_len = 11
-
     if request.method == 'POST':
         form = DocumentForm(request.POST, request.FILES)
         if form.is_valid():
-            myfile = request.FILES['docfile']
             actobj = form.cleaned_data.get('action') + \
                 form.cleaned_data.get('object')
-
-            reader = csv.reader(io.StringIO(myfile.read().decode('utf-8')))
-            headers = next(reader)  # handle row header
-
-            items_to_verify = []
-            items_in_conflict = []
             if actobj == '11':  # Create contacts
-                if len(headers) < csv_contact_len:
-                    myfile.close()
-                    alerts.warning(request, _(
-                        "Missing required headers/fields. "
-                        "Check your CSV file again."
-                    ))
-                    return redirect('contacts')
-
-                for row in reader:
-                    if len(row) < csv_group_len:
-                        break  # do nothing #TODO: add to "invalid" list
-
-                    try:
-                        contact_sim = ContactSimcards.objects.get(
-                            contact__callerid=row[9])
-                    except ContactSimcards.DoesNotExist:
-                        contact_sim = None
-
-                    # diff user/uuid -- attempting to transfer to another sub
-                    if contact_sim and (
-                            contact_sim.contact_profile.uuid != int(row[8])):
-                        # TODO: Improve this!
-                        items_to_verify.append(row)
-                        items_in_conflict.append([
-                            contact_sim.contact_profile.uuid,
-                            contact_sim.contact_profile.firstname,
-                            contact_sim.contact_profile.lastname,
-                            contact_sim.contact_profile.nickname,
-                            contact_sim.contact_profile.age,
-                            contact_sim.contact_profile.gender,
-                            contact_sim.contact_profile.municipality,
-                            contact_sim.contact_profile.barangay,
-                            contact_sim.contact_profile.sitio,
-                            contact_sim.contact.callerid,
-                            contact_sim.contact.imsi]
-                        )
-
-                    else:
-                        try:
-                            (contact_profile,
-                             created) = ContactProfile.objects.update_or_create(
-                                uuid=row[8],
-                                defaults={
-                                    'firstname': row[0],
-                                    'lastname': row[1],
-                                    'nickname': row[2],
-                                    'age': row[3],
-                                    'gender': row[4],
-                                    'municipality': row[5],
-                                    'barangay': row[6],
-                                    'sitio': row[7],
-                                    'uuid': row[8],
-                                }
-                            )
-                            if row[9] and row[10]:
-                                (contact,
-                                 created) = Contact.objects.update_or_create(
-                                    callerid=row[9],
-                                    defaults={
-                                        'callerid': row[9],
-                                        'imsi': row[10]
-                                    }
-                                )
-                                ContactSimcards.objects.update_or_create(
-                                    contact=contact,
-                                    contact_profile=contact_profile
-                                )
-                        except Exception as e:
-                            print (e)
-                            items_to_verify.append(row)
-                            items_in_conflict.append(None)
-
-            else:
-                pass
-
-            myfile.close()
-
-            if items_to_verify:
-                request.session['list'] = items_to_verify
-                request.session['conflict'] = items_in_conflict
-                return redirect(upload_verify)
-            else:
-                alerts.success(
-                    request,
-                    _("Batch operation completed successfully."))
+                job = start_import('contact_import', request.FILES['docfile'])
+                return redirect('job_detail', pk=job.pk)
             return redirect('contacts')
     else:
         form = DocumentForm()
@@ -210,11 +109,11 @@ def simple_upload(request, template_name='contacts/upload_csv.html'):
 
 
 @login_required
-def upload_verify(request, template_name='contacts/verify.html'):
+def upload_verify(request, pk, template_name='contacts/verify.html'):
+    job = get_object_or_404(Job, pk=pk, kind='contact_import')
+    result = job.result or {}
     data = {
-        'list': request.session['list'],
-        'conflict': request.session['conflict'],
-        'length': len(request.session['list']) * 'x'
+        'list': result.get('verify', []),
+        'conflict': result.get('conflict', []),
     }
-    print (request.session['conflict'])
     return render(request, template_name, data)
@@ -15,11 +15,7 @@ from crispy_forms.layout import HTML
 from crispy_forms.layout import Submit
 from django.contrib import messages as alerts
 from django.contrib.auth.decorators import login_required
-from django.core.paginator import EmptyPage
-from django.core.paginator import PageNotAnInteger
-from django.core.paginator import Paginator
 from django.core.urlresolvers import reverse_lazy
-from django.db.models import Q
 from django.forms import ModelForm
 from django.forms import TextInput
 from django.shortcuts import get_object_or_404
@@ -34,8 +30,8 @@ from vbts_webadmin.models import ContactSimcards
 from vbts_webadmin.models import Group
 from vbts_webadmin.models import PromoSubscription
 from vbts_webadmin.models import ServiceSubscribers
-from vbts_webadmin.tasks import purge_entry
 from vbts_webadmin.tasks import send_sms
+from vbts_webadmin.utils import keyset_paginate
 
 
 class ContactForm(ModelForm):
@@ -112,60 +108,32 @@ class ContactAssignProfileForm(ModelForm):
 @login_required
 def contact_list(request, template_name='contacts/list.html'):
     data = {}
+    contacts_sims = ContactSimcards.objects.select_related(
+        'contact', 'contact_profile')
+    # contacts without a simcard, as an anti-join
+    no_profiles = Contact.objects.filter(contactsimcards__isnull=True)
+    unreg_sims = no_profiles.filter(imsi__startswith='IMSI')
+    offnets = no_profiles.filter(imsi__startswith='OFFNET')
+    profiles = ContactProfile.objects.order_by('-id')
+
     if 'search' in request.GET:
-        contacts_sims = ContactSimcards.objects.all()
-        contacts_sims_imsi = ContactSimcards.objects.values_list('contact_id',
-                                                                 flat=True)
-        no_profiles = Contact.objects.exclude(imsi__in=contacts_sims_imsi)
-        unreg_sims = no_profiles.filter(Q(imsi__icontains='IMSI'))
-        offnets = no_profiles.filter(Q(imsi__icontains='OFFNET'))
-        profiles = ContactProfile.objects.all()
-
-        for term in request.GET['search'].split():
+        # see Contact.search_text()
+        for term in request.GET['search'].lower().split():
             contacts_sims = contacts_sims.filter(
-                Q(contact_profile__firstname__icontains=term) |
-                Q(contact_profile__lastname__icontains=term) |
-                Q(contact__callerid__icontains=term))
-            unreg_sims = unreg_sims.filter(
-                Q(callerid__icontains=term) |
-                Q(imsi__icontains=term))
-            offnets = offnets.filter(
-                Q(callerid__icontains=term) |
-                Q(imsi__icontains=term))
-
-        data['search'] = True
+                contact__search__contains=term)
+            unreg_sims = unreg_sims.filter(search__contains=term)
+            offnets = offnets.filter(search__contains=term)
+
+        data['search'] = request.GET['search']
         alerts.info(request,
                     _("You've searched for: '%s'") % request.GET['search'])
-    else:
-        contacts_sims = ContactSimcards.objects.all()
-        contacts_sims_imsi = ContactSimcards.objects.values_list('contact_id',
-                                                                 flat=True)
-        no_profiles = Contact.objects.exclude(imsi__in=contacts_sims_imsi)
-        unreg_sims = no_profiles.filter(Q(imsi__icontains='IMSI'))
-        offnets = no_profiles.filter(Q(imsi__icontains='OFFNET'))
-        profiles = ContactProfile.objects.all()
 
-    paginator = Paginator(contacts_sims, 15)
-    page = request.GET.get('page')
-
-    is_paginated = False
-    if paginator.num_pages > 1:
-        is_paginated = True
-
-    try:
-        contacts_sims = paginator.page(page)
-    except PageNotAnInteger:
-        contacts_sims = paginator.page(1)
-    except EmptyPage:
-        contacts_sims = paginator.page(paginator.num_pages)
-
-    form = SearchForm(form_action='contacts')
-    data['contacts_sims'] = contacts_sims
-    data['is_paginated'] = is_paginated
-    data['form'] = form
-    data['unreg_sims'] = unreg_sims
-    data['offnets'] = offnets
-    data['profiles'] = profiles
+    data['contacts_sims'] = keyset_paginate(request, contacts_sims)
+    data['unreg_sims'] = keyset_paginate(request, unreg_sims,
+                                         prefix='unreg_')
+    data['profiles'] = keyset_paginate(request, profiles, prefix='profile_')
+    data['offnets'] = keyset_paginate(request, offnets, prefix='offnet_')
+    data['form'] = SearchForm(form_action='contacts')
     return render(request, template_name, data)
 
 
@@ -288,10 +256,7 @@ def add_promo(request, pk=None, template_name='contacts/addpromo_form.html'):
                          'To opt out, text REMOVE %(keyword)s to 555.') % ({
                              'promo': promo.name,
                              'keyword': promo.keyword}
-                       ))
-        purge_entry.apply_async(eta=instance.date_expiration,
-                                args=[instance.pk],
-                                task_id=str(instance.pk))
+                       ), lane='notification')
 
         # we should also create an event
         balance = endaga_sub.get_account_balance(contact.imsi)
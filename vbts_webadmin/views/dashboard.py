@@ -24,6 +24,7 @@ from django.shortcuts import redirect
 from django.shortcuts import render
 from django.utils.translation import ugettext as _
 
+from vbts_webadmin.middleware import set_preferences
 from vbts_webadmin.models import UserProfile
 
 
@@ -127,6 +128,7 @@ def profile_update(request, template_name='accounts/profile_form.html'):
             user_profile.timezone = request.POST['tz']
         user_profile.save()
         request.user.save()
+        set_preferences(request, user_profile)
         alerts.success(request, _("You've successfully updated your profile."))
         return redirect('profile')
     return render(request, template_name, context)
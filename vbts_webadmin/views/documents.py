@@ -16,9 +16,6 @@ from django import forms
 from django.conf import settings
 from django.contrib import messages as alerts
 from django.contrib.auth.decorators import login_required
-from django.core.paginator import EmptyPage
-from django.core.paginator import PageNotAnInteger
-from django.core.paginator import Paginator
 from django.core.urlresolvers import reverse_lazy
 from django.db.models import Q
 from django.shortcuts import get_object_or_404
@@ -29,6 +26,7 @@ from django.utils.translation import ugettext as _
 
 from vbts_webadmin.forms import SearchForm
 from vbts_webadmin.models import Document
+from vbts_webadmin.utils import keyset_paginate
 from vbts_webadmin.widgets import AceWidget
 
 
@@ -129,23 +127,10 @@ def document_list(request, template_name='documents/list.html'):
     else:
         documents = Document.objects.all()
 
-    paginator = Paginator(documents, 15)
-    page = request.GET.get('page')
-
-    is_paginated = False
-    if paginator.num_pages > 1:
-        is_paginated = True
-
-    try:
-        documents = paginator.page(page)
-    except PageNotAnInteger:
-        documents = paginator.page(1)
-    except EmptyPage:
-        documents = paginator.page(paginator.num_pages)
+    documents = keyset_paginate(request, documents)
 
     search_form = SearchForm(form_action='documents')
     data['documents'] = documents
-    data['is_paginated'] = is_paginated
     data['search_form'] = search_form
 
     return render(request, template_name, data)
@@ -8,7 +8,6 @@ LICENSE file in the root directory of this source tree.
 
 from django.contrib import messages as alerts
 from django.contrib.auth.decorators import login_required
-from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
 from django.db.models import Q
 from django.shortcuts import render, get_object_or_404
 from django.utils.translation import ugettext as _
@@ -17,6 +16,7 @@ from vbts_webadmin.forms import SearchForm
 from vbts_webadmin.models import Group
 from vbts_webadmin.models import ContactSimcards
 from vbts_webadmin.models import ContactProfile
+from vbts_webadmin.utils import keyset_paginate
 
 
 # class GroupForm(ModelForm):
@@ -52,24 +52,10 @@ def group_list(request, template_name='groups/list.html'):
         groups = Group.objects.all()
         # groups = ContactSimcards.objects.filter(contact__in=Group.objects.values_list('owner', flat=True))
 
-    paginator = Paginator(groups, 15)
-
-    page = request.GET.get('page')
-
-    is_paginated = False
-    if paginator.num_pages > 1:
-        is_paginated = True
-
-    try:
-        groups = paginator.page(page)
-    except PageNotAnInteger:
-        groups = paginator.page(1)
-    except EmptyPage:
-        groups = paginator.page(paginator.num_pages)
+    groups = keyset_paginate(request, groups)
 
     form = SearchForm(form_action='groups')
     data['groups'] = groups
-    data['is_paginated'] = is_paginated
     data['form'] = form
     return render(request, template_name, data)
 
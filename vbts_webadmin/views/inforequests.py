@@ -8,7 +8,6 @@ LICENSE file in the root directory of this source tree.
 
 from django.contrib import messages as alerts
 from django.contrib.auth.decorators import login_required
-from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
 from django.db.models import Q
 from django.http import HttpResponse
 from django.forms import ModelForm, Textarea
@@ -22,7 +21,8 @@ from crispy_forms.bootstrap import AppendedText, PrependedText, FormActions
 
 from vbts_webadmin.forms import SearchForm
 from vbts_webadmin.models import Service, ServiceMessages
-from vbts_webadmin.tasks import send_sms
+from vbts_webadmin.tasks import start_broadcast
+from vbts_webadmin.utils import keyset_paginate
 
 
 class MessageForm(ModelForm):
@@ -57,24 +57,10 @@ def inforequests_list(request, template_name='inforequests/list.html'):
     else:
         inforequests = Service.objects.filter(script__type='I')
 
-    paginator = Paginator(inforequests, 15)
-
-    page = request.GET.get('page')
-
-    is_paginated = False
-    if paginator.num_pages > 1:
-        is_paginated = True
-
-    try:
-        inforequests = paginator.page(page)
-    except PageNotAnInteger:
-        inforequests = paginator.page(1)
-    except EmptyPage:
-        inforequests = paginator.page(paginator.num_pages)
+    inforequests = keyset_paginate(request, inforequests)
 
     form = SearchForm(form_action='inforequests')
     data['inforequests'] = inforequests
-    data['is_paginated'] = is_paginated
     data['form'] = form
     return render(request, template_name, data)
 
@@ -99,13 +85,14 @@ def inforequest_send(request, pk, template_name='inforequests/send.html'):
         servicemessages.date = timezone.now()
         servicemessages.save()
 
-        for subscriber in service.subscribers.all():
-            send_sms.delay(subscriber.callerid,
-                           servicemessages.sender.callerid,
-                           servicemessages.message)
-        alerts.success(request, _("You've successfully sent \
-            the message '%(msg)s' to %(keyword)s's subscribers.") % ({
+        job = start_broadcast({'type': 'services', 'ids': [service.pk]},
+                              servicemessages.sender.callerid,
+                              servicemessages.message)
+        alerts.success(request, _("You've successfully queued \
+            the message '%(msg)s' to %(keyword)s's subscribers \
+            (job #%(job)s).") % ({
             'msg': servicemessages.message,
-            'keyword': service.keyword
+            'keyword': service.keyword,
+            'job': job.pk
         }))
     return render(request, template_name, {'service': service, 'form': form})
@@ -17,9 +17,6 @@ from django.conf import settings
 from django.contrib import messages as alerts
 from django.contrib.auth.decorators import login_required
 from django.core.files import File
-from django.core.paginator import EmptyPage
-from django.core.paginator import PageNotAnInteger
-from django.core.paginator import Paginator
 from django.core.urlresolvers import reverse_lazy
 from django.db.models import Q
 from django.forms import CharField
@@ -31,6 +28,7 @@ from django.shortcuts import render
 
 from vbts_webadmin.forms import SearchForm
 from vbts_webadmin.models import Ivr
+from vbts_webadmin.utils import keyset_paginate
 
 from django.utils.translation import ugettext as _
 
@@ -77,23 +75,10 @@ def ivr_list(request, template_name='ivrs/list.html'):
     else:
         ivrs = Ivr.objects.all()
 
-    paginator = Paginator(ivrs, 15)
-    page = request.GET.get('page')
-
-    is_paginated = False
-    if paginator.num_pages > 1:
-        is_paginated = True
-
-    try:
-        ivrs = paginator.page(page)
-    except PageNotAnInteger:
-        ivrs = paginator.page(1)
-    except EmptyPage:
-        ivrs = paginator.page(paginator.num_pages)
+    ivrs = keyset_paginate(request, ivrs)
 
     form = SearchForm(form_action='ivrs')
     data['ivrs'] = ivrs
-    data['is_paginated'] = is_paginated
     data['form'] = form
     return render(request, template_name, data)
 
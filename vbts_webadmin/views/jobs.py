@@ -0,0 +1,28 @@
+"""
+Copyright (c) 2015-present, Philippine-California Advanced Research Institutes-
+The Village Base Station Project (PCARI-VBTS). All rights reserved.
+
+This source code is licensed under the BSD-style license found in the
+LICENSE file in the root directory of this source tree.
+"""
+
+from django.contrib.auth.decorators import login_required
+from django.http import JsonResponse
+from django.shortcuts import get_object_or_404
+from django.shortcuts import render
+
+from vbts_webadmin.models import Job
+
+
+@login_required
+def job_view(request, pk, template_name='jobs/detail.html'):
+    """ Progress of a job, the page polls job_status until it's over """
+    job = get_object_or_404(Job, pk=pk)
+    return render(request, template_name, {'job': job})
+
+
+@login_required
+def job_status(request, pk):
+    """ Progress, errors and result of a job, as JSON """
+    job = get_object_or_404(Job, pk=pk)
+    return JsonResponse(job.as_dict())
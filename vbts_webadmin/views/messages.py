@@ -12,7 +12,6 @@ from crispy_forms.layout import Submit
 from dal import autocomplete
 from django.contrib import messages as alerts
 from django.contrib.auth.decorators import login_required
-from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
 from django.core.urlresolvers import reverse_lazy
 from django.db.models import Q
 from django.forms import BooleanField, CheckboxInput, ModelForm, Textarea
@@ -21,10 +20,9 @@ from django.utils import timezone
 from django.utils.translation import ugettext as _
 
 from vbts_webadmin.forms import SearchForm
-from vbts_webadmin.models import Contact
 from vbts_webadmin.models import Message
-from vbts_webadmin.models import MessageRecipients
-from vbts_webadmin.tasks import send_sms
+from vbts_webadmin.tasks import start_broadcast
+from vbts_webadmin.utils import keyset_paginate
 
 
 class MessageForm(ModelForm):
@@ -82,24 +80,10 @@ def message_list(request, template_name='messages/list.html'):
     else:
         messages = Message.objects.all().order_by('-date')
 
-    paginator = Paginator(messages, 15)
-
-    page = request.GET.get('page')
-
-    is_paginated = False
-    if paginator.num_pages > 1:
-        is_paginated = True
-
-    try:
-        messages = paginator.page(page)
-    except PageNotAnInteger:
-        messages = paginator.page(1)
-    except EmptyPage:
-        messages = paginator.page(paginator.num_pages)
+    messages = keyset_paginate(request, messages, count_limit=1000)
 
     form = SearchForm(form_action='messages')
     data['smss'] = messages
-    data['is_paginated'] = is_paginated
     data['form'] = form
     return render(request, template_name, data)
 
@@ -121,20 +105,17 @@ def message_send(request, template_name='messages/form.html'):
         message.save()
 
         if form.cleaned_data.get('to_all'):
-            contacts = Contact.objects.filter(~Q(imsi=message.author.imsi))
+            recipients = {'type': 'all', 'ids': [message.author.imsi]}
         else:
-            contacts = form.cleaned_data.get('recipients')
-
-        for contact in contacts:
-            recipient = MessageRecipients.objects.create(
-                message=message, user=contact)
-            recipient.save()
-            send_sms.delay(contact.callerid,
-                           message.author.callerid,
-                           message.message)
+            recipients = {'type': 'contacts',
+                          'ids': [contact.imsi for contact in
+                                  form.cleaned_data.get('recipients')]}
+
+        job = start_broadcast(recipients, message.author.callerid,
+                              message.message, message)
         alerts.success(
             request,
-            _("You've successfully sent the message '%s'.") %
-            message.message)
+            _("You've successfully queued the message '%(msg)s' "
+              "(job #%(job)s).") % {'msg': message.message, 'job': job.pk})
         return message_list(request)
     return render(request, template_name, {'form': form})
@@ -11,7 +11,6 @@ from __future__ import absolute_import
 from core import events
 from core.subscriber import subscriber as endaga_sub
 
-from celery.task.control import revoke
 from crispy_forms.bootstrap import PrependedText
 from crispy_forms.bootstrap import Tab
 from crispy_forms.bootstrap import TabHolder
@@ -25,9 +24,6 @@ from django import forms
 from django.contrib import messages as alerts
 from django.contrib.auth.decorators import login_required
 from django.core.exceptions import ValidationError
-from django.core.paginator import EmptyPage
-from django.core.paginator import PageNotAnInteger
-from django.core.paginator import Paginator
 from django.core.urlresolvers import reverse_lazy
 from django.db.models import Q
 from django.forms import ModelForm
@@ -40,6 +36,7 @@ from vbts_webadmin.forms import SearchForm
 from vbts_webadmin.models import Promo
 from vbts_webadmin.models import PromoSubscription
 from vbts_webadmin.utils import float_to_mc
+from vbts_webadmin.utils import keyset_paginate
 from vbts_webadmin.utils import mc_to_float
 from vbts_webadmin.tasks import send_sms
 
@@ -322,24 +319,10 @@ def promo_list(request, template_name='promos/list.html'):
     else:
         promos = Promo.objects.all()
 
-    paginator = Paginator(promos, 15)
-
-    page = request.GET.get('page')
-
-    is_paginated = False
-    if paginator.num_pages > 1:
-        is_paginated = True
-
-    try:
-        promos = paginator.page(page)
-    except PageNotAnInteger:
-        promos = paginator.page(1)
-    except EmptyPage:
-        promos = paginator.page(paginator.num_pages)
+    promos = keyset_paginate(request, promos)
 
     form = SearchForm(form_action='promos')
     data['promos'] = promos
-    data['is_paginated'] = is_paginated
     data['form'] = form
     return render(request, template_name, data)
 
@@ -348,24 +331,10 @@ def promo_list(request, template_name='promos/list.html'):
 def promo_view(request, pk, template_name='promos/detail.html'):
     promo = get_object_or_404(Promo, pk=pk)
     subscription = PromoSubscription.objects.filter(promo_id=pk)
-    paginator = Paginator(subscription, 15)
-
-    page = request.GET.get('page')
-
-    is_paginated = False
-    if paginator.num_pages > 1:
-        is_paginated = True
-
-    try:
-        subscription = paginator.page(page)
-    except PageNotAnInteger:
-        subscription = paginator.page(1)
-    except EmptyPage:
-        subscription = paginator.page(paginator.num_pages)
+    subscription = keyset_paginate(request, subscription)
     data = {
         'promo': promo,
-        'subscription': subscription,
-        'is_paginated': is_paginated
+        'subscription': subscription
     }
     return render(request, template_name, data)
 
@@ -416,10 +385,10 @@ def promo_delete_subscription(
         'confirm_delete.html'):
     subscription = get_object_or_404(PromoSubscription, pk=pk)
     if request.method == 'POST':
-        revoke(str(pk), terminate=True)
         msg = _("You were automatically unsubscribed from your %s promo."
                 ) % subscription.promo.keyword
-        send_sms.delay(subscription.contact.callerid, '0000', msg)
+        send_sms.delay(subscription.contact.callerid, '0000', msg,
+                       lane='notification')
 
         # we should also create an event
         balance = endaga_sub.get_account_balance(subscription.contact.imsi)
@@ -436,22 +405,8 @@ def promo_delete_subscription(
 def promo_view_subscriptions(request, template_name='promos/'
                                                     'view_subscriptions.html'):
     subscription = PromoSubscription.objects.all()
-    paginator = Paginator(subscription, 15)
-
-    page = request.GET.get('page')
-
-    is_paginated = False
-    if paginator.num_pages > 1:
-        is_paginated = True
-
-    try:
-        subscription = paginator.page(page)
-    except PageNotAnInteger:
-        subscription = paginator.page(1)
-    except EmptyPage:
-        subscription = paginator.page(paginator.num_pages)
+    subscription = keyset_paginate(request, subscription)
     data = {
-        'subscription': subscription,
-        'is_paginated': is_paginated
+        'subscription': subscription
     }
     return render(request, template_name, data)
@@ -11,9 +11,6 @@ from crispy_forms.helper import FormHelper
 from crispy_forms.layout import Submit
 from django.contrib import messages as alerts
 from django.contrib.auth.decorators import login_required
-from django.core.paginator import EmptyPage
-from django.core.paginator import PageNotAnInteger
-from django.core.paginator import Paginator
 from django.db.models import Q
 from django.forms import ModelForm
 from django.forms import Textarea
@@ -24,7 +21,8 @@ from django.utils.translation import ugettext as _
 
 from vbts_webadmin.forms import SearchForm
 from vbts_webadmin.models import Service, ServiceMessages
-from vbts_webadmin.tasks import send_sms
+from vbts_webadmin.tasks import start_broadcast
+from vbts_webadmin.utils import keyset_paginate
 
 
 class MessageForm(ModelForm):
@@ -59,24 +57,10 @@ def pushmessages_list(request, template_name='pushmessages/list.html'):
     else:
         pushmessages = Service.objects.filter(script__type='P')
 
-    paginator = Paginator(pushmessages, 15)
-
-    page = request.GET.get('page')
-
-    is_paginated = False
-    if paginator.num_pages > 1:
-        is_paginated = True
-
-    try:
-        pushmessages = paginator.page(page)
-    except PageNotAnInteger:
-        pushmessages = paginator.page(1)
-    except EmptyPage:
-        pushmessages = paginator.page(paginator.num_pages)
+    pushmessages = keyset_paginate(request, pushmessages)
 
     form = SearchForm(form_action='pushmessages')
     data['pushmessages'] = pushmessages
-    data['is_paginated'] = is_paginated
     data['form'] = form
     return render(request, template_name, data)
 
@@ -101,13 +85,13 @@ def pushmessage_send(request, pk, template_name='pushmessages/send.html'):
         pushmessage.date = timezone.now()
         pushmessage.save()
 
-        for subscriber in service.subscribers.all():
-            send_sms.delay(subscriber.callerid,
-                           pushmessage.sender.callerid,
-                           pushmessage.message)
+        job = start_broadcast({'type': 'services', 'ids': [service.pk]},
+                              pushmessage.sender.callerid,
+                              pushmessage.message)
         alerts.success(request,
-                       _("You've successfully sent the message '%(msg)s' to "
-                         "%(keyword)s's subscribers.") % ({
+                       _("You've successfully queued the message '%(msg)s' "
+                         "to %(keyword)s's subscribers (job #%(job)s).") % ({
                              'msg': pushmessage.message,
-                             'keyword': service.keyword}))
+                             'keyword': service.keyword,
+                             'job': job.pk}))
     return render(request, template_name, {'service': service, 'form': form})
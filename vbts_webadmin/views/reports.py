@@ -16,9 +16,6 @@ from django.conf import settings
 from django.contrib import messages as alerts
 from django.contrib.auth.decorators import login_required
 from django.core.files import File
-from django.core.paginator import EmptyPage
-from django.core.paginator import PageNotAnInteger
-from django.core.paginator import Paginator
 from django.core.urlresolvers import reverse_lazy
 from django.db.models import Q
 from django.forms import ModelForm, Textarea, ValidationError
@@ -35,6 +32,7 @@ from vbts_webadmin.models import Report
 from vbts_webadmin.models import ReportManagers
 from vbts_webadmin.models import ReportMessages
 from vbts_webadmin.tasks import reload_fs_xml
+from vbts_webadmin.utils import keyset_paginate
 
 
 class ReportForm(ModelForm):
@@ -96,23 +94,10 @@ def report_list(request, template_name='reports/list.html'):
     else:
         reports = Report.objects.all()
 
-    paginator = Paginator(reports, 15)
-    page = request.GET.get('page')
-
-    is_paginated = False
-    if paginator.num_pages > 1:
-        is_paginated = True
-
-    try:
-        reports = paginator.page(page)
-    except PageNotAnInteger:
-        reports = paginator.page(1)
-    except EmptyPage:
-        reports = paginator.page(paginator.num_pages)
+    reports = keyset_paginate(request, reports)
 
     form = SearchForm(form_action='reports')
     data['reports'] = reports
-    data['is_paginated'] = is_paginated
     data['form'] = form
     return render(request, template_name, data)
 
@@ -162,7 +147,9 @@ def report_update(request, pk, template_name='reports/form.html'):
 @login_required
 def report_view(request, pk, template_name='reports/detail.html'):
     report = get_object_or_404(Report, pk=pk)
-    reports = ReportMessages.objects.filter(report=report).order_by('-date')
+    reports = keyset_paginate(
+        request, ReportMessages.objects.filter(report=report),
+        count_limit=1000)
     return render(request, template_name,
                   {'report': report, 'reports': reports})
 
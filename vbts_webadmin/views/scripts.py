@@ -8,13 +8,13 @@ LICENSE file in the root directory of this source tree.
 
 from django.contrib import messages as alerts
 from django.contrib.auth.decorators import login_required
-from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
 from django.db.models import Q
 from django.shortcuts import render, get_object_or_404
 from django.utils.translation import ugettext as _
 
 from vbts_webadmin.forms import SearchForm
 from vbts_webadmin.models import Script
+from vbts_webadmin.utils import keyset_paginate
 
 
 @login_required
@@ -32,23 +32,10 @@ def script_list(request, template_name='scripts/list.html'):
     else:
         scripts = Script.objects.all()
 
-    paginator = Paginator(scripts, 15)
-    page = request.GET.get('page')
-
-    is_paginated = False
-    if paginator.num_pages > 1:
-        is_paginated = True
-
-    try:
-        scripts = paginator.page(page)
-    except PageNotAnInteger:
-        scripts = paginator.page(1)
-    except EmptyPage:
-        scripts = paginator.page(paginator.num_pages)
+    scripts = keyset_paginate(request, scripts)
 
     form = SearchForm(form_action='scripts')
     data['scripts'] = scripts
-    data['is_paginated'] = is_paginated
     data['form'] = form
     return render(request, template_name, data)
 
@@ -21,9 +21,6 @@ from django.conf import settings
 from django.contrib import messages as alerts
 from django.contrib.auth.decorators import login_required
 from django.core.files import File
-from django.core.paginator import Paginator
-from django.core.paginator import EmptyPage
-from django.core.paginator import PageNotAnInteger
 from django.core.urlresolvers import reverse_lazy
 from django.db.models import Q
 from django.forms import CharField, ModelForm, Textarea, ChoiceField, \
@@ -41,6 +38,7 @@ from vbts_webadmin.tasks import reload_fs_xml
 from vbts_webadmin.tasks import send_sms
 from vbts_webadmin.utils import create_periodic_task
 from vbts_webadmin.utils import float_to_mc
+from vbts_webadmin.utils import keyset_paginate
 from vbts_webadmin.utils import mc_to_float
 from vbts_webadmin.widgets import JSON2DArrayWidget
 
@@ -219,24 +217,10 @@ def service_list(request, template_name='services/list.html'):
     else:
         services = Service.objects.all()
 
-    paginator = Paginator(services, 15)
-
-    page = request.GET.get('page')
-
-    is_paginated = False
-    if paginator.num_pages > 1:
-        is_paginated = True
-
-    try:
-        services = paginator.page(page)
-    except PageNotAnInteger:
-        services = paginator.page(1)
-    except EmptyPage:
-        services = paginator.page(paginator.num_pages)
+    services = keyset_paginate(request, services)
 
     form = SearchForm(form_action='services')
     data['services'] = services
-    data['is_paginated'] = is_paginated
     data['form'] = form
     return render(request, template_name, data)
 
@@ -261,7 +245,8 @@ def service_view(request, pk, template_name='services/detail.html'):
                                              user=subscriber.subscriber)
             send_sms.delay(subscriber.subscriber.callerid,
                            sender.callerid,
-                           message.message)
+                           message.message,
+                           lane='bulk')
         alerts.success(request,
                        _("You've successfully broadcasted to "
                          "%s's subscribers") % service)
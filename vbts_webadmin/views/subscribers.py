@@ -8,15 +8,13 @@ LICENSE file in the root directory of this source tree.
 
 from django.contrib import messages as alerts
 from django.contrib.auth.decorators import login_required
-from django.core.paginator import Paginator
-from django.core.paginator import EmptyPage
-from django.core.paginator import PageNotAnInteger
 from django.db.models import Q
 from django.shortcuts import render
 from django.utils.translation import ugettext as _
 
 from vbts_subscribers.models import SipBuddies
 from vbts_webadmin.forms import SearchForm
+from vbts_webadmin.utils import keyset_paginate
 
 
 @login_required
@@ -34,22 +32,9 @@ def subscribers_list(request, template_name='subscribers/list.html'):
     else:
         subscribers = SipBuddies.objects.all()
 
-    paginator = Paginator(subscribers, 15)
-    page = request.GET.get('page')
-
-    is_paginated = False
-    if paginator.num_pages > 1:
-        is_paginated = True
-
-    try:
-        subscribers = paginator.page(page)
-    except PageNotAnInteger:
-        subscribers = paginator.page(1)
-    except EmptyPage:
-        subscribers = paginator.page(paginator.num_pages)
+    subscribers = keyset_paginate(request, subscribers)
 
     form = SearchForm(form_action='subscribers')
     data['subscribers'] = subscribers
-    data['is_paginated'] = is_paginated
     data['form'] = form
     return render(request, template_name, data)
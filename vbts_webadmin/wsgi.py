@@ -20,3 +20,9 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "vbts_webadmin.settings.prod")
 
 application = get_wsgi_application()
+
+# FreeSWITCH's /api/ calls skip the dashboard's middleware, see machine.py.
+# Imported once Django is set up, as it loads rest_framework.
+from vbts_webadmin.machine import MachineDispatcher  # noqa: E402
+
+application = MachineDispatcher(application)